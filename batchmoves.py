@@ -0,0 +1,247 @@
+"""vectorized pseudo-legal move generation for stacks of positions
+
+a stack is an (N, boardNo**3 + 1) uint8 array of packed positions (ChessBoard.pack): the square codes by flat index
+followed by the side to move. move generation works on every piece of one type in every board at once:
+
+    line pieces   the rays of each piece are gathered from a padded (square, direction, distance) table, a square is
+                  reachable while the cumulative occupancy of the squares before it along the ray is still empty
+    step pieces   the targets are gathered from a padded (square, step) table
+    pawns         like step pieces with one advance and one capture table per side, a move onto a promotion
+                  square is repeated once per promotion class
+
+padding points at an extra always-occupied square, so no bounds checks are done per element. the result matches
+ChessBoard.generateMoves up to move order
+
+usage: python batchmoves.py [--layout testing] [--boards 256] [--plies 20] [--check]
+"""
+import argparse
+import random
+import sys
+import time
+
+import numpy as np
+
+from components import ChessBoard, LinePiece, StepPiece, PawnPiece, pieceClasses
+from movetables import getMoveTables
+
+_generators = dict()
+
+
+def stackPositions(positions, boardNo=8):
+    """returns the (N, boardNo**3 + 1) uint8 stack of an iterable of ChessBoards or packed positions"""
+    data = b''.join(position.pack() if isinstance(position, ChessBoard) else bytes(position)
+                    for position in positions)
+    return np.frombuffer(data, dtype=np.uint8).reshape(-1, boardNo ** 3 + 1)
+
+
+class BatchMoveGenerator:
+    "padded move tables of one board size and the vectorized generator working on them"
+
+    def __init__(self, boardNo=8):
+        self.boardNo = boardNo
+        self.squareCount = boardNo ** 3
+        tables = getMoveTables(boardNo)
+        self._lineTables = []  # (typeCode, (square, direction, distance) int array padded with squareCount)
+        self._stepTables = []  # (typeCode, (square, step) int array padded with squareCount)
+        self._pawnTables = []  # (typeCode, side, advance table, capture table, promotion square mask, promotion codes)
+        for typeCode, pieceClass in sorted(pieceClasses.items()):
+            piece = pieceClass((0, 0, 0), 0, boardNo)
+            if isinstance(piece, LinePiece):
+                table = np.full((self.squareCount, len(piece.moveVectors), boardNo - 1), self.squareCount, np.intp)
+                for vectorNumber, vector in enumerate(piece.moveVectors):
+                    for index, rays in enumerate(tables.rays([vector])):
+                        for ray in rays:
+                            table[index, vectorNumber, :len(ray)] = ray
+                self._lineTables.append((typeCode, table))
+            elif isinstance(piece, StepPiece):
+                self._stepTables.append((typeCode, self._paddedSteps(tables, piece.stepVectors)))
+            elif isinstance(piece, PawnPiece):
+                for side in (0, 1):
+                    pawn = pieceClass((0, 0, 0), side, boardNo)
+                    sign = -1 if side else 1
+                    advance = self._paddedSteps(tables, [tuple(sign * n for n in v) for v in pawn.advanceVectors])
+                    capture = self._paddedSteps(tables, [tuple(sign * n for n in v) for v in pawn.captureVectors])
+                    promotion = np.zeros(self.squareCount + 1, bool)
+                    promotion[[tables.index(square) for square in pawn.promotionCoordinateList]] = True
+                    promotionCodes = np.array([pieceClass.typeCode for pieceClass in pawn.promotionPieces], np.uint8)
+                    self._pawnTables.append((typeCode, side, advance, capture, promotion, promotionCodes))
+
+    def _paddedSteps(self, tables, vectors):
+        table = np.full((self.squareCount, len(vectors)), self.squareCount, np.intp)
+        for index, steps in enumerate(tables.steps(vectors)):
+            table[index, :len(steps)] = steps
+        return table
+
+    def _padded(self, stack):
+        """returns (codes, occupied, sides): square codes with the padding square appended, its occupancy and the
+        side to move of every board"""
+        stack = np.asarray(stack, dtype=np.uint8)
+        if stack.ndim == 1:
+            stack = stack[np.newaxis]
+        codes = stack.copy()
+        sides = stack[:, self.squareCount].astype(np.uint8)
+        codes[:, self.squareCount] = 0
+        occupied = codes != 0
+        occupied[:, self.squareCount] = True
+        return codes, occupied, sides
+
+    def moveArrays(self, stack):
+        """returns (boards, origins, targets, captures, promotions) for the side to move of every position of stack,
+        one entry per move: board number in the stack, origin and target flat index, whether the move captures and
+        the typeCode of the promoted piece, 0 if the move is not a promotion"""
+        codes, occupied, sides = self._padded(stack)
+        padding = self.squareCount
+        types = codes >> 1
+        own = (codes & 1) == sides[:, np.newaxis]
+        parts = []
+        for typeCode, table in self._lineTables:
+            boards, origins = np.nonzero((types == typeCode) & own)
+            if not boards.size:
+                continue
+            rays = table[origins]  # (pieces, directions, distance)
+            rayBoards = boards[:, np.newaxis, np.newaxis]
+            rayOccupied = occupied[rayBoards, rays]
+            blocked = np.logical_or.accumulate(rayOccupied, axis=2)
+            reachable = np.ones_like(blocked)
+            reachable[:, :, 1:] = ~blocked[:, :, :-1]
+            reachable &= rays != padding
+            enemy = (codes[rayBoards, rays] & 1) != sides[boards][:, np.newaxis, np.newaxis]
+            capture = reachable & rayOccupied & enemy
+            reachable &= ~rayOccupied
+            parts.append(self._collect(boards, origins, rays, reachable, False))
+            parts.append(self._collect(boards, origins, rays, capture, True))
+        for typeCode, table in self._stepTables:
+            boards, origins = np.nonzero((types == typeCode) & own)
+            if not boards.size:
+                continue
+            steps = table[origins]  # (pieces, steps)
+            stepBoards = boards[:, np.newaxis]
+            stepCodes = codes[stepBoards, steps]
+            valid = steps != padding
+            parts.append(self._collect(boards, origins, steps, valid & (stepCodes == 0), False))
+            capture = valid & (stepCodes != 0) & ((stepCodes & 1) != sides[boards][:, np.newaxis])
+            parts.append(self._collect(boards, origins, steps, capture, True))
+        for typeCode, side, advance, captureTable, promotion, promotionCodes in self._pawnTables:
+            boards, origins = np.nonzero((types == typeCode) & own & (sides[:, np.newaxis] == side))
+            if not boards.size:
+                continue
+            steps = advance[origins]
+            quiet = (codes[boards[:, np.newaxis], steps] == 0) & (steps != padding)
+            parts.append(self._promote(self._collect(boards, origins, steps, quiet, False), promotion, promotionCodes))
+            steps = captureTable[origins]
+            stepCodes = codes[boards[:, np.newaxis], steps]
+            capture = (stepCodes != 0) & ((stepCodes & 1) != side) & (steps != padding)
+            parts.append(self._promote(self._collect(boards, origins, steps, capture, True),
+                                       promotion, promotionCodes))
+        if not parts:
+            empty = np.zeros(0, np.intp)
+            return empty, empty, empty, np.zeros(0, bool), np.zeros(0, np.uint8)
+        boards, origins, targets, captures, promotions = (np.concatenate(arrays) for arrays in zip(*parts))
+        order = np.argsort(boards, kind='stable')
+        return boards[order], origins[order], targets[order], captures[order], promotions[order]
+
+    def _collect(self, boards, origins, targets, mask, capture):
+        pieces = np.nonzero(mask)[0]
+        return (boards[pieces], origins[pieces], targets[mask], np.full(pieces.size, capture),
+                np.zeros(pieces.size, np.uint8))
+
+    def _promote(self, part, promotion, promotionCodes):
+        """repeats the moves of part that end on a promotion square once per promotion code"""
+        boards, origins, targets, captures, promotions = part
+        promoting = promotion[targets]
+        if not promoting.any():
+            return part
+        count = len(promotionCodes)
+        kept = ~promoting
+        return (np.concatenate((boards[kept], np.repeat(boards[promoting], count))),
+                np.concatenate((origins[kept], np.repeat(origins[promoting], count))),
+                np.concatenate((targets[kept], np.repeat(targets[promoting], count))),
+                np.concatenate((captures[kept], np.repeat(captures[promoting], count))),
+                np.concatenate((promotions[kept], np.tile(promotionCodes, int(promoting.sum())))))
+
+    def moveMasks(self, stack):
+        """returns (moveMask, captureMask), (N, boardNo**3) bool arrays of the squares the side to move can move
+        to without and with a capture"""
+        boards, origins, targets, captures, promotions = self.moveArrays(stack)
+        count = len(np.atleast_2d(stack))
+        moveMask = np.zeros((count, self.squareCount), bool)
+        captureMask = np.zeros((count, self.squareCount), bool)
+        moveMask[boards[~captures], targets[~captures]] = True
+        captureMask[boards[captures], targets[captures]] = True
+        return moveMask, captureMask
+
+    def mobility(self, stack):
+        """returns the (N,) number of pseudo-legal moves of the side to move of every position"""
+        return np.bincount(self.moveArrays(stack)[0], minlength=len(np.atleast_2d(stack)))
+
+    def generateMoves(self, positions):
+        """returns the move list of every ChessBoard or packed position, moves as in ChessBoard.generateMoves"""
+        stack = stackPositions(positions, self.boardNo)
+        boards, origins, targets, captures, promotions = self.moveArrays(stack)
+        coordinates = getMoveTables(self.boardNo).coordinates
+        moveLists = [[] for _ in range(len(stack))]
+        for board, origin, target, promotion in zip(boards.tolist(), origins.tolist(), targets.tolist(),
+                                                    promotions.tolist()):
+            if promotion:
+                moveLists[board].append((coordinates[origin], coordinates[target], pieceClasses[promotion]))
+            else:
+                moveLists[board].append((coordinates[origin], coordinates[target]))
+        return moveLists
+
+
+def getBatchMoveGenerator(boardNo=8):
+    """returns the shared BatchMoveGenerator for boardNo, building it on first use"""
+    generator = _generators.get(boardNo)
+    if generator is None:
+        generator = _generators[boardNo] = BatchMoveGenerator(boardNo)
+    return generator
+
+
+def randomPositions(initialLayout='testing', boardNo=8, count=256, plies=20, seed=1):
+    """returns count packed positions reached by random games of up to plies moves from initialLayout"""
+    rng = random.Random(seed)
+    positions = []
+    for _ in range(count):
+        chessBoard = ChessBoard(initialLayout, boardNo)
+        for _ in range(rng.randrange(plies + 1)):
+            moves = chessBoard.generateMoves()
+            if not moves:
+                break
+            chessBoard.makeMove(rng.choice(moves))
+        positions.append(chessBoard.pack())
+    return positions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="benchmark and check the vectorized move generator")
+    parser.add_argument('--layout', default='testing')
+    parser.add_argument('--boardNo', type=int, default=8)
+    parser.add_argument('--boards', type=int, default=256, help="number of random positions in the stack")
+    parser.add_argument('--plies', type=int, default=20, help="maximum length of the random games")
+    parser.add_argument('--check', action='store_true', help="compare every move list with ChessBoard.generateMoves")
+    args = parser.parse_args(argv)
+
+    positions = randomPositions(args.layout, args.boardNo, args.boards, args.plies)
+    generator = getBatchMoveGenerator(args.boardNo)
+    stack = stackPositions(positions, args.boardNo)
+    start = time.perf_counter()
+    moveCount = len(generator.moveArrays(stack)[0])
+    batchSeconds = time.perf_counter() - start
+    chessBoards = [ChessBoard.fromPacked(position, args.boardNo) for position in positions]
+    start = time.perf_counter()
+    scalarMoves = [chessBoard.generateMoves() for chessBoard in chessBoards]
+    scalarSeconds = time.perf_counter() - start
+    print('%d positions, %d moves' % (len(positions), moveCount))
+    print('batch  %.4fs  %.0f moves/s' % (batchSeconds, moveCount / batchSeconds))
+    print('scalar %.4fs  %.0f moves/s' % (scalarSeconds, moveCount / scalarSeconds))
+    if args.check:
+        for number, (batch, scalar) in enumerate(zip(generator.generateMoves(positions), scalarMoves)):
+            if len(batch) != len(scalar) or set(batch) != set(scalar):
+                print('mismatch in position %d: %s' % (number, positions[number].hex()))
+                return 1
+        print('all move lists match')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
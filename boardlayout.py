@@ -0,0 +1,108 @@
+"""pixel geometry of the boards drawn by ChessRender, computed once per board size
+
+the boardNo boards of the cube are drawn side by side, boardPerRow to a row, board z holds the squares (x, y, z)
+with x to the right and y downwards. BoardLayout precomputes the rect of every square (by the flat index of
+movetables) and a bisect based pixel -> square hit test, so drawing and cursor code never repeat the arithmetic
+"""
+from bisect import bisect_right
+
+MINBLOCKWIDTH = 4  # smallest square fitWindow accepts, in pixels
+MINTHICKLINE = 12  # squares at least this wide get 2 pixel grid lines
+
+
+class BoardLayout:
+    "square -> pixel rect and pixel -> square tables of one board size"
+
+    def __init__(self, boardNo=8, lineWidth=2, blockWidth=25, boardGapWidth=30, boardPerRow=4, left=20, top=20):
+        self.boardNo = boardNo
+        self.lineWidth = lineWidth  # width of the grid lines
+        self.blockWidth = blockWidth  # width of a square, also the size sprites are scaled to
+        self.boardGapWidth = boardGapWidth  # gap between two boards
+        self.boardPerRow = boardPerRow  # boards drawn next to each other before starting a new row
+        self.left, self.top = left, top  # pixel position of the first board
+        self.boardWidth = (boardNo + 1) * lineWidth + boardNo * blockWidth
+        self.boardDistance = self.boardWidth + boardGapWidth
+        self.circleRadius = max(1, min(3, blockWidth // 6))  # radius of the dot marking a movable square
+        pitch = lineWidth + blockWidth
+
+        self.boardRects = tuple((left + (z % boardPerRow) * self.boardDistance,
+                                 top + (z // boardPerRow) * self.boardDistance,
+                                 self.boardWidth, self.boardWidth) for z in range(boardNo))
+        self.cellOffsets = tuple(lineWidth + i * pitch for i in range(boardNo))  # cell start within a board
+        rects = []
+        centres = []
+        for x in range(boardNo):
+            for y in range(boardNo):
+                for z in range(boardNo):
+                    boardLeft, boardTop = self.boardRects[z][:2]
+                    X, Y = boardLeft + self.cellOffsets[x], boardTop + self.cellOffsets[y]
+                    rects.append((X, Y, blockWidth, blockWidth))
+                    centres.append((X + round(0.5 * blockWidth), Y + round(0.5 * blockWidth)))
+        self.squareRects = tuple(rects)  # by flat index (x * boardNo + y) * boardNo + z
+        self.squareCentres = tuple(centres)
+
+        # hit test: a square owns its cell plus the grid line left of / above it
+        self._columnStarts, self._columns = self._hitBands(
+            sorted({rect[0] for rect in self.boardRects}), pitch, lambda column, i: (column, i))
+        self._rowStarts, self._rows = self._hitBands(
+            sorted({rect[1] for rect in self.boardRects}), pitch, lambda row, j: (row, j))
+        self._pitch = pitch
+
+    def _hitBands(self, boardStarts, pitch, key):
+        starts = []
+        owners = []
+        for number, boardStart in enumerate(boardStarts):
+            for i in range(self.boardNo):
+                starts.append(boardStart + i * pitch)
+                owners.append(key(number, i))
+        return starts, owners
+
+    @classmethod
+    def fitWindow(cls, boardNo, width, height, margin=20):
+        """creates the layout with the largest squares whose boards fit into a width x height window, trying every
+        number of boards per row; the gap between boards is a square plus 5 pixels and the grid lines are 1 pixel
+        wide for squares under MINTHICKLINE pixels. 1000 x 600 gives the original 8 board layout"""
+        best = None
+        for boardPerRow in range(1, boardNo + 1):
+            rows = -(-boardNo // boardPerRow)
+            for lineWidth in (2, 1):
+                # a row of boards is boardPerRow * ((boardNo + 1) * lineWidth + boardNo * block) + gaps of block + 5
+                blockWidth = min(
+                    (width - margin - boardPerRow * (boardNo + 1) * lineWidth - (boardPerRow - 1) * 5) //
+                    (boardPerRow * boardNo + boardPerRow - 1),
+                    (height - margin - rows * (boardNo + 1) * lineWidth - (rows - 1) * 5) //
+                    (rows * boardNo + rows - 1))
+                if lineWidth == 1 or blockWidth >= MINTHICKLINE:
+                    break
+            if best is None or blockWidth > best[1]:
+                best = (lineWidth, blockWidth, blockWidth + 5, boardPerRow, margin, margin)
+        if best[1] < MINBLOCKWIDTH:
+            raise Exception("a %d x %d window is too small to show a board with boardNo %d" % (width, height, boardNo))
+        return cls(boardNo, *best)
+
+    def index(self, coordinates):
+        x, y, z = coordinates
+        return (x * self.boardNo + y) * self.boardNo + z
+
+    def squareRect(self, coordinates):
+        """returns (left, top, width, height) of the square at coordinates"""
+        return self.squareRects[self.index(coordinates)]
+
+    def squareCentre(self, coordinates):
+        return self.squareCentres[self.index(coordinates)]
+
+    def squareAt(self, pixel):
+        """returns the coordinates of the square under pixel (X, Y), None if pixel is not on any board"""
+        X, Y = pixel
+        band = bisect_right(self._columnStarts, X) - 1
+        if band < 0 or X >= self._columnStarts[band] + self._pitch:
+            return None
+        column, x = self._columns[band]
+        band = bisect_right(self._rowStarts, Y) - 1
+        if band < 0 or Y >= self._rowStarts[band] + self._pitch:
+            return None
+        row, y = self._rows[band]
+        z = row * self.boardPerRow + column
+        if z >= self.boardNo:
+            return None
+        return x, y, z
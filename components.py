@@ -1,4 +1,13 @@
-import numpy as np
+from array import array
+from itertools import compress
+
+from movetables import getMoveTables
+from zobrist import getZobristKeys
+
+# every direction a line piece can move along, Queen moves along all of them
+LINEDIRECTIONS = ((1, 0, 0), (-1, 0, 0), (0, 1, 0), (0, -1, 0), (0, 0, 1), (0, 0, -1), (1, 1, 0), (1, -1, 0),
+                  (-1, 1, 0), (-1, -1, 0), (1, 0, 1), (1, 0, -1), (-1, 0, 1), (-1, 0, -1), (0, 1, 1), (0, 1, -1),
+                  (0, -1, 1), (0, -1, -1))
 
 class ChessBoard:
     "Chess board containing information of all the chess pieces"
@@ -7,9 +16,22 @@ class ChessBoard:
         self.boardNo = boardNo  # Length of each dimension
         self.dimensions = dimensions  # TODO: no intent of extending to higher dimensions at the moment! 3 for 3D
         self._pieceDict = dict()
+        self._tables = getMoveTables(boardNo)
+        self._squares = bytearray(self._tables.squareCount)  # piece code of every square by flat index, 0 if empty
+        self._zobrist = getZobristKeys(boardNo)
+        self._hash = 0  # zobrist hash of the position, updated on every piece placement and side change
+        self._attacks = None  # square index -> (side, attacked square indices) of the piece on it, see enableAttackMaps
+        self._attackCounts = None  # per side, number of that side's pieces attacking every square
+        self._attackTotals = None  # per side, sum of the attacked square counts of that side's pieces
+        self._version = 0  # bumped on every change of the squares, keys the move cache
+        self._moveCache = dict()  # piece -> (move set, capture set) valid for _moveCacheVersion
+        self._moveCacheVersion = 0
+        self._squareObservers = []  # told about every change of the square array, see addSquareObserver
         self.setInitialLayout(initialLayout)
         self._currentPiece = None  # currentPieces that is selected, required to show moveable positions
         self._currentSide = 0
+        self._undoStack = []  # (piece, origin, target, captured piece, side to move, hash) for every move made
+        self._moveListeners = []  # called with every move played in the game, see playMove
 
     # functions used for collecting ChessPiece objects
     def validCoordinates(self, coordinates):
@@ -27,21 +49,165 @@ class ChessBoard:
 
     def positionOccupied(self, coordinates):
         """determines if coordinates passed is occupied, and returns side(colour) of it, default 0 if position is empty"""
-        coordinates = tuple(coordinates)  # convert input to tuple if it is numpy array
-        if coordinates in self._pieceDict:
-            return True, self._pieceDict[coordinates].side
+        if not self.withinBoardBoundaries(coordinates):
+            return False, 0
+        code = self._squares[self._tables.index(coordinates)]
+        if code:
+            return True, code & 1
         else:
             return False, 0
 
+    def squareIndex(self, coordinates):
+        """returns the flat index of coordinates used by the square array, see movetables"""
+        return self._tables.index(coordinates)
+
+    def _placePiece(self, piece, coordinates):
+        """puts piece on an empty square, keeping _pieceDict and the square array in sync"""
+        index = self._tables.index(coordinates)
+        code = pieceCode(piece)
+        self._pieceDict[coordinates] = piece
+        self._squares[index] = code
+        self._hash ^= self._zobrist.pieceKeys[code][index]
+        self._version += 1
+        if self._attacks is not None:
+            self._updateLinesThrough(index)
+            self._addAttacks(piece, index)
+        for observer in self._squareObservers:
+            observer.piecePlaced(index, code)
+
+    def _liftPiece(self, coordinates):
+        """takes the piece off coordinates and returns it, None if the square is empty"""
+        piece = self._pieceDict.pop(coordinates, None)
+        if piece is not None:
+            index = self._tables.index(coordinates)
+            code = self._squares[index]
+            self._hash ^= self._zobrist.pieceKeys[code][index]
+            self._squares[index] = 0
+            self._version += 1
+            if self._attacks is not None:
+                self._removeAttacks(index)
+                self._updateLinesThrough(index)
+            for observer in self._squareObservers:
+                observer.pieceLifted(index, code)
+        return piece
+
+    # attack maps, kept up to date incrementally once enabled
+    def enableAttackMaps(self):
+        """starts maintaining per side attack counts of every square, called on first use by isSquareAttacked
+        after this every piece placement updates the attacks of the piece and of the line pieces whose rays pass
+        through the changed square, instead of recomputing the whole board"""
+        if self._attacks is not None:
+            return
+        squareCount = self._tables.squareCount
+        self._attacks = dict()
+        self._attackCounts = (array('H', bytes(2 * squareCount)), array('H', bytes(2 * squareCount)))
+        self._attackTotals = [0, 0]
+        self._lineRays = self._tables.rays(LINEDIRECTIONS)
+        for coordinates, piece in self._pieceDict.items():
+            self._addAttacks(piece, self._tables.index(coordinates))
+
+    def _addAttacks(self, piece, index):
+        attacked = piece.attackedSquares()
+        side = int(piece.side)
+        self._attacks[index] = (side, attacked)
+        self._attackTotals[side] += len(attacked)
+        counts = self._attackCounts[side]
+        for square in attacked:
+            counts[square] += 1
+
+    def _removeAttacks(self, index):
+        side, attacked = self._attacks.pop(index)
+        self._attackTotals[side] -= len(attacked)
+        counts = self._attackCounts[side]
+        for square in attacked:
+            counts[square] -= 1
+
+    def _updateLinesThrough(self, index):
+        """recomputes the attacks of the line pieces whose rays reach the square index, called after it changed"""
+        squares = self._squares
+        squareCoordinates = self._tables.coordinates
+        for ray in self._lineRays[index]:
+            for square in ray:
+                if squares[square]:  # the nearest piece along this line, only it can see the changed square
+                    if index in self._attacks[square][1]:
+                        piece = self._pieceDict[squareCoordinates[square]]
+                        if isinstance(piece, LinePiece):
+                            self._removeAttacks(square)
+                            self._addAttacks(piece, square)
+                    break
+
+    def attackCount(self, coordinates, bySide):
+        """returns the number of pieces of bySide attacking coordinates"""
+        self.enableAttackMaps()
+        return self._attackCounts[int(bySide)][self._tables.index(coordinates)]
+
+    def attackTotal(self, bySide):
+        """returns the number of (piece, attacked square) pairs of bySide, a measure of its mobility"""
+        self.enableAttackMaps()
+        return self._attackTotals[int(bySide)]
+
+    def isSquareAttacked(self, coordinates, bySide):
+        """determines if any piece of bySide could capture on coordinates"""
+        return self.attackCount(coordinates, bySide) > 0
+
+    def inCheck(self, side=None):
+        """determines if a king of side, default the side to move, is attacked by the other side"""
+        if side is None:
+            side = self._currentSide
+        self.enableAttackMaps()
+        side = int(side)
+        kingCode = bytes((King.typeCode << 1 | side,))
+        counts = self._attackCounts[1 - side]
+        index = self._squares.find(kingCode)
+        while index != -1:
+            if counts[index]:
+                return True
+            index = self._squares.find(kingCode, index + 1)
+        return False
+
+    def generateLegalMoves(self, side=None):
+        """returns the moves of generateMoves that do not leave a king of side attacked"""
+        if side is None:
+            side = self._currentSide
+        self.enableAttackMaps()
+        side = int(side)
+        kingCode = King.typeCode << 1 | side
+        # a move that is not a king move can only expose a king that is not in check yet by leaving one of the
+        # king's lines, every other move is legal without being made
+        exposed = set()
+        if self.inCheck(side):
+            exposed = None
+        else:
+            index = self._squares.find(bytes((kingCode,)))
+            while index != -1:
+                for ray in self._lineRays[index]:
+                    exposed.update(ray)
+                index = self._squares.find(bytes((kingCode,)), index + 1)
+        squares = self._squares
+        squareIndex = self._tables.index
+        legalMoves = []
+        for move in self.generateMoves(side):
+            origin = squareIndex(move[0])
+            if exposed is not None and origin not in exposed and squares[origin] != kingCode:
+                legalMoves.append(move)
+                continue
+            self.makeMove(move)
+            if not self.inCheck(side):
+                legalMoves.append(move)
+            self.unmakeMove()
+        return legalMoves
+
     def addPiece(self, piece):
         if not isinstance(piece, ChessPiece):
             raise Exception("must add a ChessPiece type object")
         if not self.validCoordinates(piece._coordinates):
             raise Exception("coordinate not valid for current chessBoard")
+        if piece.boardNo != self.boardNo:
+            raise Exception("the ChessPiece was created for boardNo %d, not %d" % (piece.boardNo, self.boardNo))
         if not self.withinBoardBoundaries(piece._coordinates) or self.positionOccupied(piece._coordinates)[0]:
             raise Exception("must add ChessPiece within the chessboard on an unoccupied tile")
-        self._pieceDict[piece._coordinates] = piece
         piece.attachChessBoard(self)
+        self._placePiece(piece, piece._coordinates)
 
     def addPieces(self, pieces):
         """adds multiple chessPieces to the board"""
@@ -58,11 +224,16 @@ class ChessBoard:
         by transform, a new piece of targetPiece class is created, coordinates is copied from the original piece
         """
         coordinates = originalPiece.getCoordinates()
+        occupant = self._pieceDict.get(coordinates)
+        if occupant is not None and occupant is not originalPiece:
+            raise Exception("can only transform the ChessPiece on %r, not a piece over another one" % (coordinates,))
         side = originalPiece.side
         boardNo = originalPiece.boardNo
         transformed = targetPiece(coordinates, side, boardNo)
-        targetPiece.chessBoard = self #TODO: not elegant, consider implementing removePiece and use addPiece
-        self._pieceDict[coordinates] = transformed
+        if occupant is not None:
+            self._liftPiece(coordinates)
+        transformed.attachChessBoard(self)
+        self._placePiece(transformed, coordinates)
         return transformed
 
     def selectPiece(self, piece):
@@ -79,15 +250,118 @@ class ChessBoard:
     def moveCurrentPiece(self, targetCoordinates):
         if not self.validCoordinates(targetCoordinates):
             raise Exception("this function must be called with valid targetCoordinates")
-        captured = self._pieceDict.pop(targetCoordinates, None)
-        self._pieceDict.pop(self._currentPiece.getCoordinates())
-        self._pieceDict[targetCoordinates] = self._currentPiece  # update for _pieceDict
-        self._currentPiece.changeCoordinates(
-            targetCoordinates)  # update for chessPiece TODO: (consider the redundancy of information and if there is a better solution)
+        move = (self._currentPiece.getCoordinates(), tuple(targetCoordinates))
+        if isinstance(self._currentPiece, PawnPiece) and move[1] in self._currentPiece.promotionCoordinateList:
+            move += (self._currentPiece.promotionPieces[0],)  # a pawn moved by hand is promoted to a queen
+        captured = self.playMove(move)
         self._currentPiece = None  # Action done, remove the moved chessPiece from self._currentPiece
+        return captured
+
+    def playMove(self, move):
+        """makes move as a move of the game: like makeMove, but every move listener is told about it
+        search and analysis use makeMove directly so their look-ahead is not reported"""
+        captured = self.makeMove(move)
+        for listener in self._moveListeners:
+            listener(self, move)
+        return captured
+
+    def addMoveListener(self, listener):
+        """registers listener(chessBoard, move), called after every playMove and moveCurrentPiece"""
+        self._moveListeners.append(listener)
+
+    def removeMoveListener(self, listener):
+        self._moveListeners.remove(listener)
+
+    def addSquareObserver(self, observer):
+        """registers an object with piecePlaced(index, code), pieceLifted(index, code) and positionReset(chessBoard)
+        methods, told about every change of the square array so it can keep incremental state such as evaluation
+        terms; positionReset is called right away and whenever the whole position is replaced"""
+        self._squareObservers.append(observer)
+        observer.positionReset(self)
+
+    def removeSquareObserver(self, observer):
+        self._squareObservers.remove(observer)
+
+    def makeMove(self, move):
+        """plays move, a tuple (originCoordinates, targetCoordinates) or, for a pawn promotion, (originCoordinates,
+        targetCoordinates, promotion ChessPiece class), without going through the selection state
+        the moved piece, captured piece and side to move are pushed onto the undo stack, returns the captured piece"""
+        origin, target = move[0], move[1]
+        piece = self._pieceDict.get(origin)
+        if piece is None:
+            raise Exception("there must be a ChessPiece on the origin coordinates of the move")
+        key = self._hash
+        captured = self._liftPiece(target)
+        self._liftPiece(origin)
+        piece._coordinates = target  # update for chessPiece TODO: (consider the redundancy of information and if there is a better solution)
+        self._placePiece(piece, target)  # update for _pieceDict and the square array
+        promotion = move[2] if len(move) > 2 else None
+        if promotion is not None:
+            self.transformPiece(piece, promotion)
+        self._undoStack.append((piece, origin, target, captured, self._currentSide, key, promotion))
         self._currentSide = not self._currentSide  # after a move is made, side changes
+        self._hash ^= self._zobrist.sideKey
         return captured
 
+    def unmakeMove(self):
+        """takes back the last move made, restoring the moved piece, the captured piece and the side to move
+        returns the move that was taken back"""
+        if not self._undoStack:
+            raise Exception("there is no move to unmake")
+        piece, origin, target, captured, side, key, promotion = self._undoStack.pop()
+        self._liftPiece(target)  # the moved piece, or the piece it was promoted to
+        piece._coordinates = origin
+        self._placePiece(piece, origin)
+        if captured is not None:
+            self._placePiece(captured, target)
+        self._currentSide = side
+        self._hash = key
+        if promotion is not None:
+            return origin, target, promotion
+        return origin, target
+
+    def generateMoves(self, side=None):
+        """returns a list of all moves (originCoordinates, targetCoordinates) for side, default the side to move
+        moves are pseudo-legal: every move and capture returned by validNextPositions of the side's pieces
+        a pawn move onto a promotion square is returned once per promotion class, as a third element of the move"""
+        if side is None:
+            side = self._currentSide
+        moves = []
+        for coordinates, piece in self._pieceDict.items():
+            if piece.side == side:
+                move, capture = piece.validNextPositions()
+                if isinstance(piece, PawnPiece):
+                    moves += piece.promotionMoves(move + capture)
+                    continue
+                moves += [(coordinates, target) for target in move]
+                moves += [(coordinates, target) for target in capture]
+        return moves
+
+    def generateCaptures(self, side=None):
+        """returns a list of the capturing moves (originCoordinates, targetCoordinates) for side, default the side to move"""
+        if side is None:
+            side = self._currentSide
+        captures = []
+        for coordinates, piece in self._pieceDict.items():
+            if piece.side == side:
+                if isinstance(piece, PawnPiece):
+                    captures += piece.promotionMoves(piece.validNextPositions()[1])
+                    continue
+                captures += [(coordinates, target) for target in piece.validNextPositions()[1]]
+        return captures
+
+    def getMoveHistory(self):
+        """returns the list of moves made so far, oldest first"""
+        return [entry[1:3] if entry[6] is None else entry[1:3] + (entry[6],) for entry in self._undoStack]
+
+    def positionHash(self):
+        """returns the 64 bit zobrist hash of the position and side to move, see zobrist"""
+        return self._hash
+
+    def repetitionCount(self):
+        """returns how many times the current position has occurred in the move history, including now"""
+        return 1 + sum(1 for entry in self._undoStack if entry[5] == self._hash)
+
     def getCurrentSide(self):
         return self._currentSide
 
@@ -96,19 +370,30 @@ class ChessBoard:
         initialLayoutDict = {
             'empty': (None, []),
             'testing': ('point symmetry',
-                        [King((0, 0, 0)), Queen((1, 1, 1)), Rook((1, 0, 0)), Rook((0, 1, 0)), Rook((0, 0, 1)),
-                         Bishop((2, 0, 0)), Bishop((0, 2, 0)), Bishop((0, 0, 2)), Knight((2, 2, 2)), Knight((3, 0, 0)),
-                         Knight((0, 3, 0)), Knight((0, 0, 3)), Knight((1, 1, 0)), Knight((1, 0, 1)),
-                         Knight((0, 1, 1))]),
-            'vortex': []  # TODO: vortex standard: 20 pieces each on the edge
+                        [(King, (0, 0, 0)), (Queen, (1, 1, 1)), (Rook, (1, 0, 0)), (Rook, (0, 1, 0)),
+                         (Rook, (0, 0, 1)), (Bishop, (2, 0, 0)), (Bishop, (0, 2, 0)), (Bishop, (0, 0, 2)),
+                         (Knight, (2, 2, 2)), (Knight, (3, 0, 0)), (Knight, (0, 3, 0)), (Knight, (0, 0, 3)),
+                         (Knight, (1, 1, 0)), (Knight, (1, 0, 1)), (Knight, (0, 1, 1))]),
+            # vortex standard: 20 pieces each, gathered around a corner with the pawns in front
+            'vortex': ('point symmetry',
+                       [(King, (0, 0, 0)), (Queen, (1, 1, 1)), (Rook, (1, 0, 0)), (Rook, (0, 1, 0)), (Rook, (0, 0, 1)),
+                        (Knight, (2, 0, 0)), (Knight, (0, 2, 0)), (Knight, (0, 0, 2)), (Bishop, (3, 0, 0)),
+                        (Bishop, (0, 3, 0)), (Bishop, (0, 0, 3)), (VortexPawn, (1, 1, 0)), (VortexPawn, (1, 0, 1)),
+                        (VortexPawn, (0, 1, 1)), (VortexPawn, (2, 1, 1)), (VortexPawn, (1, 2, 1)),
+                        (VortexPawn, (1, 1, 2)), (VortexPawn, (4, 0, 0)), (VortexPawn, (0, 4, 0)),
+                        (VortexPawn, (0, 0, 4))])
         }
 
         setup = initialLayoutDict[initialLayout]
         if setup[0] == "point symmetry":
-            for piece in setup[1]:
-                self.addPiece(piece)
-                oppositePiece = piece.createOpposite()
-                self.addPiece(oppositePiece)
+            # the layouts are given from side 0's corner and mirrored through the centre for side 1, on any boardNo
+            pieces = [PieceType(coordinates, 0, self.boardNo) for PieceType, coordinates in setup[1]]
+            pieces += [piece.createOpposite() for piece in pieces]
+            squares = [piece.getCoordinates() for piece in pieces]
+            if not all(self.withinBoardBoundaries(square) for square in squares) or len(set(squares)) < len(squares):
+                raise Exception("the %r layout does not fit on a board with boardNo %d" % (initialLayout,
+                                                                                       self.boardNo))
+            self.addPieces(pieces)
         else:
             return
 
@@ -120,37 +405,105 @@ class ChessBoard:
         """attempt to return a chessPiece from the coordinates input, return None if nothing is found"""
         if not self.validCoordinates(coordinates):
             raise Exception("must be a valid coordinate to use this function")
-        try:
-            return self._pieceDict[coordinates]
-        except:
+        if not self.withinBoardBoundaries(coordinates) or not self._squares[self._tables.index(coordinates)]:
             return None
+        return self._pieceDict[tuple(coordinates)]
+
+    # compact representation: the square array plus the side to move, boardNo ** 3 + 1 bytes
+    def pack(self):
+        """returns the position as bytes, one piece code per square followed by the side to move"""
+        return bytes(self._squares) + bytes((int(self._currentSide),))
+
+    def loadPacked(self, data):
+        """replaces the position with one produced by pack, rebuilding the ChessPiece objects from the piece codes"""
+        if len(data) != self._tables.squareCount + 1:  # the undo stack is not part of a packed position
+            raise Exception("packed position does not match the size of current chessBoard")
+        self._pieceDict = dict()
+        self._squares = bytearray(data[:-1])
+        squareCoordinates = self._tables.coordinates
+        for index in compress(range(len(self._squares)), self._squares):  # occupied squares only, scanned in C
+            piece = pieceFromCode(self._squares[index], squareCoordinates[index], self.boardNo)
+            self._pieceDict[squareCoordinates[index]] = piece
+            piece.attachChessBoard(self)
+        self._currentPiece = None
+        self._currentSide = data[-1]
+        self._undoStack = []
+        self._version += 1
+        self._hash = self._zobrist.hashSquares(self._squares, self._currentSide)
+        if self._attacks is not None:
+            self._attacks = None
+            self.enableAttackMaps()
+        for observer in self._squareObservers:
+            observer.positionReset(self)
+
+    @classmethod
+    def fromPacked(cls, data, boardNo=8):
+        """creates a ChessBoard from bytes produced by pack"""
+        chessBoard = cls('empty', boardNo)
+        chessBoard.loadPacked(data)
+        return chessBoard
+
+    def copy(self):
+        """returns an independent ChessBoard with the same position and side to move, the selection is not copied
+        the square array is copied whole and only the pieces are recreated, so the cost follows the piece count
+        rather than the boardNo ** 3 squares"""
+        chessBoard = self.__class__('empty', self.boardNo)
+        chessBoard._squares = bytearray(self._squares)
+        pieceDict = chessBoard._pieceDict
+        for coordinates, piece in self._pieceDict.items():
+            copied = pieceDict[coordinates] = piece.__class__(coordinates, piece.side, self.boardNo)
+            copied.chessBoard = chessBoard
+        chessBoard._currentSide = self._currentSide
+        chessBoard._hash = self._hash
+        chessBoard._version += 1
+        return chessBoard
 
     def currentNextMoveCapture(self):
         """returns move and capture for the current piece"""
         if not self._currentPiece:
             raise Exception("there must be an active currentPiece to call this function")
-        """returns a list containing the positions the current selected piece can move to next, and a list that the piece could capture"""
-        return self._currentPiece.validNextPositions()
+        """returns a set containing the positions the current selected piece can move to next, and a set that the piece could capture"""
+        return self.nextMoveCapture(self._currentPiece)
+
+    def nextMoveCapture(self, piece):
+        """returns validNextPositions of piece as two frozensets (move, capture), memoized until the board changes
+        so per frame callers like the renderer do not regenerate moves of an unchanged position"""
+        if self._moveCacheVersion != self._version:
+            self._moveCache = dict()
+            self._moveCacheVersion = self._version
+        cached = self._moveCache.get(piece)
+        if cached is None:
+            move, capture = piece.validNextPositions()
+            cached = self._moveCache[piece] = (frozenset(move), frozenset(capture))
+        return cached
+
+    def getVersion(self):
+        """returns a counter that changes whenever a piece is added, moved, captured or transformed"""
+        return self._version
 
 class ChessPiece:
     "superclass for all the chess pieces"
-
-    def __init__(self, coordinates=(0, 0, 0), side=0, boardNo=8, name='nameless'):      #TODO: name is redundant, consider removing it
+    # instances only hold their state, everything shared by a piece type (name, id, sprites, vectors) is a class
+    # attribute, so pieces are cheap to create and copy
+    __slots__ = ('_coordinates', 'side', 'boardNo', 'chessBoard')
+    name = 'nameless'
+    _id = None
+    _spriteAddress = None
+
+    def __init__(self, coordinates=(0, 0, 0), side=0, boardNo=8, name=None):  # name is kept for old callers, unused
         if not isinstance(coordinates, (list, tuple)) or not len(coordinates) == 3:
             raise Exception("coordinates argument must be passed as list or tuple with length of 3")
         self._coordinates = coordinates
-        self.name = name
-        self._id = None
-        self._spriteAddress = None
-        self.boardNo = boardNo  # correspond to boardSize TODO: need to check if boardNo matches before inserting it into ChessBoard
+        self.boardNo = boardNo  # correspond to boardSize, must match the ChessBoard the piece is added to
         self.side = side  # 0 for white, 1 for black
+        self.chessBoard = None
 
     def createOpposite(self, symmetryType="pointSymmetry"):
         PieceType = self.__class__
         side = not self.side
         x, y, z = self._coordinates
         coordinates = (self.boardNo - 1 - x, self.boardNo - 1 - y, self.boardNo - 1 - z)
-        oppositePiece = PieceType(coordinates, side)
+        oppositePiece = PieceType(coordinates, side, self.boardNo)
         return oppositePiece
 
     def attachChessBoard(self, ChessBoardObj):
@@ -178,6 +531,10 @@ class ChessPiece:
         # returns all valid coordinates this piece can move to or capture
         raise Exception("validMovePosition method not defined in current chess piece")
 
+    def attackedSquares(self):
+        # returns the flat indices of all squares this piece could capture on if an enemy piece stood there
+        raise Exception("attackedSquares method not defined in current chess piece")
+
     def showNextPositions(self):
         # print all valid coordinates this piece can move to or capture
         move, capture = self.validNextPositions()
@@ -190,9 +547,10 @@ class ChessPiece:
 
 class LinePiece(ChessPiece):
     # superclass for pieces like Rook, Queen and Bishop
-    def __init__(self, coordinates=(0, 0, 0), side=0, boardNo=8, name="LinePiece"):
-        super().__init__(coordinates, side, boardNo, name)
-        self.moveVectors = []  # Needs to inplement the moveVectors in subclasses
+    __slots__ = ()
+    name = "LinePiece"
+    moveVectors = ()  # Needs to inplement the moveVectors in subclasses
+    _rayTables = dict()  # (piece class, boardNo) -> ray table from movetables, shared by all instances of a class
 
     def validNextPositions(self):
         if not self.chessBoard:
@@ -200,136 +558,235 @@ class LinePiece(ChessPiece):
         """return valid coordinates to move to based on the current state of the board"""
         move = []
         capture = []
-        for vector in self.moveVectors:
-            validPosition = np.array(self._coordinates) + vector  # using numpy just for the vector addition
-            while self.chessBoard.withinBoardBoundaries(validPosition):
-                checkOccupy = self.chessBoard.positionOccupied(validPosition)
-                if not checkOccupy[0]:
-                    move.append(tuple(validPosition))
-                    validPosition += vector
+        tables = getMoveTables(self.chessBoard.boardNo)
+        rayTable = self._rayTable(tables)
+        squareCoordinates = tables.coordinates
+        squares = self.chessBoard._squares
+        for ray in rayTable[tables.index(self._coordinates)]:
+            for square in ray:  # walk the precomputed ray until the first occupied square
+                code = squares[square]
+                if not code:
+                    move.append(squareCoordinates[square])
                 else:
-                    if self.side != checkOccupy[1]:
-                        capture.append(tuple(validPosition))
+                    if self.side != code & 1:
+                        capture.append(squareCoordinates[square])
                     break
 
         return move, capture
 
+    def _rayTable(self, tables):
+        rayTable = self._rayTables.get((self.__class__, tables.boardNo))
+        if rayTable is None:
+            rayTable = self._rayTables[(self.__class__, tables.boardNo)] = tables.rays(self.moveVectors)
+        return rayTable
+
+    def attackedSquares(self):
+        """returns the flat indices of every square this piece attacks, up to and including the first occupied
+        square of each ray whichever side holds it"""
+        tables = getMoveTables(self.chessBoard.boardNo)
+        squares = self.chessBoard._squares
+        attacked = []
+        for ray in self._rayTable(tables)[tables.index(self._coordinates)]:
+            for square in ray:
+                attacked.append(square)
+                if squares[square]:
+                    break
+        return tuple(attacked)
+
 
 class Rook(LinePiece):
-    def __init__(self, coordinates=(0, 0, 0), side=0, boardNo=8, name="Rook"):
-        super().__init__(coordinates, side, boardNo, name)
-        self._id = 'Rook'
-        self._spriteAddress = ('white-rook.png', 'black-rook.png')
-        self.moveVectors = [(1, 0, 0), (-1, 0, 0), (0, 1, 0), (0, -1, 0), (0, 0, 1), (0, 0, -1)]
+    __slots__ = ()
+    typeCode = 3  # piece code on the square array is typeCode << 1 | side
+    name = "Rook"
+    _id = 'Rook'
+    _spriteAddress = ('white-rook.png', 'black-rook.png')
+    moveVectors = ((1, 0, 0), (-1, 0, 0), (0, 1, 0), (0, -1, 0), (0, 0, 1), (0, 0, -1))
 
 
 class Bishop(LinePiece):
-    def __init__(self, coordinates=(0, 0, 0), side=0, boardNo=8, name="Bishop"):
-        super().__init__(coordinates, side, boardNo, name)
-        self._id = 'Bishop'
-        self._spriteAddress = ('white-bishop.png', 'black-bishop.png')
-        self.moveVectors = [(1, 1, 0), (1, -1, 0), (-1, 1, 0), (-1, -1, 0), (1, 0, 1), (1, 0, -1), (-1, 0, 1),
-                            (-1, 0, -1), (0, 1, 1), (0, 1, -1), (0, -1, 1), (0, -1, -1)]
+    __slots__ = ()
+    typeCode = 4  # piece code on the square array is typeCode << 1 | side
+    name = "Bishop"
+    _id = 'Bishop'
+    _spriteAddress = ('white-bishop.png', 'black-bishop.png')
+    moveVectors = ((1, 1, 0), (1, -1, 0), (-1, 1, 0), (-1, -1, 0), (1, 0, 1), (1, 0, -1), (-1, 0, 1), (-1, 0, -1),
+                   (0, 1, 1), (0, 1, -1), (0, -1, 1), (0, -1, -1))
 
 
 class Queen(LinePiece):
-    def __init__(self, coordinates=(0, 0, 0), side=0, boardNo=8, name="Queen"):
-        super().__init__(coordinates, side, boardNo, name)
-        self._id = 'Queen'
-        self._spriteAddress = ('white-queen.png', 'black-queen.png')
-        self.moveVectors = [(1, 0, 0), (-1, 0, 0), (0, 1, 0), (0, -1, 0), (0, 0, 1), (0, 0, -1), (1, 1, 0), (1, -1, 0),
-                            (-1, 1, 0), (-1, -1, 0), (1, 0, 1), (1, 0, -1), (-1, 0, 1), (-1, 0, -1), (0, 1, 1),
-                            (0, 1, -1), (0, -1, 1), (0, -1, -1)]
+    __slots__ = ()
+    typeCode = 2  # piece code on the square array is typeCode << 1 | side
+    name = "Queen"
+    _id = 'Queen'
+    _spriteAddress = ('white-queen.png', 'black-queen.png')
+    moveVectors = Rook.moveVectors + Bishop.moveVectors
 
 
 class StepPiece(ChessPiece):
     # superclass for pieces like Knight and King
-    def __init__(self, coordinates=(0, 0, 0), side=0, boardNo=8, name="StepPiece"):
-        super().__init__(coordinates, side, boardNo, name)
-        self.stepVectors = []  # Needs to inplement the stepVectors in subclasses
+    __slots__ = ()
+    name = "StepPiece"
+    stepVectors = ()  # Needs to inplement the stepVectors in subclasses
+    _stepTables = dict()  # (piece class, boardNo) -> step table from movetables, shared by all instances of a class
 
     def validNextPositions(self):
         if not self.chessBoard:
             raise Exception("attach piece to ChessBoard Object before calling validMovePosition")
         move = []
         capture = []
-        for vector in self.stepVectors:
-            position = np.array(self._coordinates) + vector
-            if not self.chessBoard.withinBoardBoundaries(position):
-                continue
-            checkOccupy = self.chessBoard.positionOccupied(position)
-            if not checkOccupy[0]:
-                move.append(tuple(position))
+        tables = getMoveTables(self.chessBoard.boardNo)
+        stepTable = self._stepTable(tables)
+        squareCoordinates = tables.coordinates
+        squares = self.chessBoard._squares
+        for square in stepTable[tables.index(self._coordinates)]:
+            code = squares[square]
+            if not code:
+                move.append(squareCoordinates[square])
             else:
-                if self.side != checkOccupy[1]:
-                    capture.append(tuple(position))
+                if self.side != code & 1:
+                    capture.append(squareCoordinates[square])
 
         return move, capture
 
+    def _stepTable(self, tables):
+        stepTable = self._stepTables.get((self.__class__, tables.boardNo))
+        if stepTable is None:
+            stepTable = self._stepTables[(self.__class__, tables.boardNo)] = tables.steps(self.stepVectors)
+        return stepTable
+
+    def attackedSquares(self):
+        """returns the flat indices of every square this piece attacks, all in-bounds step targets"""
+        tables = getMoveTables(self.chessBoard.boardNo)
+        return self._stepTable(tables)[tables.index(self._coordinates)]
+
 
 class King(StepPiece):
-    def __init__(self, coordinates=(0, 0, 0), side=0, boardNo=8, name="King"):
-        super().__init__(coordinates, side, boardNo, name)
-        self._id = 'King'
-        self._spriteAddress = ('white-king.png', 'black-king.png')
-        self.stepVectors = [(1, 0, 0), (1, 1, 0), (1, -1, 0), (1, 0, 1), (1, 0, -1), (0, 0, 1), (0, 0, -1), (0, 1, 0),
-                            (0, 1, 1), (0, 1, -1), (0, -1, 0), (0, -1, 1), (0, -1, -1), (-1, 0, 0), (-1, 1, 0),
-                            (-1, -1, 0), (-1, 0, 1), (-1, 0, -1)]
+    __slots__ = ()
+    typeCode = 1  # piece code on the square array is typeCode << 1 | side
+    name = "King"
+    _id = 'King'
+    _spriteAddress = ('white-king.png', 'black-king.png')
+    stepVectors = ((1, 0, 0), (1, 1, 0), (1, -1, 0), (1, 0, 1), (1, 0, -1), (0, 0, 1), (0, 0, -1), (0, 1, 0),
+                   (0, 1, 1), (0, 1, -1), (0, -1, 0), (0, -1, 1), (0, -1, -1), (-1, 0, 0), (-1, 1, 0), (-1, -1, 0),
+                   (-1, 0, 1), (-1, 0, -1))
 
 
 class Knight(StepPiece):
-    def __init__(self, coordinates=(0, 0, 0), side=0, boardNo=8, name="Knight"):
-        super().__init__(coordinates, side, boardNo, name)
-        self._id = 'Knight'
-        self._spriteAddress = ('white-knight.png', 'black-knight.png')
-        self.stepVectors = [(2, 1, 0), (2, -1, 0), (2, 0, 1), (2, 0, -1), (-2, 1, 0), (-2, -1, 0), (-2, 0, 1),
-                            (-2, 0, -1), (1, 2, 0), (-1, 2, 0), (0, 2, 1), (0, 2, -1), (1, -2, 0), (-1, -2, 0),
-                            (0, -2, 1), (0, -2, -1), (1, 0, 2), (-1, 0, 2), (0, 1, 2), (0, -1, 2), (1, 0, -2),
-                            (-1, 0, -2), (0, 1, -2), (0, -1, -2)]
+    __slots__ = ()
+    typeCode = 5  # piece code on the square array is typeCode << 1 | side
+    name = "Knight"
+    _id = 'Knight'
+    _spriteAddress = ('white-knight.png', 'black-knight.png')
+    stepVectors = ((2, 1, 0), (2, -1, 0), (2, 0, 1), (2, 0, -1), (-2, 1, 0), (-2, -1, 0), (-2, 0, 1), (-2, 0, -1),
+                   (1, 2, 0), (-1, 2, 0), (0, 2, 1), (0, 2, -1), (1, -2, 0), (-1, -2, 0), (0, -2, 1), (0, -2, -1),
+                   (1, 0, 2), (-1, 0, 2), (0, 1, 2), (0, -1, 2), (1, 0, -2), (-1, 0, -2), (0, 1, -2), (0, -1, -2))
 
 
 class PawnPiece(ChessPiece):
-    # superclass for pieces like Knight and King
-    def __init__(self, coordinates=(0, 0, 0), side=0, boardNo=8, name="PawnPiece"):
-        super().__init__(coordinates, side, boardNo, name)
-        self.advanceVectors = []
-        self.captureVectors = []
-        self.promotionCoordinateList = []
-        self.promotionPieces = []  # List of ChessPiece Class that the pawn can be promoted into
+    # superclass for pawn pieces, side 1 moves along the negated vectors
+    __slots__ = ()
+    name = "PawnPiece"
+    advanceVectors = ()
+    captureVectors = ()
+    promotionPieces = (Queen, Rook, Bishop, Knight)  # ChessPiece classes that the pawn can be promoted into
+    _advanceTables = dict()  # (piece class, boardNo, side) -> step table of the advance vectors
+    _captureTables = dict()  # (piece class, boardNo, side) -> step table of the capture vectors
 
     def generatePromotionCoordinates(self):
         raise Exception("Needs to implement promotion coordinates function in subclasses")
 
+    @property
+    def promotionCoordinateList(self):
+        """the shared frozenset of squares where this pawn promotes"""
+        return self.generatePromotionCoordinates()
+
+    def _sideTable(self, tableCache, vectors, tables):
+        key = (self.__class__, tables.boardNo, int(self.side))
+        table = tableCache.get(key)
+        if table is None:
+            if self.side:
+                vectors = [(-x, -y, -z) for x, y, z in vectors]
+            table = tableCache[key] = tables.steps(vectors)
+        return table
+
+    def validNextPositions(self):
+        """a pawn moves one step along an advance vector onto an empty square and captures along a capture vector"""
+        if not self.chessBoard:
+            raise Exception("attach piece to ChessBoard Object before calling validMovePosition")
+        move = []
+        capture = []
+        tables = getMoveTables(self.chessBoard.boardNo)
+        index = tables.index(self._coordinates)
+        squareCoordinates = tables.coordinates
+        squares = self.chessBoard._squares
+        for square in self._sideTable(self._advanceTables, self.advanceVectors, tables)[index]:
+            if not squares[square]:
+                move.append(squareCoordinates[square])
+        for square in self._sideTable(self._captureTables, self.captureVectors, tables)[index]:
+            code = squares[square]
+            if code and self.side != code & 1:
+                capture.append(squareCoordinates[square])
+
+        return move, capture
+
+    def attackedSquares(self):
+        """returns the flat indices of the squares this pawn could capture on"""
+        tables = getMoveTables(self.chessBoard.boardNo)
+        return self._sideTable(self._captureTables, self.captureVectors, tables)[tables.index(self._coordinates)]
+
+    def promotionMoves(self, targets):
+        """returns the moves of this pawn to targets, a move onto a promotion square once per promotion class"""
+        origin = self._coordinates
+        moves = []
+        for target in targets:
+            if target in self.promotionCoordinateList:
+                moves += [(origin, target, pieceClass) for pieceClass in self.promotionPieces]
+            else:
+                moves.append((origin, target))
+        return moves
+
 
 class VortexPawn(PawnPiece):
-    def __init__(self, coordinates=(0, 0, 0), side=0, boardNo=8, name="Vortex Pawn"):
-        super().__init__(coordinates, side, boardNo, name)
-        self._id = 'VortexPawn'
-        self._spriteAddress = ('white-pawn.png', 'black-pawn.png')
-        self.advanceVectors = [(1, 0, 0), (0, 1, 0), (0, 0, 1)]
-        self.captureVectors = [(1, 1, 0), (1, 0, 1), (0, 1, 1)]
-        self.promotionCoordinateList = self.generatePromotionCoordinates()
-        self.boardNo = 8
+    __slots__ = ()
+    typeCode = 6  # piece code on the square array is typeCode << 1 | side
+    name = "Vortex Pawn"
+    _id = 'VortexPawn'
+    _spriteAddress = ('white-pawn.png', 'black-pawn.png')
+    advanceVectors = ((1, 0, 0), (0, 1, 0), (0, 0, 1))
+    captureVectors = ((1, 1, 0), (1, 0, 1), (0, 1, 1))
+    _promotionSquares = dict()  # (boardNo, side) -> frozenset of promotion coordinates, shared by all pawns
 
     def generatePromotionCoordinates(self):
-        coordinateList = []
-        for x in range(self.boardNo):
-            if not x >= (self.boardNo / 2):
-                continue
-            for y in range(self.boardNo):
-                if not y >= (self.boardNo / 2):
-                    continue
-                for z in range(self.boardNo):
-                    if not z >= (self.boardNo / 2):
-                        continue
-                    if x == (self.boardNo - 1) or y == (self.boardNo - 1) or z == (self.boardNo - 1):
-                        coordinateList += [(x, y, z)]
+        """returns the frozenset of squares where a pawn of this side promotes: the outer faces of the far octant
+        of the cube, point mirrored for side 1; computed once per boardNo and side"""
+        key = (self.boardNo, int(self.side))
+        promotionSquares = self._promotionSquares.get(key)
+        if promotionSquares is None:
+            boardNo = self.boardNo
+            half = range((boardNo + 1) // 2, boardNo)
+            squares = [(x, y, z) for x in half for y in half for z in half
+                       if x == boardNo - 1 or y == boardNo - 1 or z == boardNo - 1]
+            if self.side:
+                squares = [(boardNo - 1 - x, boardNo - 1 - y, boardNo - 1 - z) for x, y, z in squares]
+            promotionSquares = self._promotionSquares[key] = frozenset(squares)
+        return promotionSquares
 
-        return coordinateList
 
-    # def promotion TODO： function for promotion, might need to implement it in ChessBoard
+pieceClasses = {pieceClass.typeCode: pieceClass for pieceClass in (King, Queen, Rook, Bishop, Knight, VortexPawn)}
+
+
+def pieceCode(piece):
+    """returns the one byte code of piece used by the square array of ChessBoard"""
+    return piece.typeCode << 1 | int(piece.side)
+
+
+def pieceFromCode(code, coordinates, boardNo=8):
+    """creates a ChessPiece object from a square array code"""
+    return pieceClasses[code >> 1](coordinates, code & 1, boardNo)
 
 if __name__ == '__main__':
+    import numpy as np  # only the tests use numpy, the rules import without it
+
     # section for testing the functions
     # ChessBoard
     testChessBoard = ChessBoard(boardNo=8, dimensions=3)
@@ -360,4 +817,81 @@ if __name__ == '__main__':
     queent = testChessBoard.transformPiece(pawn1, Queen)
     print(testChessBoard._pieceDict, queent.validNextPositions())
 
-
+    # a piece that is not on its square cannot be transformed over the occupant
+    testChessBoard.addPiece(Rook((5, 5, 5)))
+    refused = False
+    try:
+        testChessBoard.transformPiece(Knight((5, 5, 5), 0), Queen)
+    except Exception as error:
+        refused = 'can only transform' in str(error)
+    assert refused and testChessBoard.getPieceByCoordinate((5, 5, 5)).getID() == 'Rook'
+    assert testChessBoard.positionHash() == testChessBoard._zobrist.hashSquares(testChessBoard._squares,
+                                                                                testChessBoard._currentSide)
+    testChessBoard._liftPiece((5, 5, 5))
+
+    # test for the square array and packed positions
+    assert testChessBoard.positionOccupied((1, 2, 3)) == (True, 0)
+    assert testChessBoard.positionOccupied((1, 2, 4)) == (False, 0)
+    copiedChessBoard = testChessBoard.copy()
+    assert copiedChessBoard.pack() == testChessBoard.pack() and len(copiedChessBoard.pack()) == 8 ** 3 + 1
+    assert copiedChessBoard.getPieceByCoordinate((1, 2, 3)).getID() == 'Rook'
+    assert copiedChessBoard.getPieceByCoordinate((1, 2, 3)) is not rook1
+
+    # test for makeMove and unmakeMove
+    testChessBoard = ChessBoard('testing')
+    packedLayout = testChessBoard.pack()
+    for move in testChessBoard.generateMoves():
+        testChessBoard.makeMove(move)
+        for reply in testChessBoard.generateMoves():
+            testChessBoard.makeMove(reply)
+            testChessBoard.unmakeMove()
+        assert testChessBoard.unmakeMove() == move
+        assert testChessBoard.pack() == packedLayout
+
+    # test for the incremental zobrist hash
+    assert testChessBoard.positionHash() == ChessBoard('testing').positionHash()
+    for move in testChessBoard.generateMoves():
+        testChessBoard.makeMove(move)
+        assert testChessBoard.positionHash() == testChessBoard.copy().positionHash()
+        testChessBoard.unmakeMove()
+
+    # test for the incremental attack maps
+    testChessBoard = ChessBoard('empty')
+    testChessBoard.addPieces([King((0, 0, 0), 0), Knight((0, 0, 3), 0), Rook((0, 0, 5), 1), King((7, 7, 7), 1)])
+    assert testChessBoard.isSquareAttacked((0, 0, 4), 1) and not testChessBoard.isSquareAttacked((0, 0, 2), 1)
+    assert not testChessBoard.inCheck(0)
+    assert all(move[0] == (0, 0, 0) for move in testChessBoard.generateLegalMoves(0))  # the knight is pinned
+    testChessBoard.makeMove(((0, 0, 3), (1, 0, 5)))
+    assert testChessBoard.inCheck(0) and testChessBoard.attackCount((0, 0, 1), 1) == 1
+    testChessBoard.unmakeMove()
+    assert not testChessBoard.isSquareAttacked((0, 0, 2), 1)
+
+    # test for the vortex layout and pawn promotion
+    testChessBoard = ChessBoard('vortex')
+    assert len(testChessBoard.getpieceList()) == 40 and len(testChessBoard.generateMoves()) == 129
+    testChessBoard = ChessBoard('empty')
+    testChessBoard.addPieces([VortexPawn((7, 6, 6), 0), VortexPawn((1, 1, 1), 1)])
+    packedLayout = testChessBoard.pack()
+    promotions = [move for move in testChessBoard.generateMoves(0) if len(move) > 2]
+    assert len(promotions) == 8  # two promotion squares, four promotion classes each
+    testChessBoard.makeMove(((7, 6, 6), (7, 7, 6), Knight))
+    assert testChessBoard.getPieceByCoordinate((7, 7, 6)).getID() == 'Knight'
+    assert testChessBoard.unmakeMove() == ((7, 6, 6), (7, 7, 6), Knight)
+    assert testChessBoard.pack() == packedLayout
+    assert VortexPawn().promotionCoordinateList is VortexPawn((1, 1, 1)).promotionCoordinateList
+
+    # test for other board sizes: layouts are mirrored through the centre of the board they are set up on
+    for boardNo in (5, 10, 16):
+        testChessBoard = ChessBoard('vortex', boardNo)
+        farCorner = (boardNo - 1,) * 3
+        assert testChessBoard.getPieceByCoordinate(farCorner).getID() == 'King'
+        assert all(piece.boardNo == boardNo for piece in testChessBoard.getpieceList())
+        copiedChessBoard = testChessBoard.copy()
+        assert copiedChessBoard.pack() == testChessBoard.pack()
+        assert copiedChessBoard.positionHash() == testChessBoard.positionHash()
+        assert ChessBoard.fromPacked(testChessBoard.pack(), boardNo).positionHash() == testChessBoard.positionHash()
+    try:
+        ChessBoard('testing', 5)  # the knight on (2, 2, 2) would meet its own mirror image
+        raise AssertionError("the testing layout must not fit on a 5 board")
+    except Exception as error:
+        assert 'does not fit' in str(error)
@@ -0,0 +1,297 @@
+"""alpha-beta search engine for ChessBoard
+
+negamax with alpha-beta pruning and iterative deepening under a depth, time or node budget, using the transposition
+table, MVV-LVA capture ordering, killer and history heuristics and a quiescence search over the captures the pieces
+return. there is no check in the rules, a side loses when its king is captured, so capturing a king scores MATE
+leaves are scored by the incremental Evaluator of evaluation.py unless another evaluate function is given
+
+usage: python engine.py [--layout testing] [--position HEX] [--boardNo 8] [--depth 4] [--time 10] [--nodes N]
+                        [--mobility 2]
+"""
+import argparse
+import sys
+import time
+from collections import namedtuple
+
+from components import ChessBoard, King, pieceClasses
+from evaluation import Evaluator, PIECEVALUES, MOBILITYWEIGHT
+from transposition import TranspositionTable, EXACT, LOWERBOUND, UPPERBOUND, NOMOVE
+
+MATE = 100000
+INFINITE = MATE + 1
+MAXPLY = 64
+
+# values by typeCode, capturing the king ends the game so it is the most valuable victim for move ordering
+TYPEVALUES = [0] * (max(pieceClasses) + 1)
+ORDERVALUES = [0] * (max(pieceClasses) + 1)
+for _typeCode, _pieceClass in pieceClasses.items():
+    TYPEVALUES[_typeCode] = ORDERVALUES[_typeCode] = PIECEVALUES[_pieceClass.__name__]
+ORDERVALUES[King.typeCode] = 10 * MATE
+KINGTYPE = King.typeCode
+
+SearchResult = namedtuple('SearchResult', 'bestMove score pv depth nodes seconds nodesPerSecond')
+
+
+def isMateScore(score):
+    return abs(score) >= MATE - MAXPLY
+
+
+class SearchEngine:
+    "searches the best move of a ChessBoard position, one engine can be reused across positions"
+
+    def __init__(self, ttMegabytes=16, ttPolicy='depth', evaluate=None):
+        self.tt = TranspositionTable(ttMegabytes, ttPolicy)
+        if evaluate is None:
+            evaluate = Evaluator()
+        self.evaluator = evaluate if isinstance(evaluate, Evaluator) else None  # attached to the board for each search
+        self.evaluate = evaluate  # function of a ChessBoard, scored for the side to move
+        self.nodes = 0
+        self._board = None
+        self._stopped = False
+        self._deadline = None
+        self._nodeLimit = None
+        self._killers = []
+        self._history = dict()
+        self._pv = []
+
+    def search(self, chessBoard, maxDepth=MAXPLY, timeLimit=None, nodeLimit=None, callback=None):
+        """searches chessBoard by iterative deepening until maxDepth, timeLimit seconds or nodeLimit nodes is reached
+        returns the SearchResult of the deepest completed iteration, callback is called with every one of them
+        the board is searched in place with makeMove/unmakeMove and left unchanged"""
+        self._begin(chessBoard, timeLimit, nodeLimit)
+        start = time.perf_counter()
+        result = SearchResult(None, 0, [], 0, 0, 0.0, 0.0)
+        for depth in range(1, min(maxDepth, MAXPLY) + 1):
+            self._pv = [[] for _ in range(MAXPLY + 2)]
+            score = self._negamax(depth, -INFINITE, INFINITE, 0)
+            if self._stopped and result.bestMove is not None:
+                break  # the unfinished iteration is thrown away
+            seconds = time.perf_counter() - start
+            pv = self._pv[0]
+            result = SearchResult(pv[0] if pv else None, score, pv, depth, self.nodes, seconds,
+                                  self.nodes / seconds if seconds > 0 else 0.0)
+            if callback:
+                callback(result)
+            if self._stopped or isMateScore(score) or not pv:
+                break
+        self._end()
+        return result
+
+    def quiescenceScore(self, chessBoard, timeLimit=None, nodeLimit=None):
+        """returns the score of chessBoard for the side to move after resolving captures only, the value a depth 1
+        search gives the position after each root move"""
+        self._begin(chessBoard, timeLimit, nodeLimit)
+        self._pv = [[] for _ in range(MAXPLY + 2)]
+        score = self._quiescence(-INFINITE, INFINITE, 0)
+        self._end()
+        return score
+
+    def _begin(self, chessBoard, timeLimit, nodeLimit):
+        self._board = chessBoard
+        if self.evaluator is not None:
+            self.evaluator.attach(chessBoard)
+            self.evaluate = self.evaluator.evaluate
+        self._stopped = False
+        self._deadline = time.perf_counter() + timeLimit if timeLimit else None
+        self._nodeLimit = nodeLimit
+        self._killers = [[NOMOVE, NOMOVE] for _ in range(MAXPLY + 2)]
+        self._history = dict()
+        self.nodes = 0
+        self.tt.newSearch()
+
+    def _end(self):
+        if self.evaluator is not None:
+            self.evaluator.detach()
+        self._board = None
+
+    def _checkLimits(self):
+        if self._deadline is not None and time.perf_counter() >= self._deadline:
+            self._stopped = True
+        if self._nodeLimit is not None and self.nodes >= self._nodeLimit:
+            self._stopped = True
+
+    def _orderMoves(self, moves, ttMove, ply):
+        """returns [(move, moveCode, victimType)] sorted best first:
+        transposition table move, captures by MVV-LVA, killer moves, then quiet moves by history score
+        moveCode is (origin index * squareCount + target index) << 3 | promotion typeCode, the layout of
+        gamerecord.encodeMove, so every promotion choice of a pawn move has a code of its own"""
+        board = self._board
+        squares = board._squares
+        index = board._tables.index
+        squareCount = board._tables.squareCount
+        killers = self._killers[ply]
+        history = self._history
+        scored = []
+        for move in moves:
+            origin, target = index(move[0]), index(move[1])
+            code = (origin * squareCount + target) << 3 | (move[2].typeCode if len(move) > 2 else 0)
+            victim = squares[target] >> 1
+            if code == ttMove:
+                order = 1 << 40
+            elif victim:
+                order = (1 << 30) + ORDERVALUES[victim] * 16 - TYPEVALUES[squares[origin] >> 1] // 16
+            elif len(move) > 2:
+                order = (1 << 30) + TYPEVALUES[move[2].typeCode]  # quiet promotion
+            elif code == killers[0]:
+                order = 1 << 29
+            elif code == killers[1]:
+                order = (1 << 29) - 1
+            else:
+                order = history.get(code, 0)
+            scored.append((order, move, code, victim))
+        scored.sort(key=lambda entry: entry[0], reverse=True)
+        return [entry[1:] for entry in scored]
+
+    def _negamax(self, depth, alpha, beta, ply):
+        if depth <= 0 or ply >= MAXPLY:
+            return self._quiescence(alpha, beta, ply)
+        self.nodes += 1
+        if not self.nodes & 1023:
+            self._checkLimits()
+        if self._stopped:
+            return 0
+        board = self._board
+        self._pv[ply] = []
+
+        key = board.positionHash()
+        ttMove = NOMOVE
+        entry = self.tt.probe(key)
+        if entry is not None:
+            ttDepth, ttScore, ttFlag, ttMove = entry
+            if ply > 0 and ttDepth >= depth:
+                ttScore = scoreFromTable(ttScore, ply)
+                if ttFlag == EXACT or (ttFlag == LOWERBOUND and ttScore >= beta) or \
+                        (ttFlag == UPPERBOUND and ttScore <= alpha):
+                    return ttScore
+
+        moves = board.generateMoves()
+        if not moves:
+            return 0  # nothing can move, scored as a draw
+        alphaOriginal = alpha
+        bestScore, bestCode = -INFINITE, NOMOVE
+        for move, code, victim in self._orderMoves(moves, ttMove, ply):
+            if victim == KINGTYPE:
+                score = MATE - ply - 1
+                self._pv[ply + 1] = []
+            else:
+                board.makeMove(move)
+                score = -self._negamax(depth - 1, -beta, -alpha, ply + 1)
+                board.unmakeMove()
+                if self._stopped:
+                    return 0
+            if score > bestScore:
+                bestScore, bestCode = score, code
+                if score > alpha:
+                    alpha = score
+                    self._pv[ply] = [move] + self._pv[ply + 1]
+                    if alpha >= beta:
+                        if not victim:
+                            self._storeKiller(code, ply)
+                            self._history[code] = self._history.get(code, 0) + depth * depth
+                        break
+
+        if bestScore <= alphaOriginal:
+            flag = UPPERBOUND
+        elif bestScore >= beta:
+            flag = LOWERBOUND
+        else:
+            flag = EXACT
+        self.tt.store(key, depth, scoreToTable(bestScore, ply), flag, bestCode)
+        return bestScore
+
+    def _storeKiller(self, code, ply):
+        killers = self._killers[ply]
+        if killers[0] != code:
+            killers[1] = killers[0]
+            killers[0] = code
+
+    def _quiescence(self, alpha, beta, ply):
+        """searches captures only until the position is quiet, the side to move may stand pat on the evaluation"""
+        self.nodes += 1
+        if not self.nodes & 1023:
+            self._checkLimits()
+        if self._stopped:
+            return 0
+        board = self._board
+        self._pv[ply] = []
+        standPat = self.evaluate(board)
+        if standPat >= beta or ply >= MAXPLY:
+            return standPat
+        if standPat > alpha:
+            alpha = standPat
+        for move, code, victim in self._orderMoves(board.generateCaptures(), NOMOVE, ply):
+            if victim == KINGTYPE:
+                return MATE - ply - 1
+            board.makeMove(move)
+            score = -self._quiescence(-beta, -alpha, ply + 1)
+            board.unmakeMove()
+            if self._stopped:
+                return 0
+            if score > alpha:
+                if score >= beta:
+                    return score
+                alpha = score
+                self._pv[ply] = [move] + self._pv[ply + 1]
+        return alpha
+
+
+def scoreToTable(score, ply):
+    """mate scores are stored relative to the position rather than the root"""
+    if score >= MATE - MAXPLY:
+        return score + ply
+    if score <= -MATE + MAXPLY:
+        return score - ply
+    return score
+
+
+def scoreFromTable(score, ply):
+    if score >= MATE - MAXPLY:
+        return score - ply
+    if score <= -MATE + MAXPLY:
+        return score + ply
+    return score
+
+
+def analyse(chessBoard, maxDepth=MAXPLY, timeLimit=None, nodeLimit=None, ttMegabytes=16):
+    """searches chessBoard with a fresh SearchEngine and returns the SearchResult"""
+    return SearchEngine(ttMegabytes).search(chessBoard, maxDepth, timeLimit, nodeLimit)
+
+
+def formatMove(move):
+    origin, target = move[0], move[1]
+    text = '%s-%s' % (''.join(str(n) for n in origin), ''.join(str(n) for n in target))
+    if len(move) > 2:
+        text += '=' + move[2].__name__
+    return text
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="search the best move of a 3D chess position")
+    parser.add_argument('--layout', default='testing', help="initial layout passed to ChessBoard")
+    parser.add_argument('--position', help="hex string of a position produced by ChessBoard.pack, overrides --layout")
+    parser.add_argument('--boardNo', type=int, default=8)
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--time', type=float, help="time budget in seconds")
+    parser.add_argument('--nodes', type=int, help="node budget")
+    parser.add_argument('--hash', type=float, default=16, help="transposition table size in megabytes")
+    parser.add_argument('--mobility', type=int, default=MOBILITYWEIGHT, help="evaluation weight of an attacked square")
+    args = parser.parse_args(argv)
+
+    if args.position:
+        chessBoard = ChessBoard.fromPacked(bytes.fromhex(args.position), args.boardNo)
+    else:
+        chessBoard = ChessBoard(args.layout, args.boardNo)
+
+    def report(result):
+        print('depth %d score %d nodes %d time %.3fs nps %.0f pv %s' % (
+            result.depth, result.score, result.nodes, result.seconds, result.nodesPerSecond,
+            ' '.join(formatMove(move) for move in result.pv)))
+
+    engine = SearchEngine(args.hash, evaluate=Evaluator(args.mobility))
+    result = engine.search(chessBoard, args.depth, args.time, args.nodes, report)
+    print('bestmove %s' % (formatMove(result.bestMove) if result.bestMove else 'none'))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
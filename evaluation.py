@@ -0,0 +1,142 @@
+"""static evaluation of ChessBoard positions
+
+the score is material plus a piece-square value per (piece code, square): centrality, measured by the distance
+from the centre of the cube, for every piece and advancement towards the far corner for pawns. side 1 uses the
+point mirrored square, so both sides are scored alike. mobility, the number of squares each side attacks, is read
+from the board's incrementally kept attack maps when an Evaluator is given a mobilityWeight
+
+an Evaluator observes the square array of the board it is attached to (ChessBoard.addSquareObserver), so the
+material and piece-square sum is updated by the piece placed or lifted on every make and unmake; evaluate costs O(1)
+and fullEvaluation recomputes everything from the piece list to verify it
+"""
+from components import pieceClasses
+
+PIECEVALUES = {'King': 0, 'Queen': 900, 'Rook': 500, 'Bishop': 330, 'Knight': 320, 'VortexPawn': 100}
+# bonus of a piece on the centre square, falling linearly to 0 in the corners
+CENTRALITY = {'King': -20, 'Queen': 20, 'Rook': 10, 'Bishop': 25, 'Knight': 40, 'VortexPawn': 10}
+PAWNADVANCE = 60  # bonus of a pawn that reached the far corner, from 0 on its starting corner
+MOBILITYWEIGHT = 0  # per attacked square; off by default, keeping attack maps slows make/unmake about 2.5 times
+
+_tablesCache = dict()
+
+
+def squareValueTables(boardNo=8):
+    """returns a list indexed by piece code of the value of that piece on every square (by flat index), positive for
+    side 0 and negative for side 1, shared per boardNo"""
+    tables = _tablesCache.get(boardNo)
+    if tables is not None:
+        return tables
+    squareCount = boardNo ** 3
+    reach = 3 * (boardNo - 1)
+    centrality = []
+    advance = []
+    for x in range(boardNo):
+        for y in range(boardNo):
+            for z in range(boardNo):
+                distance = abs(2 * x - boardNo + 1) + abs(2 * y - boardNo + 1) + abs(2 * z - boardNo + 1)
+                centrality.append((reach - distance) / reach)
+                advance.append((x + y + z) / reach)
+    tables = [None] * (2 * max(pieceClasses) + 2)
+    for typeCode, pieceClass in pieceClasses.items():
+        name = pieceClass.__name__
+        values = []
+        for index in range(squareCount):
+            value = PIECEVALUES[name] + CENTRALITY[name] * centrality[index]
+            if name == 'VortexPawn':
+                value += PAWNADVANCE * advance[index]
+            values.append(round(value))
+        tables[typeCode << 1] = tuple(values)
+        tables[typeCode << 1 | 1] = tuple(-values[squareCount - 1 - index] for index in range(squareCount))
+    _tablesCache[boardNo] = tables
+    return tables
+
+
+class Evaluator:
+    "incremental evaluation of the board it is attached to"
+
+    def __init__(self, mobilityWeight=MOBILITYWEIGHT):
+        self.mobilityWeight = mobilityWeight
+        self.chessBoard = None
+        self.score = 0  # material and piece-square sum, from side 0's point of view
+        self._values = None
+
+    def attach(self, chessBoard):
+        """starts following chessBoard, detaching from the previous board"""
+        if self.chessBoard is chessBoard:
+            return
+        self.detach()
+        self.chessBoard = chessBoard
+        self._values = squareValueTables(chessBoard.boardNo)
+        if self.mobilityWeight:
+            chessBoard.enableAttackMaps()
+        chessBoard.addSquareObserver(self)
+
+    def detach(self):
+        if self.chessBoard is not None:
+            self.chessBoard.removeSquareObserver(self)
+            self.chessBoard = None
+
+    # square observer
+    def piecePlaced(self, index, code):
+        self.score += self._values[code][index]
+
+    def pieceLifted(self, index, code):
+        self.score -= self._values[code][index]
+
+    def positionReset(self, chessBoard):
+        self.score = self._squareSum(chessBoard)
+
+    def _squareSum(self, chessBoard):
+        values = self._values
+        return sum(values[code][index] for index, code in enumerate(chessBoard._squares) if code)
+
+    def evaluate(self, chessBoard=None):
+        """returns the score of the attached board from the point of view of the side to move"""
+        chessBoard = self.chessBoard if chessBoard is None else chessBoard
+        if chessBoard is not self.chessBoard:
+            raise Exception("evaluate must be called with the board the evaluator is attached to")
+        score = self.score
+        if self.mobilityWeight:
+            totals = chessBoard._attackTotals
+            score += self.mobilityWeight * (totals[0] - totals[1])
+        return -score if chessBoard.getCurrentSide() else score
+
+    __call__ = evaluate
+
+    def fullEvaluation(self, chessBoard):
+        """evaluate recomputed from the piece list of chessBoard, without any incremental state"""
+        values = squareValueTables(chessBoard.boardNo)
+        score = 0
+        for piece in chessBoard.getpieceList():
+            code = piece.typeCode << 1 | int(piece.side)
+            score += values[code][chessBoard.squareIndex(piece.getCoordinates())]
+        if self.mobilityWeight:
+            for piece in chessBoard.getpieceList():
+                attacked = len(piece.attackedSquares())
+                score += self.mobilityWeight * (-attacked if piece.side else attacked)
+        return -score if chessBoard.getCurrentSide() else score
+
+
+def evaluatePosition(chessBoard, mobilityWeight=MOBILITYWEIGHT):
+    """returns the full evaluation of chessBoard for the side to move, for one-off use outside a search"""
+    return Evaluator(mobilityWeight).fullEvaluation(chessBoard)
+
+
+if __name__ == '__main__':
+    import random
+    from components import ChessBoard
+
+    # the incremental score must match a full recompute after any sequence of makes and unmakes
+    for weight in (0, 2):
+        chessBoard = ChessBoard('testing')
+        evaluator = Evaluator(weight)
+        evaluator.attach(chessBoard)
+        rng = random.Random(weight)
+        for _ in range(200):
+            if chessBoard.getMoveHistory() and rng.random() < 0.3:
+                chessBoard.unmakeMove()
+            else:
+                chessBoard.makeMove(rng.choice(chessBoard.generateMoves()))
+            assert evaluator.evaluate() == evaluator.fullEvaluation(chessBoard)
+    assert evaluatePosition(ChessBoard('testing')) == 0
+    print('evaluation ok')
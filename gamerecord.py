@@ -0,0 +1,252 @@
+"""compact binary game records
+
+a record file is a plain concatenation of games, so games can be appended and read back one at a time. a game is
+
+    header   magic b'3DCG', format version, boardNo, length + utf-8 layout name, length + utf-8 JSON metadata,
+             a flag byte and, if the flag is 1, the packed start position (ChessBoard.pack)
+    moves    MOVEBYTES(boardNo) bytes each, big endian ((origin index << bits | target index) << 3 | promotion)
+             where bits is the width of a square index and promotion is the typeCode of the promoted piece or 0
+    end      MOVEBYTES(boardNo) zero bytes, a move never encodes to 0 as origin and target differ
+
+on the 8x8x8 board a move takes 3 bytes
+"""
+import json
+import struct
+
+from components import ChessBoard, pieceClasses
+
+MAGIC = b'3DCG'
+VERSION = 1
+_header = struct.Struct('>4sBBB')  # magic, version, boardNo, layout name length
+_length = struct.Struct('>I')
+
+
+def squareBits(boardNo):
+    """returns the number of bits of a flat square index of a boardNo ** 3 board"""
+    return (boardNo ** 3 - 1).bit_length()
+
+
+def moveBytes(boardNo):
+    """returns the size in bytes of one encoded move"""
+    return (2 * squareBits(boardNo) + 3 + 7) // 8
+
+
+def encodeMove(move, boardNo):
+    """returns move (origin, target[, promotion class]) as an int, see the module docstring"""
+    bits = squareBits(boardNo)
+    origin = (move[0][0] * boardNo + move[0][1]) * boardNo + move[0][2]
+    target = (move[1][0] * boardNo + move[1][1]) * boardNo + move[1][2]
+    promotion = move[2].typeCode if len(move) > 2 and move[2] is not None else 0
+    return (origin << bits | target) << 3 | promotion
+
+
+def decodeMove(code, boardNo):
+    """inverse of encodeMove, returns (origin, target) or (origin, target, promotion class)"""
+    bits = squareBits(boardNo)
+    promotion = code & 7
+    code >>= 3
+    origin, target = code >> bits, code & ((1 << bits) - 1)
+    origin = (origin // (boardNo * boardNo), origin // boardNo % boardNo, origin % boardNo)
+    target = (target // (boardNo * boardNo), target // boardNo % boardNo, target % boardNo)
+    if promotion:
+        return origin, target, pieceClasses[promotion]
+    return origin, target
+
+
+class GameRecord:
+    "one game read from a record file"
+
+    def __init__(self, boardNo, initialLayout, metadata, startPosition, moves):
+        self.boardNo = boardNo
+        self.initialLayout = initialLayout
+        self.metadata = metadata
+        self.startPosition = startPosition  # packed position, None if the game starts from initialLayout
+        self.moves = moves
+
+    def startingBoard(self):
+        """returns a new ChessBoard set up at the start of the game"""
+        if self.startPosition is not None:
+            return ChessBoard.fromPacked(self.startPosition, self.boardNo)
+        return ChessBoard(self.initialLayout, self.boardNo)
+
+    def positions(self):
+        """replays the game lazily, yielding the ChessBoard at the start and after every move
+        the same ChessBoard object is yielded each time, it is changed in place as the game goes on"""
+        chessBoard = self.startingBoard()
+        yield chessBoard
+        for move in self.moves:
+            chessBoard.makeMove(move)
+            yield chessBoard
+
+    def finalBoard(self):
+        """returns the ChessBoard after the last move"""
+        for chessBoard in self.positions():
+            pass
+        return chessBoard
+
+
+class GameRecordWriter:
+    "writes games move by move to a binary stream, e.g. a file opened with 'ab'"
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._boardNo = None  # boardNo of the game being written, None between games
+        self._moveBytes = 0
+        self._chessBoard = None
+
+    def beginGame(self, boardNo=8, initialLayout='empty', metadata=None, startPosition=None):
+        """writes the header of a new game, startPosition is a packed position if the game does not start from
+        initialLayout"""
+        if self._boardNo is not None:
+            self.endGame()
+        name = initialLayout.encode('utf-8')
+        info = json.dumps(metadata or {}, separators=(',', ':')).encode('utf-8')
+        self.stream.write(_header.pack(MAGIC, VERSION, boardNo, len(name)) + name + _length.pack(len(info)) + info)
+        if startPosition is None:
+            self.stream.write(b'\x00')
+        else:
+            self.stream.write(b'\x01' + bytes(startPosition))
+        self._boardNo = boardNo
+        self._moveBytes = moveBytes(boardNo)
+
+    def writeMove(self, move):
+        if self._boardNo is None:
+            raise Exception("beginGame must be called before writing moves")
+        self.stream.write(encodeMove(move, self._boardNo).to_bytes(self._moveBytes, 'big'))
+
+    def endGame(self):
+        """writes the end marker of the current game and stops following its ChessBoard"""
+        if self._boardNo is None:
+            return
+        self.stream.write(bytes(self._moveBytes))
+        self._boardNo = None
+        if self._chessBoard is not None:
+            self._chessBoard.removeMoveListener(self._onMove)
+            self._chessBoard = None
+
+    def recordChessBoard(self, chessBoard, initialLayout=None, metadata=None, fromCurrentPosition=False):
+        """begins a game for chessBoard and writes every move played on it (playMove, moveCurrentPiece) as it
+        happens, until endGame; the current position is stored as the start position with fromCurrentPosition or
+        when initialLayout, the layout chessBoard was set up with, is not given"""
+        if initialLayout is None:
+            initialLayout, fromCurrentPosition = 'empty', True
+        self.beginGame(chessBoard.boardNo, initialLayout, metadata,
+                       chessBoard.pack() if fromCurrentPosition else None)
+        self._chessBoard = chessBoard
+        chessBoard.addMoveListener(self._onMove)
+
+    def _onMove(self, chessBoard, move):
+        self.writeMove(move)
+
+    def writeGame(self, moves, boardNo=8, initialLayout='empty', metadata=None, startPosition=None):
+        """writes a whole game at once"""
+        self.beginGame(boardNo, initialLayout, metadata, startPosition)
+        for move in moves:
+            self.writeMove(move)
+        self.endGame()
+
+    def close(self):
+        self.endGame()
+        self.stream.close()
+
+
+def _readExactly(stream, size):
+    data = stream.read(size)
+    if len(data) != size:
+        raise Exception("game record ends in the middle of a game")
+    return data
+
+
+def readGames(stream):
+    """yields a GameRecord for every game of a binary stream, reading one game at a time"""
+    while True:
+        header = stream.read(_header.size)
+        if not header:
+            return
+        if len(header) != _header.size:
+            raise Exception("game record ends in the middle of a header")
+        magic, version, boardNo, nameLength = _header.unpack(header)
+        if magic != MAGIC or version != VERSION:
+            raise Exception("not a game record, or a record of an unknown version")
+        initialLayout = _readExactly(stream, nameLength).decode('utf-8')
+        metadata = json.loads(_readExactly(stream, _length.unpack(_readExactly(stream, _length.size))[0]))
+        startPosition = None
+        if _readExactly(stream, 1) == b'\x01':
+            startPosition = _readExactly(stream, boardNo ** 3 + 1)
+        size = moveBytes(boardNo)
+        moves = []
+        while True:
+            code = int.from_bytes(_readExactly(stream, size), 'big')
+            if not code:
+                break
+            moves.append(decodeMove(code, boardNo))
+        yield GameRecord(boardNo, initialLayout, metadata, startPosition, moves)
+
+
+def readGameFile(path):
+    """yields the games of the record file at path"""
+    with open(path, 'rb') as stream:
+        yield from readGames(stream)
+
+
+if __name__ == '__main__':
+    import io
+    import random
+    from components import King, VortexPawn, Queen
+
+    def playedGame(chessBoard, plies, seed):
+        """plays plies random moves on chessBoard, returns them"""
+        rng = random.Random(seed)
+        moves = []
+        for _ in range(plies):
+            moves.append(rng.choice(chessBoard.generateMoves()))
+            chessBoard.makeMove(moves[-1])
+        return moves
+
+    # a game from a layout, a game from a start position with a promotion and a game on the largest board
+    games = []
+    chessBoard = ChessBoard('testing', 8)
+    games.append((8, 'testing', {'round': 1}, None, playedGame(chessBoard, 20, 1), chessBoard.pack()))
+    chessBoard = ChessBoard('empty', 8)
+    chessBoard.addPieces([King((0, 0, 0), 0), King((7, 7, 7), 1), VortexPawn((6, 6, 5), 0)])
+    startPosition = chessBoard.pack()
+    moves = [((6, 6, 5), (7, 6, 5), Queen)]
+    chessBoard.makeMove(moves[0])
+    moves += playedGame(chessBoard, 4, 2)
+    games.append((8, 'empty', {}, startPosition, moves, chessBoard.pack()))
+    chessBoard = ChessBoard('testing', 16)
+    games.append((16, 'testing', {'white': 'a', 'black': 'b'}, None, playedGame(chessBoard, 20, 3),
+                  chessBoard.pack()))
+    assert moveBytes(8) == 3 and moveBytes(16) == 4
+
+    stream = io.BytesIO()
+    writer = GameRecordWriter(stream)
+    for boardNo, initialLayout, metadata, startPosition, moves, finalPosition in games:
+        writer.writeGame(moves, boardNo, initialLayout, metadata, startPosition)
+    # the same first game again, recorded while it is played
+    chessBoard = ChessBoard('testing', 8)
+    writer.recordChessBoard(chessBoard, 'testing', {'round': 1})
+    for move in games[0][4]:
+        chessBoard.playMove(move)
+    writer.endGame()
+    games.append(games[0])
+    # without its layout a game is recorded from the position the board is in
+    chessBoard = ChessBoard('testing', 8)
+    startPosition = chessBoard.pack()
+    writer.recordChessBoard(chessBoard)
+    moves = []
+    for move in playedGame(chessBoard.copy(), 6, 4):
+        chessBoard.playMove(move)
+        moves.append(move)
+    writer.endGame()
+    games.append((8, 'empty', {}, startPosition, moves, chessBoard.pack()))
+
+    stream.seek(0)
+    records = list(readGames(stream))
+    assert len(records) == len(games)
+    for record, (boardNo, initialLayout, metadata, startPosition, moves, finalPosition) in zip(records, games):
+        assert (record.boardNo, record.initialLayout, record.metadata) == (boardNo, initialLayout, metadata)
+        assert record.startPosition == startPosition and record.moves == moves
+        assert record.finalBoard().pack() == finalPosition
+    assert records[1].moves[0][2] is Queen
+    print('gamerecord ok')
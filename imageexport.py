@@ -0,0 +1,134 @@
+"""headless batch rendering of positions and games to PNG frames and sprite sheets
+
+everything draws through a ChessRender on an off-screen Surface, so no window or display is needed. one renderer is
+kept per boardNo for the whole process: sprites are loaded once, the static board layer is drawn once, and
+consecutive frames only redraw the squares that changed
+
+usage: python imageexport.py OUTDIR [--layout testing] [--positions FILE | --games RECORDFILE] [--sheet] [--columns 8]
+                               [--scale 0.25]
+FILE holds one hex packed position per line, RECORDFILE is a gamerecord file whose games are written one
+directory (or sheet) per game, without either the frames of the layout are written
+"""
+import argparse
+import os
+import sys
+
+import pygame
+
+from components import ChessBoard
+from gamerecord import readGameFile
+from render2 import ChessRender
+
+_renderers = dict()
+
+
+def getRenderer(boardNo=8):
+    """returns the shared off-screen ChessRender for boardNo"""
+    renderer = _renderers.get(boardNo)
+    if renderer is None:
+        renderer = _renderers[boardNo] = ChessRender('empty', boardNo)
+    return renderer
+
+
+def _asChessBoard(position, boardNo):
+    if isinstance(position, ChessBoard):
+        return position
+    return ChessBoard.fromPacked(bytes(position), boardNo)
+
+
+def renderPosition(position, boardNo=8):
+    """draws a ChessBoard or packed position and returns the renderer's surface, the surface is reused by the
+    next call, copy it to keep the image"""
+    renderer = getRenderer(boardNo)
+    renderer.setChessBoard(_asChessBoard(position, boardNo))
+    renderer.render()
+    return renderer.surface
+
+
+def _scaled(surface, scale):
+    if scale == 1:
+        return surface
+    width, height = surface.get_size()
+    return pygame.transform.smoothscale(surface, (max(1, round(width * scale)), max(1, round(height * scale))))
+
+
+def exportPositions(positions, directory, boardNo=8, prefix='frame', scale=1):
+    """writes every position (ChessBoard or packed bytes) as directory/prefix-NNNNNN.png, returns the paths"""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for number, position in enumerate(positions):
+        path = os.path.join(directory, '%s-%06d.png' % (prefix, number))
+        pygame.image.save(_scaled(renderPosition(position, boardNo), scale), path)
+        paths.append(path)
+    return paths
+
+
+def gamePositions(moves, initialLayout='testing', boardNo=8):
+    """replays moves from initialLayout and yields the ChessBoard before the first move and after every move
+    the same ChessBoard object is yielded each time, it is changed in place as the game goes on"""
+    chessBoard = ChessBoard(initialLayout, boardNo)
+    yield chessBoard
+    for move in moves:
+        chessBoard.makeMove(move)
+        yield chessBoard
+
+
+def exportGame(moves, directory, initialLayout='testing', boardNo=8, prefix='ply', scale=1):
+    """writes one frame per ply of a game given as its list of moves, returns the paths"""
+    return exportPositions(gamePositions(moves, initialLayout, boardNo), directory, boardNo, prefix, scale)
+
+
+def exportSpriteSheet(positions, path, boardNo=8, columns=8, scale=0.25):
+    """renders positions as thumbnails scaled by scale into one image of columns thumbnails per row, saved to path
+    returns the number of thumbnails"""
+    thumbnails = [_scaled(renderPosition(position, boardNo), scale).copy() for position in positions]
+    if not thumbnails:
+        return 0
+    width, height = thumbnails[0].get_size()
+    rows = (len(thumbnails) + columns - 1) // columns
+    sheet = pygame.Surface((width * min(columns, len(thumbnails)), height * rows))
+    for number, thumbnail in enumerate(thumbnails):
+        sheet.blit(thumbnail, ((number % columns) * width, (number // columns) * height))
+    pygame.image.save(sheet, path)
+    return len(thumbnails)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="render 3D chess positions to PNG without a display")
+    parser.add_argument('outdir')
+    parser.add_argument('--layout', default='testing', help="initial layout rendered when no --positions is given")
+    parser.add_argument('--positions', help="file with one hex packed position per line")
+    parser.add_argument('--games', help="game record file, every game is replayed and written separately")
+    parser.add_argument('--boardNo', type=int, default=8)
+    parser.add_argument('--sheet', action='store_true', help="write a single sprite sheet instead of frames")
+    parser.add_argument('--columns', type=int, default=8)
+    parser.add_argument('--scale', type=float, help="scale of every image, default 1 for frames, 0.25 for sheets")
+    args = parser.parse_args(argv)
+
+    if args.games:
+        for number, game in enumerate(readGameFile(args.games)):
+            _export(game.positions(), os.path.join(args.outdir, 'game-%06d' % number), game.boardNo, args)
+        return 0
+    if args.positions:
+        with open(args.positions) as stream:
+            positions = [bytes.fromhex(line.strip()) for line in stream if line.strip()]
+    else:
+        positions = [ChessBoard(args.layout, args.boardNo)]
+    _export(positions, args.outdir, args.boardNo, args)
+    return 0
+
+
+def _export(positions, outdir, boardNo, args):
+    if args.sheet:
+        os.makedirs(outdir, exist_ok=True)
+        path = os.path.join(outdir, 'sheet.png')
+        count = exportSpriteSheet(positions, path, boardNo, args.columns,
+                                  args.scale if args.scale is not None else 0.25)
+        print('%d positions written to %s' % (count, path))
+    else:
+        paths = exportPositions(positions, outdir, boardNo, scale=args.scale if args.scale is not None else 1)
+        print('%d frames written to %s' % (len(paths), outdir))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
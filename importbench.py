@@ -0,0 +1,84 @@
+"""import time benchmark of the modules, so CLI tools and spawned worker processes keep starting fast
+
+every module is imported in fresh interpreters with python -X importtime, after one untimed import that fills the
+bytecode cache. the time reported is the cumulative import time of the module itself (interpreter startup
+excluded), the best and the median of the runs. the heavy optional dependencies every import pulls in are listed
+next to it: the rules core and the tools built on it must import without them, NumPy is only for the accelerators
+(batchmoves, tablebase) and pygame only for drawing (render2, imageexport)
+
+usage: python importbench.py [MODULE ...] [--runs 5] [--check] [--budget 50]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+CORE = ('movetables', 'zobrist', 'components', 'evaluation', 'transposition', 'engine', 'gamerecord', 'perft',
+        'selfplay', 'positiondb', 'profiling')  # modules held to the budget, without any HEAVY dependency
+MODULES = CORE + ('parallel', 'server', 'batchmoves', 'tablebase', 'render2', 'imageexport')
+HEAVY = ('numpy', 'pygame')
+
+
+def importTime(module):
+    """imports module in a new interpreter, returns (cumulative import time in seconds, set of modules imported)"""
+    environment = dict(os.environ, PYGAME_HIDE_SUPPORT_PROMPT='1')
+    environment.pop('PYTHONDONTWRITEBYTECODE', None)  # time imports from the bytecode cache, as installed tools do
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                             cwd=os.path.dirname(os.path.abspath(__file__)), env=environment,
+                             stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+    if process.returncode:
+        raise Exception("importing %s failed:\n%s" % (module, process.stderr))
+    seconds = None
+    imported = set()
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|')
+        if not cumulative.strip().isdigit():  # the header line
+            continue
+        imported.add(name.strip())
+        if name.strip() == module and not name[1:].startswith(' '):  # the top level entry of module
+            seconds = int(cumulative) / 1e6
+    return seconds, imported
+
+
+def benchmark(modules, runs=5):
+    """yields (module, best seconds, median seconds, heavy modules imported) for every module"""
+    for module in modules:
+        importTime(module)  # writes the bytecode cache, not timed
+        times = []
+        imported = set()
+        for _ in range(runs):
+            seconds, imported = importTime(module)
+            times.append(seconds)
+        heavy = sorted(name for name in HEAVY if name in imported)
+        yield module, min(times), statistics.median(times), heavy
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="measure the import time of the 3D chess modules")
+    parser.add_argument('modules', nargs='*', help="modules to import, default all of them")
+    parser.add_argument('--runs', type=int, default=5, help="fresh interpreters per module")
+    parser.add_argument('--check', action='store_true',
+                        help="fail if a core module imports %s or takes longer than the budget" % ' or '.join(HEAVY))
+    parser.add_argument('--budget', type=float, default=50.0, help="import time allowed for core modules, in ms")
+    args = parser.parse_args(argv)
+
+    failures = []
+    print('%-14s %9s %11s  %s' % ('module', 'best ms', 'median ms', 'heavy imports'))
+    for module, best, median, heavy in benchmark(args.modules or MODULES, args.runs):
+        print('%-14s %9.1f %11.1f  %s' % (module, best * 1000, median * 1000, ', '.join(heavy) or '-'))
+        if module in CORE and heavy:
+            failures.append('%s imports %s' % (module, ', '.join(heavy)))
+        if module in CORE and best * 1000 > args.budget:
+            failures.append('%s takes %.1f ms, over the %.0f ms budget' % (module, best * 1000, args.budget))
+    if args.check:
+        for failure in failures:
+            print(failure)
+        return 1 if failures else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
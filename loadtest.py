@@ -0,0 +1,132 @@
+"""load test client for server.py
+
+opens connections to a running server (or starts one in this process with --spawn), every connection plays games
+of random moves: it asks for the moves of the side to move, plays one of them and, with --engine, lets the engine
+answer every few plies. reports the latency percentiles of each kind of request, requests/s and moves/s
+
+usage: python loadtest.py [--host 127.0.0.1] [--port 7878 | --unix PATH] [--spawn] [--connections 50]
+                          [--games 4] [--plies 40] [--layout testing] [--engine 0]
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+from server import GameServer
+
+
+def percentile(values, fraction):
+    """returns the value below which fraction of the sorted values lie"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class Client:
+    "one connection, requests are sent one at a time and timed by op"
+
+    def __init__(self, reader, writer, latencies):
+        self.reader = reader
+        self.writer = writer
+        self.latencies = latencies  # op -> list of seconds, shared by all clients
+
+    async def request(self, op, **fields):
+        fields['op'] = op
+        start = time.perf_counter()
+        self.writer.write(json.dumps(fields).encode('utf-8') + b'\n')
+        await self.writer.drain()
+        response = json.loads(await self.reader.readline())
+        self.latencies.setdefault(op, []).append(time.perf_counter() - start)
+        if not response.get('ok'):
+            raise Exception("%s failed: %s" % (op, response.get('error')))
+        return response
+
+    async def playGames(self, games, plies, initialLayout, engineEvery, rng):
+        """plays games games of up to plies plies, returns the number of moves played"""
+        played = 0
+        for _ in range(games):
+            game = (await self.request('create', layout=initialLayout))['game']
+            for ply in range(plies):
+                if engineEvery and ply % engineEvery == engineEvery - 1:
+                    answer = await self.request('engine', game=game, depth=2, play=True)
+                else:
+                    moves = (await self.request('moves', game=game))['moves']
+                    if not moves:
+                        break
+                    answer = await self.request('move', game=game, move=rng.choice(moves))
+                played += 1
+                if answer.get('result'):
+                    break
+            await self.request('close', game=game)
+        return played
+
+
+async def runLoad(host, port, unixPath, connections, games, plies, initialLayout, engineEvery, seed):
+    """returns (latencies by op, moves played, seconds)"""
+    latencies = dict()
+
+    async def connect(number):
+        if unixPath:
+            reader, writer = await asyncio.open_unix_connection(unixPath, limit=1 << 20)
+        else:
+            reader, writer = await asyncio.open_connection(host, port, limit=1 << 20)
+        try:
+            return await Client(reader, writer, latencies).playGames(games, plies, initialLayout, engineEvery,
+                                                                     random.Random(seed + number))
+        finally:
+            writer.close()
+            await writer.wait_closed()
+
+    start = time.perf_counter()
+    played = await asyncio.gather(*(connect(number) for number in range(connections)))
+    return latencies, sum(played), time.perf_counter() - start
+
+
+async def _main(args):
+    gameServer = server = None
+    if args.spawn:
+        gameServer = GameServer(args.workers)
+        server = await gameServer.start(args.host, args.port, args.unix)
+    try:
+        latencies, moves, seconds = await runLoad(args.host, args.port, args.unix, args.connections, args.games,
+                                                  args.plies, args.layout, args.engine, args.seed)
+    finally:
+        if server is not None:
+            while gameServer.connections:  # let the handlers see the clients hang up
+                await asyncio.sleep(0.01)
+            server.close()
+            await server.wait_closed()
+            gameServer.shutdown()
+    requests = sum(len(values) for values in latencies.values())
+    print('%d connections, %d requests, %d moves in %.2fs: %.0f requests/s, %.0f moves/s' % (
+        args.connections, requests, moves, seconds, requests / seconds, moves / seconds))
+    print('%-8s %8s %9s %9s %9s %9s' % ('op', 'count', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms'))
+    for op, values in sorted(latencies.items()):
+        values.sort()
+        print('%-8s %8d %9.2f %9.2f %9.2f %9.2f' % (op, len(values), percentile(values, 0.5) * 1000,
+                                                    percentile(values, 0.9) * 1000,
+                                                    percentile(values, 0.99) * 1000, values[-1] * 1000))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="load test the 3D chess game server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7878)
+    parser.add_argument('--unix', help="connect to this Unix socket path instead of TCP")
+    parser.add_argument('--spawn', action='store_true', help="run the server in this process")
+    parser.add_argument('--workers', type=int, help="engine processes of a spawned server")
+    parser.add_argument('--connections', type=int, default=50)
+    parser.add_argument('--games', type=int, default=4, help="games played one after another per connection")
+    parser.add_argument('--plies', type=int, default=40)
+    parser.add_argument('--layout', default='testing')
+    parser.add_argument('--engine', type=int, default=0, help="let the engine play every Nth ply, 0 never")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+    asyncio.run(_main(args))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
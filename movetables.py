@@ -0,0 +1,91 @@
+"""precomputed square tables for move generation
+
+squares of a boardNo**3 board are numbered by a flat index, index = (x * boardNo + y) * boardNo + z.
+for every square the tables hold the ordered ray squares of each line direction and the in-bounds targets of each
+step vector, so move generation only walks tuples of ints instead of doing vector arithmetic per step
+"""
+
+_tablesCache = dict()
+
+
+class MoveTables:
+    "flat integer lookup tables for one board size, shared by every board and piece of that size"
+
+    def __init__(self, boardNo=8):
+        self.boardNo = boardNo
+        self.squareCount = boardNo ** 3
+        self.coordinates = tuple((x, y, z) for x in range(boardNo) for y in range(boardNo) for z in range(boardNo))
+        self._rayCache = dict()
+        self._stepCache = dict()
+        self._nextCache = dict()  # vector -> next square of every square, None off the board
+        self._vectorRayCache = dict()  # vector -> ray of every square along that vector
+
+    def index(self, coordinates):
+        """returns the flat index of coordinates, coordinates must be within the board"""
+        x, y, z = coordinates
+        return (x * self.boardNo + y) * self.boardNo + z
+
+    def offset(self, index, vector):
+        """returns the index reached from index by a single vector step, None if it leaves the board"""
+        boardNo = self.boardNo
+        x, y, z = self.coordinates[index]
+        x, y, z = x + vector[0], y + vector[1], z + vector[2]
+        if 0 <= x < boardNo and 0 <= y < boardNo and 0 <= z < boardNo:
+            return (x * boardNo + y) * boardNo + z
+        return None
+
+    def nextSquares(self, vector):
+        """returns a tuple indexed by square of the index one vector step away, None where the step leaves the board"""
+        vector = tuple(vector)
+        if vector not in self._nextCache:
+            boardNo = self.boardNo
+            dx, dy, dz = vector
+            delta = (dx * boardNo + dy) * boardNo + dz
+            self._nextCache[vector] = tuple(
+                index + delta if 0 <= x + dx < boardNo and 0 <= y + dy < boardNo and 0 <= z + dz < boardNo else None
+                for index, (x, y, z) in enumerate(self.coordinates))
+        return self._nextCache[vector]
+
+    def vectorRays(self, vector):
+        """returns a tuple indexed by square of the ray along one vector, shared by every rays table using it
+        a step moves the flat index by a fixed delta, so visiting the squares against its sign reaches the next square
+        first and each ray is the next square plus the ray behind it"""
+        vector = tuple(vector)
+        if vector not in self._vectorRayCache:
+            nextSquares = self.nextSquares(vector)
+            delta = (vector[0] * self.boardNo + vector[1]) * self.boardNo + vector[2]
+            order = range(self.squareCount - 1, -1, -1) if delta > 0 else range(self.squareCount)
+            rays = [()] * self.squareCount
+            for index in order:
+                square = nextSquares[index]
+                if square is not None:
+                    rays[index] = (square,) + rays[square]
+            self._vectorRayCache[vector] = tuple(rays)
+        return self._vectorRayCache[vector]
+
+    def rays(self, vectors):
+        """returns a tuple indexed by square, each entry a tuple of rays (one per vector, in vector order) where a ray
+        is the tuple of square indices from the nearest to the board edge, empty rays are left out"""
+        key = tuple(tuple(vector) for vector in vectors)
+        if key not in self._rayCache:
+            vectorRays = [self.vectorRays(vector) for vector in key]
+            self._rayCache[key] = tuple(tuple(rays[index] for rays in vectorRays if rays[index])
+                                        for index in range(self.squareCount))
+        return self._rayCache[key]
+
+    def steps(self, vectors):
+        """returns a tuple indexed by square, each entry the tuple of in-bounds target indices in vector order"""
+        key = tuple(tuple(vector) for vector in vectors)
+        if key not in self._stepCache:
+            nextSquares = [self.nextSquares(vector) for vector in key]
+            self._stepCache[key] = tuple(tuple(targets[index] for targets in nextSquares if targets[index] is not None)
+                                         for index in range(self.squareCount))
+        return self._stepCache[key]
+
+
+def getMoveTables(boardNo=8):
+    """returns the shared MoveTables for boardNo, building it on first use"""
+    tables = _tablesCache.get(boardNo)
+    if tables is None:
+        tables = _tablesCache[boardNo] = MoveTables(boardNo)
+    return tables
@@ -0,0 +1,135 @@
+"""parallel analysis of many positions over a process pool
+
+positions travel to the workers as ChessBoard.pack bytes (boardNo ** 3 + 1 bytes) instead of pickled ChessBoard and
+ChessPiece objects, every worker keeps one SearchEngine (and its transposition table) for all the positions it gets,
+and results are yielded in completion order as soon as they are ready
+
+usage: python parallel.py POSITIONFILE [--boardNo 8] [--depth 3] [--time T] [--nodes N] [--workers W]
+POSITIONFILE holds one hex packed position per line, results are printed as JSON lines
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from components import ChessBoard
+from engine import SearchEngine, SearchResult, MATE, MAXPLY, KINGTYPE, formatMove
+
+_workerEngine = None  # SearchEngine of the current worker process, created by _initWorker
+
+
+def _initWorker(ttMegabytes):
+    global _workerEngine
+    _workerEngine = SearchEngine(ttMegabytes)
+
+
+def _analysePacked(task):
+    """worker side: (index, packed position, boardNo, limits) -> (index, SearchResult)"""
+    index, packed, boardNo, maxDepth, timeLimit, nodeLimit = task
+    chessBoard = ChessBoard.fromPacked(packed, boardNo)
+    return index, _workerEngine.search(chessBoard, maxDepth, timeLimit, nodeLimit)
+
+
+def _searchRootMove(task):
+    """worker side: searches the reply tree below one root move, returns (move, score, SearchResult of the reply)
+    a reply depth of 0 only resolves the captures, as a depth 1 search does below its root moves"""
+    packed, boardNo, move, maxDepth, timeLimit, nodeLimit = task
+    chessBoard = ChessBoard.fromPacked(packed, boardNo)
+    chessBoard.makeMove(move)
+    if maxDepth <= 0:
+        start = time.perf_counter()
+        score = _workerEngine.quiescenceScore(chessBoard, timeLimit, nodeLimit)
+        seconds = time.perf_counter() - start
+        nodes = _workerEngine.nodes
+        result = SearchResult(None, score, [], 0, nodes, seconds, nodes / seconds if seconds > 0 else 0.0)
+    else:
+        result = _workerEngine.search(chessBoard, maxDepth, timeLimit, nodeLimit)
+    return move, -result.score, result
+
+
+def _packedPositions(positions):
+    for position in positions:
+        yield position.pack() if isinstance(position, ChessBoard) else bytes(position)
+
+
+def analysePositions(positions, boardNo=8, maxDepth=3, timeLimit=None, nodeLimit=None, workers=None,
+                     ttMegabytes=16, inFlight=4):
+    """searches every position (a ChessBoard or packed bytes) in a pool of worker processes
+    yields (position index, SearchResult) in completion order; positions may be any iterable, at most
+    workers * inFlight of them are queued at a time so long streams are never held in memory"""
+    workers = workers or os.cpu_count() or 1
+    tasks = ((index, packed, boardNo, maxDepth, timeLimit, nodeLimit)
+             for index, packed in enumerate(_packedPositions(positions)))
+    with ProcessPoolExecutor(workers, initializer=_initWorker, initargs=(ttMegabytes,)) as executor:
+        pending = set()
+        for task in tasks:
+            pending.add(executor.submit(_analysePacked, task))
+            if len(pending) >= workers * inFlight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+def analyseRootSplit(chessBoard, maxDepth=3, timeLimit=None, nodeLimit=None, workers=None, ttMegabytes=16):
+    """searches one position by handing its root moves out to worker processes, each root move is searched
+    maxDepth - 1 plies deep from the opponent's point of view (captures only for maxDepth 1) and a move capturing
+    the king is played without a search; returns a SearchResult whose node count and
+    time are summed over the workers"""
+    workers = workers or os.cpu_count() or 1
+    packed = chessBoard.pack()
+    moves = chessBoard.generateMoves()
+    if not moves:
+        return SearchResult(None, 0, [], 0, 0, 0.0, 0.0)
+    for move in moves:  # capturing the king ends the game, nothing below it needs searching
+        if chessBoard._squares[chessBoard.squareIndex(move[1])] >> 1 == KINGTYPE:
+            return SearchResult(move, MATE - 1, [move], 1, 0, 0.0, 0.0)
+    depth = max(1, min(maxDepth, MAXPLY)) - 1
+    tasks = [(packed, chessBoard.boardNo, move, depth, timeLimit, nodeLimit) for move in moves]
+    best = None
+    nodes, seconds = 0, 0.0
+    with ProcessPoolExecutor(workers, initializer=_initWorker, initargs=(ttMegabytes,)) as executor:
+        for move, score, result in executor.map(_searchRootMove, tasks):
+            nodes += result.nodes
+            seconds += result.seconds
+            if best is None or score > best[1]:
+                best = (move, score, [move] + result.pv)
+    return SearchResult(best[0], best[1], best[2], depth + 1, nodes, seconds,
+                        nodes / seconds if seconds > 0 else 0.0)
+
+
+def resultToDict(result):
+    """returns a JSON friendly dict of a SearchResult"""
+    return {'bestMove': formatMove(result.bestMove) if result.bestMove else None, 'score': result.score,
+            'pv': [formatMove(move) for move in result.pv], 'depth': result.depth, 'nodes': result.nodes,
+            'seconds': round(result.seconds, 4), 'nodesPerSecond': round(result.nodesPerSecond)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="analyse packed positions in parallel")
+    parser.add_argument('positionFile', help="file with one hex packed position per line, - for stdin")
+    parser.add_argument('--boardNo', type=int, default=8)
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--time', type=float, help="time budget per position in seconds")
+    parser.add_argument('--nodes', type=int, help="node budget per position")
+    parser.add_argument('--workers', type=int, help="worker processes, default one per core")
+    args = parser.parse_args(argv)
+
+    stream = sys.stdin if args.positionFile == '-' else open(args.positionFile)
+    with stream:
+        positions = (bytes.fromhex(line.strip()) for line in stream if line.strip())
+        for index, result in analysePositions(positions, args.boardNo, args.depth, args.time, args.nodes,
+                                              args.workers):
+            record = resultToDict(result)
+            record['index'] = index
+            print(json.dumps(record), flush=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""perft: counts leaf nodes of the move tree to a given depth, used to benchmark and regression-check move generation
+
+usage: python perft.py [--layout testing] [--position HEX] [--boardNo 8] [--depth 3] [--divide] [--check]
+"""
+import argparse
+import sys
+import time
+
+from components import ChessBoard
+from engine import formatMove
+
+# known leaf counts of the pseudo-legal move tree, {layout: {depth: nodes}}, depth 4 takes minutes, see --depth
+GOLDENCOUNTS = {
+    'testing': {1: 147, 2: 21603, 3: 3382029, 4: 529330119},
+    'vortex': {1: 129, 2: 16635, 3: 2249826},
+}
+
+
+def perft(chessBoard, depth):
+    """returns the number of leaf nodes depth plies below the current position of chessBoard
+    the board is walked with makeMove/unmakeMove and left unchanged"""
+    if depth == 0:
+        return 1
+    moves = chessBoard.generateMoves()
+    if depth == 1:
+        return len(moves)  # bulk counting, leaves are not made
+    nodes = 0
+    for move in moves:
+        chessBoard.makeMove(move)
+        nodes += perft(chessBoard, depth - 1)
+        chessBoard.unmakeMove()
+    return nodes
+
+
+def divide(chessBoard, depth):
+    """returns a dict of root move -> leaf nodes below it, the values sum to perft(chessBoard, depth)"""
+    if depth < 1:
+        raise Exception("divide needs a depth of at least 1")
+    counts = dict()
+    for move in chessBoard.generateMoves():
+        chessBoard.makeMove(move)
+        counts[move] = perft(chessBoard, depth - 1)
+        chessBoard.unmakeMove()
+    return counts
+
+
+def timedPerft(chessBoard, depth):
+    """returns (nodes, seconds, nodes per second) for perft(chessBoard, depth)"""
+    start = time.perf_counter()
+    nodes = perft(chessBoard, depth)
+    seconds = time.perf_counter() - start
+    return nodes, seconds, nodes / seconds if seconds > 0 else 0.0
+
+
+def checkGoldenCounts(layout='testing', maxDepth=None):
+    """compares perft of layout against GOLDENCOUNTS, returns a list of (depth, expected, counted) that differ"""
+    failures = []
+    for depth, expected in sorted(GOLDENCOUNTS[layout].items()):
+        if maxDepth is not None and depth > maxDepth:
+            continue
+        counted = perft(ChessBoard(layout), depth)
+        if counted != expected:
+            failures.append((depth, expected, counted))
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="count leaf nodes of the 3D chess move tree")
+    parser.add_argument('--layout', default='testing', help="initial layout passed to ChessBoard")
+    parser.add_argument('--position', help="hex string of a position produced by ChessBoard.pack, overrides --layout")
+    parser.add_argument('--boardNo', type=int, default=8)
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--divide', action='store_true', help="print the leaf count below every root move")
+    parser.add_argument('--check', action='store_true', help="verify the golden counts of --layout up to --depth")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        failures = checkGoldenCounts(args.layout, args.depth)
+        for depth, expected, counted in failures:
+            print('depth %d: expected %d, counted %d' % (depth, expected, counted))
+        print('FAILED' if failures else 'OK')
+        return 1 if failures else 0
+
+    if args.position:
+        chessBoard = ChessBoard.fromPacked(bytes.fromhex(args.position), args.boardNo)
+    else:
+        chessBoard = ChessBoard(args.layout, args.boardNo)
+
+    start = time.perf_counter()
+    if args.divide:
+        counts = divide(chessBoard, args.depth)
+        for move, nodes in counts.items():
+            print('%s: %d' % (formatMove(move), nodes))
+        nodes = sum(counts.values())
+    else:
+        nodes = perft(chessBoard, args.depth)
+    seconds = time.perf_counter() - start
+    print('depth %d: %d nodes in %.3fs (%.0f nodes/s)' % (args.depth, nodes, seconds, nodes / max(seconds, 1e-9)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
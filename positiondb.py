@@ -0,0 +1,290 @@
+"""memory-mapped position database: how often a position occurred and which moves were played from it
+
+the database is two files, both memory-mapped so nothing is loaded into RAM up front:
+
+    PATH.pos   fixed size records: zobrist hash, occurrence count, the packed position (ChessBoard.pack),
+               MOVESLOTS (move, count) pairs and a count of moves that did not fit in a slot
+    PATH.idx   open addressing hash index: slots of (hash, record number + 1), linear probing, kept under
+               MAXLOAD full by doubling
+
+lookups hash the ChessBoard (positionHash), probe the index and compare the packed position of the record, so a
+hash collision can never return the statistics of another position
+
+usage: python positiondb.py DBPATH --add RECORDFILE...   adds the games of game record files
+       python positiondb.py DBPATH --layout testing      prints the statistics of a layout's start position
+       python positiondb.py --check                      inserts random games into a small temporary database
+"""
+import argparse
+import mmap
+import os
+import random
+import struct
+import sys
+import tempfile
+
+from components import ChessBoard
+from gamerecord import GameRecord, encodeMove, decodeMove, readGameFile
+
+MOVESLOTS = 8
+MAXLOAD = 0.6
+_dataHeader = struct.Struct('<4sBxxxQ')  # magic, boardNo, record count
+_indexHeader = struct.Struct('<4sQQ')  # magic, slot count, used slots
+_indexSlot = struct.Struct('<QI')  # hash, record number + 1 (0 marks an empty slot)
+_recordHead = struct.Struct('<QII')  # hash, occurrence count, count of moves without a slot
+_moveSlot = struct.Struct('<II')  # encoded move + 1 (0 marks an empty slot), count
+
+
+class PositionStats:
+    "statistics of one position"
+
+    def __init__(self, count, moves, otherMoves):
+        self.count = count  # how often the position occurred
+        self.moves = moves  # [(move, times played)] most played first
+        self.otherMoves = otherMoves  # times a move was played that did not fit in the move slots
+
+    def __repr__(self):
+        return 'PositionStats(count=%d, moves=%r, otherMoves=%d)' % (self.count, self.moves, self.otherMoves)
+
+
+class PositionDatabase:
+    "a position store on disk, see the module docstring for the file layout"
+
+    def __init__(self, path, boardNo=8, initialRecords=1024):
+        self.path = path
+        self.boardNo = boardNo
+        self.packedSize = boardNo ** 3 + 1
+        self.recordSize = _recordHead.size + self.packedSize + MOVESLOTS * _moveSlot.size
+        dataPath, indexPath = path + '.pos', path + '.idx'
+        if not os.path.exists(dataPath):
+            with open(dataPath, 'wb') as stream:
+                stream.write(_dataHeader.pack(b'3DPD', boardNo, 0))
+                stream.truncate(_dataHeader.size + initialRecords * self.recordSize)
+            capacity = 1
+            while capacity * MAXLOAD < initialRecords:
+                capacity *= 2
+            with open(indexPath, 'wb') as stream:
+                stream.write(_indexHeader.pack(b'3DPI', capacity, 0))
+                stream.truncate(_indexHeader.size + capacity * _indexSlot.size)
+        self._dataFile = open(dataPath, 'r+b')
+        self._indexFile = open(indexPath, 'r+b')
+        self._data = mmap.mmap(self._dataFile.fileno(), 0)
+        self._index = mmap.mmap(self._indexFile.fileno(), 0)
+        magic, storedBoardNo, self._records = _dataHeader.unpack_from(self._data, 0)
+        if magic != b'3DPD' or storedBoardNo != boardNo:
+            raise Exception("not a position database of boardNo %d" % boardNo)
+        magic, self._capacity, self._used = _indexHeader.unpack_from(self._index, 0)
+        if magic != b'3DPI':
+            raise Exception("position database index is damaged")
+
+    def __len__(self):
+        return self._records
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._data is None:
+            return
+        self.flush()
+        self._data.close()
+        self._index.close()
+        self._dataFile.close()
+        self._indexFile.close()
+        self._data = self._index = None
+
+    def flush(self):
+        _dataHeader.pack_into(self._data, 0, b'3DPD', self.boardNo, self._records)
+        _indexHeader.pack_into(self._index, 0, b'3DPI', self._capacity, self._used)
+        self._data.flush()
+        self._index.flush()
+
+    # index
+    def _find(self, key, packed):
+        """returns (index slot, record number) of the position, record number None and the free slot if absent"""
+        key = key or 1  # 0 marks an empty slot
+        mask = self._capacity - 1
+        slot = key & mask
+        while True:
+            slotKey, recordPlusOne = _indexSlot.unpack_from(self._index, _indexHeader.size + slot * _indexSlot.size)
+            if not recordPlusOne:
+                return slot, None
+            if slotKey == key:
+                offset = self._recordOffset(recordPlusOne - 1) + _recordHead.size
+                if self._data[offset:offset + self.packedSize] == packed:
+                    return slot, recordPlusOne - 1
+            slot = (slot + 1) & mask
+
+    def _growIndex(self):
+        capacity = self._capacity * 2
+        self._index.close()
+        self._indexFile.truncate(_indexHeader.size + capacity * _indexSlot.size)
+        self._index = mmap.mmap(self._indexFile.fileno(), 0)
+        self._index[_indexHeader.size:] = bytes(capacity * _indexSlot.size)
+        self._capacity = capacity
+        mask = capacity - 1
+        for record in range(self._records):
+            key = _recordHead.unpack_from(self._data, self._recordOffset(record))[0] or 1
+            slot = key & mask
+            while _indexSlot.unpack_from(self._index, _indexHeader.size + slot * _indexSlot.size)[1]:
+                slot = (slot + 1) & mask
+            _indexSlot.pack_into(self._index, _indexHeader.size + slot * _indexSlot.size, key, record + 1)
+
+    # records
+    def _recordOffset(self, record):
+        return _dataHeader.size + record * self.recordSize
+
+    def _appendRecord(self, key, packed):
+        if self._recordOffset(self._records + 1) > len(self._data):
+            size = self._recordOffset(max(1024, self._records * 2))
+            self._data.close()
+            self._dataFile.truncate(size)
+            self._data = mmap.mmap(self._dataFile.fileno(), 0)
+        record = self._records
+        offset = self._recordOffset(record)
+        self._data[offset:offset + self.recordSize] = bytes(self.recordSize)
+        _recordHead.pack_into(self._data, offset, key, 0, 0)
+        self._data[offset + _recordHead.size:offset + _recordHead.size + self.packedSize] = packed
+        self._records += 1
+        return record
+
+    def _readStats(self, record):
+        offset = self._recordOffset(record)
+        key, count, otherMoves = _recordHead.unpack_from(self._data, offset)
+        offset += _recordHead.size + self.packedSize
+        moves = []
+        for number in range(MOVESLOTS):
+            code, times = _moveSlot.unpack_from(self._data, offset + number * _moveSlot.size)
+            if code:
+                moves.append((decodeMove(code - 1, self.boardNo), times))
+        moves.sort(key=lambda entry: entry[1], reverse=True)
+        return PositionStats(count, moves, otherMoves)
+
+    # public
+    def addPosition(self, chessBoard, move=None):
+        """counts one occurrence of the current position of chessBoard and, if given, the move played from it"""
+        if chessBoard.boardNo != self.boardNo:
+            raise Exception("chessBoard does not match the boardNo of the position database")
+        key, packed = chessBoard.positionHash(), chessBoard.pack()
+        slot, record = self._find(key, packed)
+        if record is None:
+            record = self._appendRecord(key, packed)
+            _indexSlot.pack_into(self._index, _indexHeader.size + slot * _indexSlot.size, key or 1, record + 1)
+            self._used += 1
+            if self._used > self._capacity * MAXLOAD:
+                self._growIndex()
+        offset = self._recordOffset(record)
+        key, count, otherMoves = _recordHead.unpack_from(self._data, offset)
+        if move is not None:
+            code = encodeMove(move, self.boardNo) + 1
+            slots = offset + _recordHead.size + self.packedSize
+            for number in range(MOVESLOTS):
+                slotOffset = slots + number * _moveSlot.size
+                slotCode, times = _moveSlot.unpack_from(self._data, slotOffset)
+                if slotCode == code or not slotCode:
+                    _moveSlot.pack_into(self._data, slotOffset, code, times + 1)
+                    break
+            else:
+                otherMoves += 1
+        _recordHead.pack_into(self._data, offset, key, count + 1, otherMoves)
+
+    def addGame(self, gameRecord):
+        """adds every position of a GameRecord with the move played from it"""
+        moves = gameRecord.moves
+        for ply, chessBoard in enumerate(gameRecord.positions()):
+            self.addPosition(chessBoard, moves[ply] if ply < len(moves) else None)
+
+    def addGames(self, gameRecords):
+        """bulk insert of an iterable of GameRecords, returns the number of games added"""
+        games = 0
+        for gameRecord in gameRecords:
+            self.addGame(gameRecord)
+            games += 1
+        self.flush()
+        return games
+
+    def lookup(self, chessBoard):
+        """returns the PositionStats of the current position of chessBoard, None if it was never added"""
+        record = self._find(chessBoard.positionHash(), chessBoard.pack())[1]
+        if record is None:
+            return None
+        return self._readStats(record)
+
+
+def checkDatabase(games=20, plies=30, seed=1):
+    """adds random games to a database created for 4 records, so its index and data file grow several times, and
+    compares every lookup, also after reopening, with counts kept in a dict; returns a list of failures"""
+    rng = random.Random(seed)
+    expected = dict()  # packed position -> [count, {move: times}]
+    records = []
+    for _ in range(games):
+        chessBoard = ChessBoard('testing', 8)
+        moves = []
+        for _ in range(rng.randint(1, plies)):
+            moves.append(rng.choice(chessBoard.generateMoves()))
+            stats = expected.setdefault(chessBoard.pack(), [0, dict()])
+            stats[0] += 1
+            stats[1][moves[-1]] = stats[1].get(moves[-1], 0) + 1
+            chessBoard.makeMove(moves[-1])
+        expected.setdefault(chessBoard.pack(), [0, dict()])[0] += 1
+        records.append(GameRecord(8, 'testing', {}, None, moves))
+
+    failures = []
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'check')
+        with PositionDatabase(path, 8, initialRecords=4) as database:
+            capacity = database._capacity
+            database.addGames(records)
+            if database._capacity < 4 * capacity:
+                failures.append('the index did not grow: %d slots for %d positions' % (database._capacity,
+                                                                                       len(database)))
+            if len(database) != len(expected):
+                failures.append('%d positions stored, %d expected' % (len(database), len(expected)))
+        with PositionDatabase(path, 8) as database:
+            for packed, (count, moves) in expected.items():
+                stats = database.lookup(ChessBoard.fromPacked(packed, 8))
+                found = (stats.count, dict(stats.moves), stats.otherMoves) if stats is not None else None
+                if found is None or found[0] != count or sum(moves.values()) != sum(found[1].values()) + found[2] or \
+                        any(moves[move] != times for move, times in found[1].items()):
+                    failures.append('position %s: %r, expected count %d and moves %r' % (packed.hex()[:16], found,
+                                                                                         count, moves))
+            if database.lookup(ChessBoard('vortex', 8)) is not None:
+                failures.append('a position never added was found')
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="build and query a 3D chess position database")
+    parser.add_argument('database', nargs='?', help="database path without the .pos/.idx extension")
+    parser.add_argument('--boardNo', type=int, default=8)
+    parser.add_argument('--add', nargs='+', metavar='RECORDFILE', help="game record files to add")
+    parser.add_argument('--layout', help="print the statistics of this layout's start position")
+    parser.add_argument('--position', help="print the statistics of a hex packed position")
+    parser.add_argument('--check', action='store_true', help="test inserts and lookups on a temporary database")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        failures = checkDatabase()
+        for failure in failures:
+            print(failure)
+        print('FAILED' if failures else 'OK')
+        return 1 if failures else 0
+    if args.database is None:
+        parser.error("a database path is needed unless --check is given")
+    with PositionDatabase(args.database, args.boardNo) as database:
+        for path in args.add or ():
+            games = database.addGames(readGameFile(path))
+            print('%s: %d games added, %d positions in the database' % (path, games, len(database)))
+        if args.layout or args.position:
+            if args.position:
+                chessBoard = ChessBoard.fromPacked(bytes.fromhex(args.position), args.boardNo)
+            else:
+                chessBoard = ChessBoard(args.layout, args.boardNo)
+            print(database.lookup(chessBoard))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
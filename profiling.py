@@ -0,0 +1,183 @@
+"""optional instrumentation of the hot paths of ChessBoard, the pieces and ChessRender
+
+Profiler.enable replaces the instrumented methods on their classes with wrappers that count and time every call,
+disable puts the original functions back, so a disabled profiler costs nothing. times are inclusive: a draw stage
+that calls another one counts the inner call in both. the ChessRender draw* stages are also summed per frame, a
+frame being one ChessRender.render call
+
+the numbers are available as a snapshot dict, drawn as an overlay onto a pygame surface, or appended as JSON lines
+to a file every few seconds by a background thread. python render2.py --profile shows the overlay in the game window
+"""
+import functools
+import json
+import sys
+import threading
+import time
+
+from components import ChessBoard, ChessPiece, pieceClasses
+
+BOARDTARGETS = ('positionOccupied', 'withinBoardBoundaries', 'moveCurrentPiece')
+PIECETARGETS = ('validNextPositions',)
+FRAMETARGET = 'render'  # ChessRender method that marks a frame
+
+_sharedProfiler = None
+
+
+class Profiler:
+    "call counters and timers installed on classes by enable"
+
+    def __init__(self):
+        self.stats = dict()  # name -> [calls, total seconds, longest call in seconds]
+        self.frames = 0
+        self.frameSeconds = 0.0
+        self.lastFrame = dict()  # stage name -> seconds spent in the last complete frame
+        self._frame = dict()  # stage name -> seconds of the frame being drawn
+        self._patches = []  # (owner class, attribute, original function) of every installed wrapper
+        self._dumpThread = None
+        self._dumpStop = None
+
+    def enabled(self):
+        return bool(self._patches)
+
+    def enable(self, render=True):
+        """installs the wrappers on ChessBoard, the piece classes and, if pygame is available and render is set,
+        ChessRender"""
+        if self._patches:
+            return
+        for attribute in BOARDTARGETS:
+            self.addTarget(ChessBoard, attribute)
+        pieceTypes = {ChessPiece}
+        for pieceClass in pieceClasses.values():
+            pieceTypes.update(pieceClass.__mro__[:-1])
+        for attribute in PIECETARGETS:
+            for pieceType in pieceTypes:
+                if attribute in pieceType.__dict__:
+                    self.addTarget(pieceType, attribute)
+        if render:
+            try:
+                from render2 import ChessRender
+            except ImportError:  # no pygame, only the rules are instrumented
+                return
+            for attribute in sorted(ChessRender.__dict__):
+                if attribute.startswith('draw'):
+                    self.addTarget(ChessRender, attribute, stage=True)
+            self.addTarget(ChessRender, FRAMETARGET, frame=True)
+
+    def disable(self):
+        """restores every original function"""
+        while self._patches:
+            owner, attribute, original = self._patches.pop()
+            setattr(owner, attribute, original)
+
+    def addTarget(self, owner, attribute, name=None, stage=False, frame=False):
+        """wraps owner.attribute, calls are counted under name (default the attribute name, shared between classes)
+        stage calls are also summed per frame, a frame target closes a frame when it returns"""
+        original = owner.__dict__[attribute]
+        name = name or attribute
+        stats = self.stats.setdefault(name, [0, 0.0, 0.0])
+        clock = time.perf_counter
+        profiler = self
+
+        @functools.wraps(original)
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                elapsed = clock() - start
+                stats[0] += 1
+                stats[1] += elapsed
+                if elapsed > stats[2]:
+                    stats[2] = elapsed
+                if stage:
+                    profiler._frame[name] = profiler._frame.get(name, 0.0) + elapsed
+                if frame:
+                    profiler._endFrame(elapsed)
+
+        self._patches.append((owner, attribute, original))
+        setattr(owner, attribute, wrapper)
+
+    def _endFrame(self, seconds):
+        self.frames += 1
+        self.frameSeconds += seconds
+        self.lastFrame = self._frame
+        self.lastFrame['frame'] = seconds
+        self._frame = dict()
+
+    def reset(self):
+        for stats in self.stats.values():
+            stats[:] = [0, 0.0, 0.0]
+        self.frames = 0
+        self.frameSeconds = 0.0
+        self.lastFrame = dict()
+        self._frame = dict()
+
+    def snapshot(self):
+        """returns the counters as a JSON friendly dict, times in milliseconds"""
+        calls = dict()
+        for name, (count, seconds, longest) in list(self.stats.items()):
+            calls[name] = {'calls': count, 'totalMs': round(seconds * 1000, 3),
+                           'meanUs': round(seconds / count * 1e6, 3) if count else 0.0,
+                           'maxUs': round(longest * 1e6, 3)}
+        return {'time': time.time(), 'calls': calls, 'frames': self.frames,
+                'meanFrameMs': round(self.frameSeconds / self.frames * 1000, 3) if self.frames else 0.0,
+                'lastFrameMs': {name: round(seconds * 1000, 3) for name, seconds in list(self.lastFrame.items())}}
+
+    def report(self, stream=sys.stdout):
+        """prints the counters as a table, the most expensive first"""
+        calls = self.snapshot()['calls']
+        stream.write('%-24s %10s %12s %10s %10s\n' % ('name', 'calls', 'total ms', 'mean us', 'max us'))
+        for name, entry in sorted(calls.items(), key=lambda item: item[1]['totalMs'], reverse=True):
+            stream.write('%-24s %10d %12.3f %10.3f %10.3f\n' % (
+                name, entry['calls'], entry['totalMs'], entry['meanUs'], entry['maxUs']))
+
+    def drawOverlay(self, surface, rect=None, lines=6):
+        """draws the last frame's stage times and the busiest counters into rect of surface (default a strip along
+        the bottom), returns the rect so only it needs to be pushed to the display"""
+        import pygame
+        if rect is None:
+            width, height = surface.get_size()
+            rect = pygame.Rect(0, height - 16 * lines - 8, width, 16 * lines + 8)
+        font = pygame.font.SysFont('monospace', 13)
+        snapshot = self.snapshot()
+        text = ['frames %d  mean %.2f ms  ' % (snapshot['frames'], snapshot['meanFrameMs']) +
+                '  '.join('%s %.2f' % item for item in sorted(snapshot['lastFrameMs'].items()))]
+        busiest = sorted(snapshot['calls'].items(), key=lambda item: item[1]['totalMs'], reverse=True)
+        for name, entry in busiest[:lines - 1]:
+            text.append('%-22s %8d calls %10.2f ms %8.2f us/call' % (
+                name, entry['calls'], entry['totalMs'], entry['meanUs']))
+        surface.fill((240, 240, 240), rect)
+        for number, line in enumerate(text):
+            surface.blit(font.render(line, True, (0, 0, 0)), (rect.left + 4, rect.top + 4 + 16 * number))
+        return rect
+
+    def startDumping(self, path, interval=5.0):
+        """appends a snapshot as one JSON line to path every interval seconds, until stopDumping"""
+        self.stopDumping()
+        stop = self._dumpStop = threading.Event()
+
+        def dump():
+            while not stop.wait(interval):
+                self.dump(path)
+
+        self._dumpThread = threading.Thread(target=dump, name='profiler dump', daemon=True)
+        self._dumpThread.start()
+
+    def stopDumping(self):
+        if self._dumpThread is not None:
+            self._dumpStop.set()
+            self._dumpThread.join()
+            self._dumpThread = None
+
+    def dump(self, path):
+        """appends the current snapshot to path as one JSON line"""
+        with open(path, 'a') as stream:
+            stream.write(json.dumps(self.snapshot()) + '\n')
+
+
+def getProfiler():
+    """returns the process wide Profiler"""
+    global _sharedProfiler
+    if _sharedProfiler is None:
+        _sharedProfiler = Profiler()
+    return _sharedProfiler
@@ -1,6 +1,9 @@
+import argparse
+
 import pygame
-import os
+from boardlayout import BoardLayout
 from components import *
+from spriteatlas import getSpriteAtlas
 
 BLACK = (0, 0, 0)
 WHITE = (255, 255, 255)
@@ -8,190 +11,114 @@ GREY = (127, 127, 127)
 CAPTURE = (176, 35, 35)
 CURSOR = (28, 232, 103)
 
-
-pygame.init()
-clock = pygame.time.Clock()
 WIDTH, HEIGHT = 1000, 600
-WIN = pygame.display.set_mode((WIDTH, HEIGHT))
-WIN.fill(WHITE)
+
 
 class ChessRender:
-    """All functions to draw chessboard with pygame"""
+    """All functions to draw chessboard with pygame
+    draws onto surface, the window in main(), or an off-screen Surface of WIDTH x HEIGHT when no surface is passed,
+    which needs no display at all (headless rendering, see imageexport)"""
 
-    def __init__(self, initialLayout = 'empty', boardNo=8):
-        self.surface = WIN
+    def __init__(self, initialLayout = 'empty', boardNo=8, surface=None):
+        self.surface = surface if surface is not None else pygame.Surface((WIDTH, HEIGHT))
         self.chessBoard = ChessBoard(initialLayout, boardNo) #generate a chessBoard that holds information about the game
         self.boardNo = boardNo
-        self.spriteDict = dict()
+        self.layout = BoardLayout.fitWindow(boardNo, *self.surface.get_size())  # pixel geometry, see boardlayout
+        self.atlas = getSpriteAtlas()  # all sprites are loaded and scaled here, before the first frame
+        self.atlas.acquire(self.layout.blockWidth)
         self.cursorPos = (0,0)
         self.cursorCoordinate = None
-
-    sizeDimensions = {
-        8: (2, 25, 30, 4, 20, 20) #TODO: what each dimension does
-    }
-
-    def drawChessBoard(self):
-        BOARDNO = self.boardNo
-        Dimensions = self.sizeDimensions[self.boardNo]
-        LINEWIDTH = Dimensions[0]
-        BLOCKWIDTH = Dimensions[1]
-        BOARDGAPWIDTH = Dimensions[2]
-        BOARDPERROW = Dimensions[3]
-        left, top = Dimensions[4], Dimensions[5]
-        BOARDDISTANCE = ((BOARDNO + 1) * LINEWIDTH + BOARDNO * BLOCKWIDTH + BOARDGAPWIDTH)
-
-        for k in range(BOARDNO):
-            LEFT, TOP = left + (k % BOARDPERROW) * BOARDDISTANCE, top + (k // BOARDPERROW) * BOARDDISTANCE
-            boardRECT = (LEFT, TOP, ((BOARDNO + 1) * LINEWIDTH + BOARDNO * BLOCKWIDTH),
-                         ((BOARDNO + 1) * LINEWIDTH + BOARDNO * BLOCKWIDTH))
-            pygame.draw.rect(self.surface, BLACK, boardRECT)
-            for i in range(BOARDNO):
-                for j in range(BOARDNO):
-                    cellRECT = (
-                        (LEFT + LINEWIDTH + i * (LINEWIDTH + BLOCKWIDTH)),
-                        (TOP + LINEWIDTH + j * (LINEWIDTH + BLOCKWIDTH)),
-                        BLOCKWIDTH, BLOCKWIDTH)
-                    pygame.draw.rect(self.surface, WHITE, cellRECT)
+        self._background = None  # window sized surface with the static boards, drawn once by buildBackground
+        self._drawnStates = None  # coordinate -> state of every square as last pushed to the display
+
+    def setSurface(self, surface):
+        """draws onto surface from now on, the layout is fitted to its size again, e.g. after the window was resized"""
+        layout = BoardLayout.fitWindow(self.boardNo, *surface.get_size())
+        if layout.blockWidth != self.layout.blockWidth:
+            self.atlas.acquire(layout.blockWidth)
+            self.atlas.release(self.layout.blockWidth)
+        self.surface = surface
+        self.layout = layout
+        self._background = None
+
+    def drawChessBoard(self, surface=None):
+        """draws the empty boards onto surface, default self.surface"""
+        surface = surface or self.surface
+        layout = self.layout
+        for boardRECT in layout.boardRects:
+            pygame.draw.rect(surface, BLACK, boardRECT)
+        for cellRECT in layout.squareRects:
+            pygame.draw.rect(surface, WHITE, cellRECT)
+
+    def buildBackground(self):
+        """draws the static part of the window (background and empty boards) once into a cached surface"""
+        self._background = pygame.Surface(self.surface.get_size())
+        self._background.fill(WHITE)
+        self.drawChessBoard(self._background)
+        self._drawnStates = None
+
+    def invalidate(self):
+        """forces the next update to redraw the whole window, e.g. after the window was covered"""
+        self._drawnStates = None
+
+    def squareRect(self, coordinate):
+        """returns the pixel rect (left, top, width, height) of the cell of coordinate"""
+        return self.layout.squareRect(coordinate)
+
+    def squareStates(self):
+        """returns coordinate -> (fill colour, movable dot, (piece id, side)) for every square that is not plain white
+        the fill follows the drawing order of the highlights: cursor over capture over current piece"""
+        states = dict()
+        for chessPiece in self.chessBoard.getpieceList():
+            states[chessPiece.getCoordinates()] = (None, False, (chessPiece.getID(), int(chessPiece.side)))
+        currentPiece = self.chessBoard.getCurrentPiece()
+        if currentPiece:
+            move, capture = self.chessBoard.currentNextMoveCapture()
+            states[currentPiece.getCoordinates()] = (GREY, False, (currentPiece.getID(), int(currentPiece.side)))
+            for coordinate in move:
+                states[coordinate] = (None, True, None)
+            for coordinate in capture:
+                states[coordinate] = (CAPTURE, False, states[coordinate][2])
+        if self.cursorCoordinate:
+            fill, dot, pieceKey = states.get(self.cursorCoordinate, (None, False, None))
+            states[self.cursorCoordinate] = (CURSOR, False, pieceKey)
+        return states
+
+    def drawSquare(self, coordinate, state):
+        """restores the cell of coordinate from the background and draws its state, returns the rect drawn"""
+        rect = self.squareRect(coordinate)
+        self.surface.blit(self._background, rect, rect)
+        if state is None:
+            return rect
+        fill, dot, pieceKey = state
+        if fill:
+            pygame.draw.rect(self.surface, fill, rect)
+        if dot:
+            self.drawMovablePositions([coordinate])
+        if pieceKey:
+            self.drawChessPieces([self.chessBoard.getPieceByCoordinate(coordinate)])
+        return rect
 
     def drawMovablePositions(self, coordinatesList):
-        BOARDNO = self.boardNo
-        Dimensions = self.sizeDimensions[self.boardNo]
-        LINEWIDTH = Dimensions[0]
-        BLOCKWIDTH = Dimensions[1]
-        BOARDGAPWIDTH = Dimensions[2]
-        BOARDPERROW = Dimensions[3]
-        left, top = Dimensions[4], Dimensions[5]
-        CIRCLERADIUS = 3
-        BOARDDISTANCE = ((BOARDNO + 1) * LINEWIDTH + BOARDNO * BLOCKWIDTH + BOARDGAPWIDTH)
-
+        layout = self.layout
         for coordinate in coordinatesList:
-            x, y, z = coordinate
-            X = (left + (z % BOARDPERROW) * BOARDDISTANCE) + (
-                        LINEWIDTH + round(0.5 * BLOCKWIDTH) + x * (LINEWIDTH + BLOCKWIDTH))
-            Y = (top + (z // BOARDPERROW) * BOARDDISTANCE) + (
-                        LINEWIDTH + round(0.5 * BLOCKWIDTH) + y * (LINEWIDTH + BLOCKWIDTH))
-            pygame.draw.circle(self.surface, GREY, (X, Y), CIRCLERADIUS)
-
-    def loadSprite(self, chessPiece):
-        """load the sprites address from ChessPiece to a dict for ChessRender,
-        called whenever encountering a sprite whose address is not in the self.spriteDict yet"""
-        if not isinstance(chessPiece, ChessPiece):
-            raise Exception("this function cannot be called with a non chessPiece object")
-
-        Dimensions = self.sizeDimensions[self.boardNo]
-        BLOCKWIDTH = Dimensions[1]
-        id = chessPiece.getID()
-        addresses = [os.path.join(os.getcwd(), "sprites", address) for address in chessPiece.getAddress()]
-        sprite = [pygame.transform.scale(pygame.image.load(address),(BLOCKWIDTH, BLOCKWIDTH)) for address in addresses]
-        self.spriteDict[id] = sprite
+            pygame.draw.circle(self.surface, GREY, layout.squareCentre(coordinate), layout.circleRadius)
 
     def drawChessPieces(self, chessPieceList):
         """draw chess sprites onto the screen according to input list of chesspieces"""
-        BOARDNO = self.boardNo
-        Dimensions = self.sizeDimensions[self.boardNo]
-        LINEWIDTH = Dimensions[0]
-        BLOCKWIDTH = Dimensions[1]
-        BOARDGAPWIDTH = Dimensions[2]
-        BOARDPERROW = Dimensions[3]
-        left, top = Dimensions[4], Dimensions[5]
-        CIRCLERADIUS = 3
-        BOARDDISTANCE = ((BOARDNO + 1) * LINEWIDTH + BOARDNO * BLOCKWIDTH + BOARDGAPWIDTH)
-
+        layout = self.layout
         for chesspiece in chessPieceList:
-            x, y, z = chesspiece.getCoordinates()
-            X = (left + (z % BOARDPERROW) * BOARDDISTANCE) + (
-                        LINEWIDTH + x * (LINEWIDTH + BLOCKWIDTH))
-            Y = (top + (z // BOARDPERROW) * BOARDDISTANCE) + (
-                        LINEWIDTH + y * (LINEWIDTH + BLOCKWIDTH))
-
-            if not chesspiece.getID() in self.spriteDict:
-                self.loadSprite(chesspiece)
-            sprite = self.spriteDict[chesspiece.getID()][chesspiece.side]
-            self.surface.blit(sprite,(X,Y))
-
-    def drawCurrent(self):
-        """draw shading for selected piece"""
-        BOARDNO = self.boardNo
-        Dimensions = self.sizeDimensions[self.boardNo]
-        LINEWIDTH = Dimensions[0]
-        BLOCKWIDTH = Dimensions[1]
-        BOARDGAPWIDTH = Dimensions[2]
-        BOARDPERROW = Dimensions[3]
-        left, top = Dimensions[4], Dimensions[5]
-        BOARDDISTANCE = ((BOARDNO + 1) * LINEWIDTH + BOARDNO * BLOCKWIDTH + BOARDGAPWIDTH)
-        currentPiece = self.chessBoard.getCurrentPiece()
+            self.atlas.blit(self.surface, chesspiece, layout.blockWidth, layout.squareRect(chesspiece.getCoordinates())[:2])
 
-        x, y, z = currentPiece.getCoordinates()
-        X = (left + (z % BOARDPERROW) * BOARDDISTANCE) + (
-                LINEWIDTH + x * (LINEWIDTH + BLOCKWIDTH))
-        Y = (top + (z // BOARDPERROW) * BOARDDISTANCE) + (
-                LINEWIDTH + y * (LINEWIDTH + BLOCKWIDTH))
-
-        pygame.draw.rect(self.surface, GREY, (X, Y, BLOCKWIDTH, BLOCKWIDTH))
-
-    def drawCapture(self, coordinatesList):
-        """draw shading for capturable positions"""
-        #TODO: draw shades for currentpiece and the capturable pieces
-        BOARDNO = self.boardNo
-        Dimensions = self.sizeDimensions[self.boardNo]
-        LINEWIDTH = Dimensions[0]
-        BLOCKWIDTH = Dimensions[1]
-        BOARDGAPWIDTH = Dimensions[2]
-        BOARDPERROW = Dimensions[3]
-        left, top = Dimensions[4], Dimensions[5]
-        BOARDDISTANCE = ((BOARDNO + 1) * LINEWIDTH + BOARDNO * BLOCKWIDTH + BOARDGAPWIDTH)
-
-        for coordinate in coordinatesList:
-            x, y, z = coordinate
-            X = (left + (z % BOARDPERROW) * BOARDDISTANCE) + (
-                        LINEWIDTH + x * (LINEWIDTH + BLOCKWIDTH))
-            Y = (top + (z // BOARDPERROW) * BOARDDISTANCE) + (
-                        LINEWIDTH + y * (LINEWIDTH + BLOCKWIDTH))
-            pygame.draw.rect(self.surface, CAPTURE, (X, Y, BLOCKWIDTH, BLOCKWIDTH))
-
-    def drawCursor(self):
-        """draw shading for selected piece"""
-        if not self.cursorCoordinate:
-            return
-        BOARDNO = self.boardNo
-        Dimensions = self.sizeDimensions[self.boardNo]
-        LINEWIDTH = Dimensions[0]
-        BLOCKWIDTH = Dimensions[1]
-        BOARDGAPWIDTH = Dimensions[2]
-        BOARDPERROW = Dimensions[3]
-        left, top = Dimensions[4], Dimensions[5]
-        BOARDDISTANCE = ((BOARDNO + 1) * LINEWIDTH + BOARDNO * BLOCKWIDTH + BOARDGAPWIDTH)
-
-        x, y, z = self.cursorCoordinate
-        X = (left + (z % BOARDPERROW) * BOARDDISTANCE) + (
-                LINEWIDTH + x * (LINEWIDTH + BLOCKWIDTH))
-        Y = (top + (z // BOARDPERROW) * BOARDDISTANCE) + (
-                LINEWIDTH + y * (LINEWIDTH + BLOCKWIDTH))
-
-        pygame.draw.rect(self.surface, CURSOR, (X, Y, BLOCKWIDTH, BLOCKWIDTH))
+    def close(self):
+        """releases the sprite size held by this renderer so the atlas can evict it"""
+        if self.atlas is not None:
+            self.atlas.release(self.layout.blockWidth)
+            self.atlas = None
 
     def updateCursorCoordinate(self):
         """updates the cursor coordinate based on the cursorPos"""
-        BOARDNO = self.boardNo
-        Dimensions = self.sizeDimensions[self.boardNo]
-        LINEWIDTH = Dimensions[0]
-        BLOCKWIDTH = Dimensions[1]
-        BOARDGAPWIDTH = Dimensions[2]
-        BOARDPERROW = Dimensions[3]
-        left, top = Dimensions[4], Dimensions[5]
-        CIRCLERADIUS = 3
-        BOARDDISTANCE = ((BOARDNO + 1) * LINEWIDTH + BOARDNO * BLOCKWIDTH + BOARDGAPWIDTH)
-
-        X, Y = self.cursorPos
-        z = (X - left) // BOARDDISTANCE + ((Y - top) // BOARDDISTANCE) * BOARDPERROW
-        boardLeft, boardTop = X - left - (z % BOARDPERROW) * BOARDDISTANCE, Y - top - (z // BOARDPERROW) * BOARDDISTANCE #distance relative to the current zth board
-        x = boardLeft // (LINEWIDTH + BLOCKWIDTH)
-        y = boardTop // (LINEWIDTH + BLOCKWIDTH)
-
-        if self.chessBoard.withinBoardBoundaries((x,y,z)):
-            self.cursorCoordinate = (x,y,z)
-        else:
-            self.cursorCoordinate = None
+        self.cursorCoordinate = self.layout.squareAt(self.cursorPos)
 
     def processClick(self):
         """based on current state of chessBoard(_currentPiece & _currentSide), decide what the click should do
@@ -219,8 +146,7 @@ class ChessRender:
             if self.cursorCoordinate:
                 #cursor in a valid coordinate
                 move, capture = self.chessBoard.currentNextMoveCapture()
-                movable = move + capture
-                if self.cursorCoordinate in movable:
+                if self.cursorCoordinate in move or self.cursorCoordinate in capture:
                     #cursor coordinate within a next movable/capturable position
                     self.chessBoard.moveCurrentPiece(self.cursorCoordinate)
                 else:
@@ -239,23 +165,48 @@ class ChessRender:
             else:
                 self.chessBoard.unselectPiece() #unselect the piece by clicking outside the board
 
+    def render(self):
+        """draws the current state of chessBoard onto self.surface without touching the display
+        only the squares whose state changed since the last render are redrawn, returns the list of rects drawn,
+        None when the whole surface was redrawn"""
+        if self._background is None:
+            self.buildBackground()
+        states = self.squareStates()
+        if self._drawnStates is None:
+            self.surface.blit(self._background, (0, 0))
+            for coordinate, state in states.items():
+                self.drawSquare(coordinate, state)
+            dirtyRects = None
+        else:
+            dirtyRects = []
+            for coordinate, state in states.items():
+                if self._drawnStates.get(coordinate) != state:
+                    dirtyRects.append(self.drawSquare(coordinate, state))
+            for coordinate in self._drawnStates:
+                if coordinate not in states:
+                    dirtyRects.append(self.drawSquare(coordinate, None))
+        self._drawnStates = states
+        return dirtyRects
+
+    def setChessBoard(self, chessBoard):
+        """shows another ChessBoard of the same boardNo, sprites and the background are kept"""
+        if chessBoard.boardNo != self.boardNo:
+            raise Exception("ChessRender can only switch to a ChessBoard of the same boardNo")
+        self.chessBoard = chessBoard
+
     def update(self):
         """function to be called every frame"""
         #get update on cursor information
         self.cursorPos = pygame.mouse.get_pos()
         self.updateCursorCoordinate()
-        #draw chessBoard and chessPiece
-        self.drawChessBoard()
-        if self.chessBoard.getCurrentPiece():
-            move, capture = self.chessBoard.currentNextMoveCapture()
-            self.drawCurrent()
-            self.drawMovablePositions(move)
-            self.drawCapture(capture)
-        self.drawCursor()
-        self.drawChessPieces(self.chessBoard.getpieceList())
-        pygame.display.update()
-
-def main():
+        #draw chessBoard and chessPiece, only the squares whose state changed since the last frame are pushed
+        dirtyRects = self.render()
+        if dirtyRects is None:
+            pygame.display.update()
+        elif dirtyRects:
+            pygame.display.update(dirtyRects)
+
+def main(profile=False, boardNo=8, initialLayout="testing"):
     # r1 = Rook((3,5,5),0)
     # r2 = Rook((3,5,6),1)
     # b1 = Bishop((2,4,6),0)
@@ -268,21 +219,44 @@ def main():
     # n2 = Knight((3,4,5), 1)
 
     #main
-    testChessRender = ChessRender("testing")
+    pygame.init()
+    clock = pygame.time.Clock()
+    window = pygame.display.set_mode((WIDTH, HEIGHT), pygame.RESIZABLE)
+    window.fill(WHITE)
+    testChessRender = ChessRender(initialLayout, boardNo, surface=window)
+    if profile:  # counters and frame timings drawn along the bottom, dumped to profile.jsonl every 5 seconds
+        from profiling import getProfiler
+        profiler = getProfiler()
+        profiler.enable()
+        profiler.startDumping('profile.jsonl')
     #testChessRender.chessBoard.addPieces((r1,r2,b1,b2,q1,q2,k1,k2,n1,n2))
     run = True
     while run:
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 run = False
+            if event.type == pygame.VIDEORESIZE:  # the boards are laid out again for the new window size
+                window = pygame.display.get_surface()
+                testChessRender.setSurface(window)
             if event.type == pygame.MOUSEBUTTONDOWN:
                 print(testChessRender.chessBoard.getCurrentPiece())
                 testChessRender.processClick()
 
         testChessRender.update()
+        if profile:
+            pygame.display.update(profiler.drawOverlay(window))
         clock.tick(50)
+    if profile:
+        profiler.stopDumping()
+        profiler.report()
+    testChessRender.close()
     pygame.quit()
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="play 3D chess in a window")
+    parser.add_argument('--profile', action='store_true', help="show call counters and frame timings")
+    parser.add_argument('--boardNo', type=int, default=8)
+    parser.add_argument('--layout', default='testing', help="initial layout passed to ChessBoard")
+    args = parser.parse_args()
+    main(args.profile, args.boardNo, args.layout)
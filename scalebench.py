@@ -0,0 +1,109 @@
+"""how the cost of the rules and the renderer grows with boardNo
+
+every board size gets the same material, the 15 pieces a side of the testing layout placed on random squares, so
+the numbers change only with the size of the cube. per boardNo it measures:
+
+    setup     ms to build the shared per size tables (move tables, zobrist keys) and generate the first moves
+    movegen   us per generateMoves of the side to move, and the number of moves
+    make      us per makeMove + unmakeMove of a move of that list
+    copy      us per ChessBoard.copy, which copies the square array and recreates only the pieces
+    frame     ms per full ChessRender frame, background included, in a 1000 x 600 off-screen surface, and per
+              incremental frame after a move; left out when pygame is not installed
+
+usage: python scalebench.py [--boardNos 4 6 8 10 12 16] [--seconds 0.2] [--seed 1] [--noFrames]
+"""
+import argparse
+import importlib.util
+import random
+import sys
+import time
+
+from components import ChessBoard, King, Queen, Rook, Bishop, Knight, pieceCode
+
+MATERIAL = (King, Queen) + (Rook,) * 3 + (Bishop,) * 3 + (Knight,) * 7  # the testing layout, per side
+
+
+def scalePosition(boardNo, seed=1):
+    """returns a ChessBoard with MATERIAL for both sides on random squares, side 0 to move"""
+    rng = random.Random('%d-%d' % (seed, boardNo))
+    data = bytearray(boardNo ** 3 + 1)
+    squares = rng.sample(range(boardNo ** 3), 2 * len(MATERIAL))
+    for number, square in enumerate(squares):
+        side = number % 2
+        data[square] = pieceCode(MATERIAL[number // 2]((0, 0, 0), side, boardNo))
+    return ChessBoard.fromPacked(bytes(data), boardNo)
+
+
+def timed(function, seconds):
+    """returns the mean seconds per call of function, called repeatedly for about seconds"""
+    calls = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < seconds or calls < 3:
+        function()
+        calls += 1
+        elapsed = time.perf_counter() - start
+    return elapsed / calls
+
+
+def measureBoard(boardNo, seconds=0.2, seed=1, frames=True):
+    """returns a dict of the measurements of the module docstring for boardNo"""
+    start = time.perf_counter()
+    chessBoard = scalePosition(boardNo, seed)
+    moves = chessBoard.generateMoves()
+    result = {'boardNo': boardNo, 'squares': boardNo ** 3, 'setupMs': (time.perf_counter() - start) * 1000,
+              'moves': len(moves)}
+    result['movegenUs'] = timed(chessBoard.generateMoves, seconds) * 1e6
+    rng = random.Random(seed)
+
+    def makeUnmake():
+        chessBoard.makeMove(rng.choice(moves))
+        chessBoard.unmakeMove()
+
+    result['makeUs'] = timed(makeUnmake, seconds) * 1e6
+    result['copyUs'] = timed(chessBoard.copy, seconds) * 1e6
+    if frames:
+        from render2 import ChessRender
+        renderer = ChessRender('empty', boardNo)
+        renderer.setChessBoard(chessBoard)
+
+        def fullFrame():
+            renderer._background = None
+            renderer.render()
+
+        def moveFrame():
+            chessBoard.makeMove(rng.choice(moves))
+            renderer.render()
+            chessBoard.unmakeMove()
+            renderer.render()
+
+        result['fullFrameMs'] = timed(fullFrame, seconds) * 1000
+        result['frameMs'] = timed(moveFrame, seconds) / 2 * 1000
+        renderer.close()
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="measure move generation, copy and frame time against boardNo")
+    parser.add_argument('--boardNos', type=int, nargs='+', default=[4, 6, 8, 10, 12, 16])
+    parser.add_argument('--seconds', type=float, default=0.2, help="time spent on each measurement")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--noFrames', action='store_true', help="skip the renderer")
+    args = parser.parse_args(argv)
+
+    frames = not args.noFrames and importlib.util.find_spec('pygame') is not None
+    print('%7s %7s %9s %11s %6s %8s %8s %13s %9s' % ('boardNo', 'squares', 'setup ms', 'movegen us', 'moves',
+                                                     'make us', 'copy us', 'full frame ms', 'frame ms'))
+    for boardNo in args.boardNos:
+        result = measureBoard(boardNo, args.seconds, args.seed, frames)
+        line = '%7d %7d %9.1f %11.1f %6d %8.1f %8.1f' % (
+            boardNo, result['squares'], result['setupMs'], result['movegenUs'], result['moves'], result['makeUs'],
+            result['copyUs'])
+        if frames:
+            line += ' %13.2f %9.3f' % (result['fullFrameMs'], result['frameMs'])
+        print(line, flush=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
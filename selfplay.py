@@ -0,0 +1,207 @@
+"""headless self-play: games between random, greedy-capture and engine players
+
+games are played with ChessBoard alone (no pygame), optionally over worker processes, and written as they finish to
+a game record file (gamerecord) or JSON lines. a game ends when a king is captured, the side to move has no move,
+the position occurs for the third time or maxPlies is reached; the last two are draws
+
+players are given as strings: 'random', 'greedy' (captures the most valuable piece, otherwise random) or
+'engine[:depth]' (the SearchEngine at depth, default 2)
+
+usage: python selfplay.py [--games 100] [--layout testing] [--white random] [--black greedy] [--maxPlies 200]
+                          [--workers W] [--seed 1] [--out games.3dcg | --out games.jsonl]
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from collections import namedtuple
+
+from components import ChessBoard, King
+from engine import SearchEngine, ORDERVALUES, TYPEVALUES, formatMove
+from gamerecord import GameRecordWriter
+
+PHASES = ('generate', 'choose', 'make')  # timed parts of every ply, summed over a game
+
+GameResult = namedtuple('GameResult', 'moves result reason plies timings')
+
+
+class RandomPlayer:
+    "plays a uniformly random pseudo-legal move"
+
+    def chooseMove(self, chessBoard, moves, rng):
+        return rng.choice(moves)
+
+
+class GreedyCapturePlayer:
+    "plays the capture of the most valuable piece with the least valuable attacker, otherwise a random move"
+
+    def chooseMove(self, chessBoard, moves, rng):
+        squares = chessBoard._squares
+        index = chessBoard.squareIndex
+        best, bestOrder = [], 0
+        for move in moves:
+            victim = squares[index(move[1])] >> 1
+            if not victim:
+                continue
+            order = ORDERVALUES[victim] * 16 - TYPEVALUES[squares[index(move[0])] >> 1] // 16 + 1
+            if order > bestOrder:
+                best, bestOrder = [move], order
+            elif order == bestOrder:
+                best.append(move)
+        return rng.choice(best or moves)
+
+
+class EnginePlayer:
+    "plays the best move of a SearchEngine search, the engine and its transposition table are kept across games"
+
+    def __init__(self, depth=2, timeLimit=None, nodeLimit=None, ttMegabytes=4):
+        self.depth = depth
+        self.timeLimit = timeLimit
+        self.nodeLimit = nodeLimit
+        self.engine = SearchEngine(ttMegabytes)
+
+    def chooseMove(self, chessBoard, moves, rng):
+        result = self.engine.search(chessBoard, self.depth, self.timeLimit, self.nodeLimit)
+        return result.bestMove if result.bestMove is not None else rng.choice(moves)
+
+
+def makePlayer(spec):
+    """returns the player of a spec string, see the module docstring"""
+    name, _, argument = spec.partition(':')
+    if name == 'random':
+        return RandomPlayer()
+    if name == 'greedy':
+        return GreedyCapturePlayer()
+    if name == 'engine':
+        return EnginePlayer(int(argument) if argument else 2)
+    raise Exception("unknown player %r, use random, greedy or engine[:depth]" % spec)
+
+
+def playGame(white, black, initialLayout='testing', boardNo=8, maxPlies=200, seed=None):
+    """plays one game between two players and returns its GameResult, result is '1-0', '0-1' or '1/2-1/2'"""
+    rng = random.Random(seed)
+    chessBoard = ChessBoard(initialLayout, boardNo)
+    players = (white, black)
+    timings = dict.fromkeys(PHASES, 0.0)
+    clock = time.perf_counter
+    result, reason = '1/2-1/2', 'maxPlies'
+    for _ in range(maxPlies):
+        side = int(chessBoard.getCurrentSide())
+        start = clock()
+        moves = chessBoard.generateMoves()
+        chosen = clock()
+        timings['generate'] += chosen - start
+        if not moves:
+            result, reason = '1/2-1/2', 'noMoves'
+            break
+        move = players[side].chooseMove(chessBoard, moves, rng)
+        made = clock()
+        timings['choose'] += made - chosen
+        captured = chessBoard.makeMove(move)
+        timings['make'] += clock() - made
+        if isinstance(captured, King):
+            result, reason = ('0-1', '1-0')[side == 0], 'kingCaptured'
+            break
+        if chessBoard.repetitionCount() >= 3:
+            result, reason = '1/2-1/2', 'repetition'
+            break
+    moves = chessBoard.getMoveHistory()
+    return GameResult(moves, result, reason, len(moves), timings)
+
+
+_workerPlayers = dict()  # player spec -> player of the current process, engines are reused across games
+
+
+def _getPlayer(spec):
+    player = _workerPlayers.get(spec)
+    if player is None:
+        player = _workerPlayers[spec] = makePlayer(spec)
+    return player
+
+
+def _playTask(task):
+    """worker side: (game number, white spec, black spec, layout, boardNo, maxPlies, seed) -> (number, GameResult)"""
+    number, whiteSpec, blackSpec, initialLayout, boardNo, maxPlies, seed = task
+    return number, playGame(_getPlayer(whiteSpec), _getPlayer(blackSpec), initialLayout, boardNo, maxPlies, seed)
+
+
+def runSelfPlay(games, whiteSpec='random', blackSpec='random', initialLayout='testing', boardNo=8, maxPlies=200,
+                seed=1, workers=1):
+    """plays games games and yields (game number, GameResult) in game order, game n is seeded with seed + n
+    with more than one worker the games are spread over a process pool"""
+    tasks = ((number, whiteSpec, blackSpec, initialLayout, boardNo, maxPlies, seed + number)
+             for number in range(games))
+    if workers <= 1:
+        for task in tasks:
+            yield _playTask(task)
+        return
+    from concurrent.futures import ProcessPoolExecutor  # only loaded when there is a pool to start
+    with ProcessPoolExecutor(workers) as executor:
+        yield from executor.map(_playTask, tasks, chunksize=4)
+
+
+class JsonLinesWriter:
+    "writes one JSON object per game"
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def writeGame(self, moves, boardNo=8, initialLayout='empty', metadata=None):
+        record = dict(metadata or {})
+        record.update(boardNo=boardNo, layout=initialLayout, moves=[formatMove(move) for move in moves])
+        self.stream.write(json.dumps(record) + '\n')
+
+    def close(self):
+        self.stream.close()
+
+
+def openGameWriter(path):
+    """returns a JsonLinesWriter for a .jsonl path, a GameRecordWriter appending to any other path"""
+    if path.endswith('.jsonl'):
+        return JsonLinesWriter(open(path, 'a'))
+    return GameRecordWriter(open(path, 'ab'))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="play 3D chess games between computer players")
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--layout', default='testing', help="initial layout passed to ChessBoard")
+    parser.add_argument('--boardNo', type=int, default=8)
+    parser.add_argument('--white', default='random', help="random, greedy or engine[:depth]")
+    parser.add_argument('--black', default='random', help="random, greedy or engine[:depth]")
+    parser.add_argument('--maxPlies', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=1, help="worker processes, 1 plays in this process")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--out', help="game record file, or JSON lines if it ends with .jsonl")
+    args = parser.parse_args(argv)
+
+    writer = openGameWriter(args.out) if args.out else None
+    scores = {'1-0': 0, '0-1': 0, '1/2-1/2': 0}
+    timings = dict.fromkeys(PHASES + ('write',), 0.0)
+    plies = 0
+    start = time.perf_counter()
+    for number, game in runSelfPlay(args.games, args.white, args.black, args.layout, args.boardNo, args.maxPlies,
+                                    args.seed, args.workers):
+        scores[game.result] += 1
+        plies += game.plies
+        for phase, seconds in game.timings.items():
+            timings[phase] += seconds
+        if writer is not None:
+            written = time.perf_counter()
+            writer.writeGame(game.moves, args.boardNo, args.layout,
+                             {'game': number, 'white': args.white, 'black': args.black, 'result': game.result,
+                              'reason': game.reason, 'seed': args.seed + number})
+            timings['write'] += time.perf_counter() - written
+    seconds = time.perf_counter() - start
+    if writer is not None:
+        writer.close()
+    print('%d games, %d plies in %.2fs: %.2f games/s, %.0f moves/s' % (
+        args.games, plies, seconds, args.games / seconds, plies / seconds))
+    print('white %d, black %d, draws %d' % (scores['1-0'], scores['0-1'], scores['1/2-1/2']))
+    print('phase seconds (summed over workers): ' + ', '.join('%s %.3f' % item for item in timings.items()))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
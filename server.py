@@ -0,0 +1,285 @@
+"""headless asyncio server hosting many ChessBoard games in one process
+
+clients talk line-delimited JSON over TCP or a Unix socket: every request is one JSON object on one line, answered
+by one JSON line in the order the requests were sent. a request may carry an "id", which is echoed back. a game
+changes only through the ChessBoard API (playMove), and engine searches run in a process pool so the event loop is
+never blocked by them
+
+squares are [x, y, z] lists, a move is [origin, target] or [origin, target, promotion class name]
+
+    {"op": "create", "layout": "testing", "boardNo": 8}      -> {"game": 1, "side": 0}
+    {"op": "moves", "game": 1}                               -> {"moves": [move, ...]} for the side to move
+    {"op": "moves", "game": 1, "square": [1, 1, 1]}          -> {"moves": [square, ...], "captures": [square, ...]}
+    {"op": "move", "game": 1, "move": move}                  -> {"captured": name or null, "side": 1, "result": ...}
+    {"op": "engine", "game": 1, "depth": 3, "play": true}    -> {"move": move, "score": 12, "nodes": 300, ...}
+    {"op": "state", "game": 1}                               -> {"position": packed hex, "side": 0, "plies": 0, ...}
+    {"op": "close", "game": 1}                               -> {}
+    {"op": "stats"}                                          -> {"games": 1, "requests": 10, ...}
+
+create takes the layouts empty, testing and vortex and a boardNo from 4 to 16. an engine search is held to at most
+6 plies and 30 seconds, 5 seconds when no "time" is given.
+
+every answer has "ok"; a failed request answers {"ok": false, "error": message}. a game is over when a king is
+captured, its "result" is then "1-0" or "0-1" and further moves are refused
+
+usage: python server.py [--host 127.0.0.1] [--port 7878] [--unix PATH] [--workers W]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+from components import ChessBoard, King, PawnPiece, pieceClasses
+
+MAXLINE = 1 << 20  # longest request line accepted, in bytes
+LAYOUTS = ('empty', 'testing', 'vortex')  # the initial layouts of ChessBoard.setInitialLayout
+MINBOARD, MAXBOARD = 4, 16  # boardNo accepted by create
+MAXDEPTH = 6  # deepest engine search a client may ask for
+ENGINETIME, MAXENGINETIME = 5.0, 30.0  # default and longest engine search time, in seconds
+
+_classesByName = {pieceClass.__name__: pieceClass for pieceClass in pieceClasses.values()}
+_workerEngine = None  # SearchEngine of the current executor process
+
+
+def _engineReply(packed, boardNo, maxDepth, timeLimit, nodeLimit):
+    """executor side: searches a packed position, returns (best move, score, nodes, seconds)"""
+    global _workerEngine
+    if _workerEngine is None:
+        from engine import SearchEngine
+        _workerEngine = SearchEngine(16)
+    result = _workerEngine.search(ChessBoard.fromPacked(packed, boardNo), maxDepth, timeLimit, nodeLimit)
+    return result.bestMove, result.score, result.nodes, result.seconds
+
+
+def moveToJson(move):
+    encoded = [list(move[0]), list(move[1])]
+    if len(move) > 2:
+        encoded.append(move[2].__name__)
+    return encoded
+
+
+def moveFromJson(encoded):
+    if not isinstance(encoded, list) or len(encoded) not in (2, 3):
+        raise Exception("a move is [origin, target] or [origin, target, promotion]")
+    move = (tuple(int(n) for n in encoded[0]), tuple(int(n) for n in encoded[1]))
+    if len(encoded) == 3:
+        if encoded[2] not in _classesByName:
+            raise Exception("unknown promotion class %r" % encoded[2])
+        move += (_classesByName[encoded[2]],)
+    return move
+
+
+class Game:
+    "one hosted game, a lock serializes requests that change it"
+
+    def __init__(self, number, initialLayout, boardNo):
+        self.number = number
+        self.initialLayout = initialLayout
+        self.chessBoard = ChessBoard(initialLayout, boardNo)
+        self.result = None  # '1-0' or '0-1' once a king is captured
+        self.lock = asyncio.Lock()
+
+    def play(self, move):
+        if self.result is not None:
+            raise Exception("game %d is over" % self.number)
+        chessBoard = self.chessBoard
+        side = chessBoard.getCurrentSide()
+        piece = chessBoard.getPieceByCoordinate(move[0])
+        if piece is None or piece.side != side:
+            raise Exception("no piece of the side to move on %r" % (move[0],))
+        targets, captures = chessBoard.nextMoveCapture(piece)
+        if move[1] not in targets and move[1] not in captures:
+            raise Exception("illegal move")
+        promoting = isinstance(piece, PawnPiece) and move[1] in piece.promotionCoordinateList
+        if promoting != (len(move) > 2) or (promoting and move[2] not in piece.promotionPieces):
+            raise Exception("a pawn move onto a promotion square, and only such a move, names a promotion class")
+        captured = chessBoard.playMove(move)
+        if isinstance(captured, King):
+            self.result = '0-1' if side else '1-0'
+        return captured
+
+
+class GameServer:
+    "the games and the request handlers, serve() listens for clients"
+
+    def __init__(self, workers=None):
+        self.games = dict()
+        self.requests = 0
+        self.movesPlayed = 0
+        self.connections = 0
+        self._nextGame = 1
+        self._workers = workers or os.cpu_count() or 1
+        self._executor = None
+        self._handlers = {'create': self.create, 'moves': self.moves, 'move': self.move, 'engine': self.engine,
+                          'state': self.state, 'close': self.close, 'stats': self.stats}
+
+    def executor(self):
+        if self._executor is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor  # loaded with the first engine request
+            # spawned rather than forked, a fork would copy the event loop and the client sockets
+            self._executor = ProcessPoolExecutor(self._workers, mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _game(self, request):
+        game = self.games.get(request.get('game'))
+        if game is None:
+            raise Exception("no game %r" % request.get('game'))
+        return game
+
+    async def handle(self, request):
+        """answers one request dict, errors become {"ok": false}"""
+        self.requests += 1
+        try:
+            if not isinstance(request, dict):
+                raise Exception("a request must be a JSON object")
+            handler = self._handlers.get(request.get('op'))
+            if handler is None:
+                raise Exception("unknown op %r" % request.get('op'))
+            response = await handler(request)
+            response['ok'] = True
+        except Exception as error:
+            response = {'ok': False, 'error': str(error)}
+        if isinstance(request, dict) and 'id' in request:
+            response['id'] = request['id']
+        return response
+
+    # handlers
+    async def create(self, request):
+        initialLayout = request.get('layout', 'testing')
+        if initialLayout not in LAYOUTS:
+            raise Exception("unknown layout %r, one of %s" % (initialLayout, ', '.join(LAYOUTS)))
+        boardNo = int(request.get('boardNo', 8))
+        if not MINBOARD <= boardNo <= MAXBOARD:
+            raise Exception("boardNo must be from %d to %d" % (MINBOARD, MAXBOARD))
+        game = Game(self._nextGame, initialLayout, boardNo)
+        self.games[game.number] = game
+        self._nextGame += 1
+        return {'game': game.number, 'side': int(game.chessBoard.getCurrentSide())}
+
+    async def moves(self, request):
+        game = self._game(request)
+        chessBoard = game.chessBoard
+        if 'square' in request:
+            piece = chessBoard.getPieceByCoordinate(tuple(int(n) for n in request['square']))
+            if piece is None:
+                raise Exception("no piece on %r" % request['square'])
+            move, capture = chessBoard.nextMoveCapture(piece)
+            return {'moves': sorted(list(square) for square in move),
+                    'captures': sorted(list(square) for square in capture)}
+        if game.result is not None:
+            return {'moves': [], 'result': game.result}
+        return {'moves': [moveToJson(move) for move in chessBoard.generateMoves()]}
+
+    async def move(self, request):
+        game = self._game(request)
+        async with game.lock:
+            captured = game.play(moveFromJson(request.get('move')))
+        self.movesPlayed += 1
+        return {'captured': captured.getID() if captured is not None else None,
+                'side': int(game.chessBoard.getCurrentSide()), 'result': game.result}
+
+    async def engine(self, request):
+        game = self._game(request)
+        async with game.lock:  # no move may be played while the engine thinks about the position
+            if game.result is not None:
+                raise Exception("game %d is over" % game.number)
+            chessBoard = game.chessBoard
+            maxDepth = min(max(int(request.get('depth', 3)), 1), MAXDEPTH)
+            timeLimit = min(max(float(request.get('time', ENGINETIME)), 0.01), MAXENGINETIME)
+            nodeLimit = int(request['nodes']) if request.get('nodes') else None
+            loop = asyncio.get_running_loop()
+            bestMove, score, nodes, seconds = await loop.run_in_executor(
+                self.executor(), _engineReply, chessBoard.pack(), chessBoard.boardNo, maxDepth, timeLimit, nodeLimit)
+            response = {'move': moveToJson(bestMove) if bestMove else None, 'score': score, 'nodes': nodes,
+                        'seconds': round(seconds, 4)}
+            if request.get('play') and bestMove:
+                captured = game.play(bestMove)
+                self.movesPlayed += 1
+                response.update(captured=captured.getID() if captured is not None else None,
+                                side=int(chessBoard.getCurrentSide()), result=game.result)
+        return response
+
+    async def state(self, request):
+        game = self._game(request)
+        chessBoard = game.chessBoard
+        return {'position': chessBoard.pack().hex(), 'side': int(chessBoard.getCurrentSide()),
+                'plies': len(chessBoard.getMoveHistory()), 'layout': game.initialLayout,
+                'boardNo': chessBoard.boardNo, 'result': game.result}
+
+    async def close(self, request):
+        self.games.pop(self._game(request).number)
+        return {}
+
+    async def stats(self, request):
+        return {'games': len(self.games), 'requests': self.requests, 'moves': self.movesPlayed,
+                'connections': self.connections}
+
+    # connections
+    async def serveClient(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:  # longer than MAXLINE
+                    writer.write(b'{"ok": false, "error": "request line too long"}\n')
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    response = {'ok': False, 'error': "request is not valid JSON"}
+                else:
+                    response = await self.handle(request)
+                writer.write(json.dumps(response, separators=(',', ':')).encode('utf-8') + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def start(self, host='127.0.0.1', port=7878, unixPath=None):
+        """starts listening and returns the asyncio server"""
+        if unixPath:
+            return await asyncio.start_unix_server(self.serveClient, unixPath, limit=MAXLINE)
+        return await asyncio.start_server(self.serveClient, host, port, limit=MAXLINE)
+
+
+async def serve(host='127.0.0.1', port=7878, unixPath=None, workers=None):
+    gameServer = GameServer(workers)
+    server = await gameServer.start(host, port, unixPath)
+    print('serving on %s' % (unixPath or '%s:%d' % (host, port)), flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        gameServer.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="host 3D chess games over line-delimited JSON")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7878)
+    parser.add_argument('--unix', help="listen on this Unix socket path instead of TCP")
+    parser.add_argument('--workers', type=int, help="engine processes, default one per core")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, args.workers))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""sprite atlas: every piece sprite loaded once, pre-scaled per square size and packed into one surface per size
+
+sprites are read from the sprites directory next to this file, not the working directory. a renderer acquires the
+square size it draws at, which builds the atlas of that size up front, and releases it when it stops using it; an
+atlas whose size nobody holds any more is evicted
+"""
+import os
+
+import pygame
+
+from components import pieceClasses
+
+SPRITEDIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sprites')
+SIDECOLOURS = ((255, 255, 255), (0, 0, 0))  # fill of the placeholder drawn for a piece without a sprite file
+
+_sharedAtlas = None
+
+
+class SpriteAtlas:
+    "piece sprites by (piece id, side, size), one packed surface per size"
+
+    def __init__(self, directory=SPRITEDIRECTORY):
+        self.directory = directory
+        self._files = dict()  # (piece id, side) -> sprite file name
+        for pieceClass in pieceClasses.values():
+            piece = pieceClass()
+            for side, address in enumerate(piece.getAddress()):
+                self._files[(piece.getID(), side)] = address
+        self._sources = dict()  # sprite file name -> unscaled Surface, None if the file does not exist
+        for address in self._files.values():
+            path = os.path.join(directory, address)
+            self._sources[address] = pygame.image.load(path) if os.path.exists(path) else None
+        self._atlases = dict()  # size -> (atlas Surface, {(piece id, side): area rect in the atlas})
+        self._users = dict()  # size -> number of renderers holding it
+
+    def acquire(self, size):
+        """marks size as in use and builds its atlas if needed"""
+        self._users[size] = self._users.get(size, 0) + 1
+        self.atlas(size)
+
+    def release(self, size):
+        """marks one user of size as done, the atlas is evicted when no user is left"""
+        users = self._users.get(size, 0) - 1
+        if users > 0:
+            self._users[size] = users
+        else:
+            self._users.pop(size, None)
+            self._atlases.pop(size, None)
+
+    def sizes(self):
+        """returns the sizes that currently have an atlas"""
+        return sorted(self._atlases)
+
+    def atlas(self, size):
+        """returns (atlas surface, areas) of size, building it on first use"""
+        if size not in self._atlases:
+            keys = sorted(self._files)
+            surface = pygame.Surface((size * len(keys), size), pygame.SRCALPHA)
+            areas = dict()
+            for number, key in enumerate(keys):
+                area = pygame.Rect(number * size, 0, size, size)
+                source = self._sources[self._files[key]]
+                if source is not None:
+                    surface.blit(pygame.transform.scale(source, (size, size)), area)
+                else:
+                    self._drawPlaceholder(surface, area, key[1])
+                areas[key] = area
+            if pygame.display.get_init() and pygame.display.get_surface() is not None:
+                surface = surface.convert_alpha()  # matches the window format for fast blits
+            self._atlases[size] = (surface, areas)
+        return self._atlases[size]
+
+    def _drawPlaceholder(self, surface, area, side):
+        radius = max(2, area.width // 3)
+        pygame.draw.circle(surface, SIDECOLOURS[side], area.center, radius)
+        pygame.draw.circle(surface, SIDECOLOURS[0 if side else 1], area.center, radius, max(1, radius // 4))
+
+    def blit(self, target, chessPiece, size, position):
+        """draws the sprite of chessPiece at size onto target with its top left corner at position"""
+        surface, areas = self.atlas(size)
+        target.blit(surface, position, areas[(chessPiece.getID(), int(chessPiece.side))])
+
+
+def getSpriteAtlas():
+    """returns the process wide SpriteAtlas shared by all renderers"""
+    global _sharedAtlas
+    if _sharedAtlas is None:
+        _sharedAtlas = SpriteAtlas()
+    return _sharedAtlas
@@ -0,0 +1,557 @@
+"""endgame tablebases: exact results of small piece sets by retrograde analysis
+
+a table covers every placement of one material set (two kings and a few queens, rooks, bishops and knights, no
+pawns) on a boardNo**3 board with either side to move. material is written as the white pieces followed by the black
+ones, each side starting with its king: 'KRK' is king and rook against a lone king. the stronger side is always
+stored as white, positions with the colours the other way round are probed with the colours swapped
+
+positions are numbered by index: side to move, the white king square folded into the fundamental domain of the 48
+symmetries of the cube (x <= y <= z <= (boardNo - 1) / 2), then the flat square of every other piece. a position is
+stored under the smallest index among its images that keep the white king in the domain, which makes the index
+space about 48 times smaller than the raw placements
+
+results follow the rules of ChessBoard: a side wins by capturing the enemy king and a side without moves draws. an
+entry is 0 for a draw (and for indices no position is stored under), odd n when the side to move captures the king
+n plies from now and even n when its own king is captured after n plies. the analysis works on NumPy arrays of
+indices, one ply at a time: the king captures are won in 1, a position is won in n + 1 if it has a move into a loss
+in n (found by taking back moves from the positions lost in n) and lost in n + 1 if all its moves lead to wins of at
+most n (checked by generating the moves of the candidates found the same way). captures lead into the tables of
+the smaller material, which are generated first. the scans run over index chunks on a process pool
+
+a table is the file NAME.BOARDNO.3dtb, a 32 byte header followed by one uint8 per index (uint16 if a result is
+longer than 255 plies), memory-mapped so a probe reads one entry
+
+usage: python tablebase.py MATERIAL [--boardNo 5] [--dir .] [--workers W] [--check 1000]
+"""
+import argparse
+import itertools
+import os
+import random
+import struct
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from components import ChessBoard, King, Queen, Rook, Bishop, Knight, LinePiece, pieceCode
+from movetables import getMoveTables
+
+PIECELETTERS = {'K': King, 'Q': Queen, 'R': Rook, 'B': Bishop, 'N': Knight}
+LETTERORDER = 'KQRBN'  # order of the pieces within a side, strongest first
+HEADER = struct.Struct('<4sBBH24s')  # magic, boardNo, bytes per entry, longest result in plies, name
+CHUNK = 1 << 16  # indices per scan task
+
+TablebaseResult = namedtuple('TablebaseResult', 'result plies')  # result 'win', 'loss' or 'draw' for the side to move
+
+_pieceLetters = {pieceClass: letter for letter, pieceClass in PIECELETTERS.items()}
+_workerScanners = dict()  # (name, boardNo, directory) -> _Scanner of the current process
+
+
+def parseMaterial(material):
+    """returns (white letters, black letters) of a material string such as 'KRK' or 'KQKR', each side sorted"""
+    material = material.upper()
+    split = material.find('K', 1)
+    if (not material.startswith('K') or split < 0 or 'K' in material[split + 1:]
+            or any(letter not in PIECELETTERS for letter in material)):
+        raise Exception("material must be two sides of K, Q, R, B and N letters each starting with K, like KRK")
+    white, black = material[:split], material[split:]
+    return ('K' + ''.join(sorted(white[1:], key=LETTERORDER.index)),
+            'K' + ''.join(sorted(black[1:], key=LETTERORDER.index)))
+
+
+def canonicalMaterial(material):
+    """returns (table name, swapped): the name has the stronger side first, swapped tells whether that swapped the
+    colours of material"""
+    white, black = parseMaterial(material)
+
+    def strength(letters):
+        return len(letters), [-LETTERORDER.index(letter) for letter in letters]
+
+    if strength(black) > strength(white):
+        return black + white, True
+    return white + black, False
+
+
+def captureMaterials(name):
+    """returns the table names reached by capturing one piece other than a king"""
+    white, black = parseMaterial(name)
+    names = []
+    for position in range(1, len(white)):
+        names.append(canonicalMaterial(white[:position] + white[position + 1:] + black)[0])
+    for position in range(1, len(black)):
+        names.append(canonicalMaterial(white + black[:position] + black[position + 1:])[0])
+    return sorted(set(names))
+
+
+def boardMaterial(chessBoard):
+    """returns the material string of the pieces on chessBoard, None if one of them has no letter (pawns)"""
+    letters = (['K'], ['K'])
+    for piece in chessBoard.getpieceList():
+        letter = _pieceLetters.get(type(piece))
+        if letter is None:
+            return None
+        if letter != 'K':
+            letters[int(piece.side)].append(letter)
+    return ''.join(letters[0]) + ''.join(letters[1])
+
+
+def tablebasePath(directory, name, boardNo):
+    return os.path.join(directory, '%s.%d.3dtb' % (name, boardNo))
+
+
+class TablebaseIndex:
+    "numbering of the positions of one material set on one board size"
+
+    def __init__(self, name, boardNo=8):
+        white, black = parseMaterial(name)
+        self.name = white + black
+        self.boardNo = boardNo
+        self.squareCount = boardNo ** 3
+        self.pieceClasses = [PIECELETTERS[letter] for letter in self.name]
+        self.columnSides = np.array([0] * len(white) + [1] * len(black))
+        self.kingColumns = (0, len(white))
+        self._columnOrders = [LETTERORDER.index(letter) for letter in white] + [
+            LETTERORDER.index(letter) for letter in black]
+
+        coordinates = np.array(getMoveTables(boardNo).coordinates)
+        symmetries = []  # (48, squareCount) square mapped by each symmetry, the identity first
+        for permutation in itertools.permutations(range(3)):
+            for flips in itertools.product((False, True), repeat=3):
+                mapped = coordinates[:, permutation]
+                mapped = np.where(flips, boardNo - 1 - mapped, mapped)
+                symmetries.append((mapped[:, 0] * boardNo + mapped[:, 1]) * boardNo + mapped[:, 2])
+        self._symmetries = np.array(symmetries)
+        folded = np.sort(np.minimum(coordinates, boardNo - 1 - coordinates), axis=1)
+        self._kingDomain = (folded[:, 0] * boardNo + folded[:, 1]) * boardNo + folded[:, 2]  # square -> domain square
+        self._domain = np.unique(self._kingDomain)
+        self._domainNumbers = np.full(self.squareCount, -1, np.int64)
+        self._domainNumbers[self._domain] = np.arange(len(self._domain))
+        # the first symmetry taking each square into the domain, then the ones leaving a domain square in place
+        self._intoDomain = (self._symmetries == self._kingDomain).argmax(axis=0)
+        self._stabilizers = self._symmetries[1:] == np.arange(self.squareCount)
+        self._stabilizers[:, self._domainNumbers < 0] = False
+        self._stabilizing = np.nonzero(self._stabilizers.any(axis=1))[0]
+        self.domainSize = len(self._domain)
+        self.size = 2 * self.domainSize * self.squareCount ** (len(self.name) - 1)
+
+    def indices(self, squares, sides):
+        """returns the index of every position, squares is an (N, pieces) array of flat squares in column order and
+        sides the side to move of each"""
+        squares = np.asarray(squares, np.int64)
+        sides = np.asarray(sides, np.int64)
+        mapped = self._symmetries[self._intoDomain[squares[:, 0]][:, np.newaxis], squares]
+        best = self._compose(mapped, sides)
+        for number in self._stabilizing:
+            rows = np.nonzero(self._stabilizers[number, mapped[:, 0]])[0]
+            if len(rows):
+                images = self._compose(self._symmetries[number + 1][mapped[rows]], sides[rows])
+                best[rows] = np.minimum(best[rows], images)
+        return best
+
+    def _compose(self, squares, sides):
+        index = sides * self.domainSize + self._domainNumbers[squares[:, 0]]
+        for column in range(1, squares.shape[1]):
+            index = index * self.squareCount + squares[:, column]
+        return index
+
+    def positions(self, indices):
+        """returns (squares, sides) of indices, the inverse of indices for the indices positions are stored under"""
+        rest = np.asarray(indices, np.int64)
+        squares = np.empty((len(rest), len(self.name)), np.int64)
+        for column in range(len(self.name) - 1, 0, -1):
+            rest, squares[:, column] = np.divmod(rest, self.squareCount)
+        sides, domainNumbers = np.divmod(rest, self.domainSize)
+        squares[:, 0] = self._domain[domainNumbers]
+        return squares, sides
+
+    def boardPosition(self, chessBoard):
+        """returns (squares, side to move) of chessBoard in column order, with the colours swapped if that is how the
+        table stores it, None if the material on the board is not this table's"""
+        if chessBoard.boardNo != self.boardNo:
+            return None
+        bySide = ([], [])
+        for piece in chessBoard.getpieceList():
+            letter = _pieceLetters.get(type(piece))
+            if letter is None:
+                return None
+            bySide[int(piece.side)].append((LETTERORDER.index(letter),
+                                            chessBoard.squareIndex(piece.getCoordinates())))
+        side = int(chessBoard.getCurrentSide())
+        for swapped in (0, 1):
+            columns = sorted(bySide[swapped]) + sorted(bySide[1 - swapped])
+            if [order for order, _ in columns] == self._columnOrders:
+                return [square for _, square in columns], side ^ swapped
+        return None
+
+
+def _result(value):
+    value = int(value)
+    if not value:
+        return TablebaseResult('draw', 0)
+    return TablebaseResult('win' if value & 1 else 'loss', value)
+
+
+class Tablebase(TablebaseIndex):
+    "a generated table, probed through a read-only memory map"
+
+    def __init__(self, path):
+        with open(path, 'rb') as stream:
+            magic, boardNo, itemSize, longest, name = HEADER.unpack(stream.read(HEADER.size))
+        if magic != b'3DTB':
+            raise Exception("%s is not a tablebase file" % path)
+        super().__init__(name.rstrip(b'\0').decode('ascii'), boardNo)
+        self.path = path
+        self.longest = longest  # longest result in plies
+        self.values = np.memmap(path, {1: np.uint8, 2: np.uint16}[itemSize], 'r', HEADER.size, (self.size,))
+
+    def probe(self, chessBoard):
+        """returns the TablebaseResult of the side to move of chessBoard, None if the material is not this table's"""
+        position = self.boardPosition(chessBoard)
+        if position is None:
+            return None
+        squares, side = position
+        return _result(self.values[self.indices([squares], [side])[0]])
+
+
+class TablebaseSet:
+    "the tables of one directory, opened on first use"
+
+    def __init__(self, directory='.'):
+        self.directory = directory
+        self._tables = dict()
+
+    def table(self, material, boardNo=8):
+        """returns the Tablebase of material, None if it has not been generated"""
+        name = canonicalMaterial(material)[0]
+        key = (name, boardNo)
+        if key not in self._tables:
+            path = tablebasePath(self.directory, name, boardNo)
+            self._tables[key] = Tablebase(path) if os.path.exists(path) else None
+        return self._tables[key]
+
+    def probe(self, chessBoard):
+        """returns the TablebaseResult of chessBoard, None if its material has no table"""
+        material = boardMaterial(chessBoard)
+        table = self.table(material, chessBoard.boardNo) if material else None
+        return table.probe(chessBoard) if table is not None else None
+
+    def bestMove(self, chessBoard):
+        """returns (move, TablebaseResult after it from the mover's point of view) of the move keeping the best
+        result: the fastest win, else a draw, else the slowest loss. (None, draw) if there is no move, None if a
+        position after a move has no table"""
+        best, bestRank = (None, TablebaseResult('draw', 0)), None
+        for move in chessBoard.generateMoves():
+            captured = chessBoard.makeMove(move)
+            try:
+                if isinstance(captured, King):
+                    return move, TablebaseResult('win', 1)
+                reply = self.probe(chessBoard)
+            finally:
+                chessBoard.unmakeMove()
+            if reply is None:
+                return None
+            if reply.result == 'draw':
+                result, rank = reply, (1, 0)
+            elif reply.result == 'win':
+                result, rank = TablebaseResult('loss', reply.plies + 1), (0, reply.plies)
+            else:
+                result, rank = TablebaseResult('win', reply.plies + 1), (2, -reply.plies)
+            if bestRank is None or rank > bestRank:
+                best, bestRank = (move, result), rank
+        return best
+
+
+class _Scanner(TablebaseIndex):
+    "move generation over chunks of indices, the work of one generation process"
+
+    def __init__(self, name, boardNo, directory):
+        super().__init__(name, boardNo)
+        self.directory = directory
+        tables = getMoveTables(boardNo)
+        padding = self.squareCount
+        self._moveTables = []  # per column, (line piece, padded table)
+        for pieceClass in self.pieceClasses:
+            if issubclass(pieceClass, LinePiece):
+                table = np.full((padding, len(pieceClass.moveVectors), boardNo - 1), padding, np.int64)
+                for number, vector in enumerate(pieceClass.moveVectors):
+                    for index, rays in enumerate(tables.rays([vector])):
+                        for ray in rays:
+                            table[index, number, :len(ray)] = ray
+            else:
+                table = np.full((padding, len(pieceClass.stepVectors)), padding, np.int64)
+                for number, vector in enumerate(pieceClass.stepVectors):
+                    for index in range(padding):
+                        target = tables.offset(index, vector)
+                        if target is not None:
+                            table[index, number] = target
+            self._moveTables.append((issubclass(pieceClass, LinePiece), table))
+        self._hitSides = np.append(self.columnSides, -1)  # side of the piece hit by a move, -1 for an empty square
+        self._captures = dict()  # column -> (table after capturing it, its columns in that table, colours swapped)
+        for column in range(len(self.name)):
+            if column in self.kingColumns:
+                continue
+            rest = self.name[:column] + self.name[column + 1:]
+            subName, swapped = canonicalMaterial(rest)
+            remaining = [number for number in range(len(self.name)) if number != column]
+            if swapped:
+                remaining = ([number for number in remaining if self.columnSides[number]] +
+                             [number for number in remaining if not self.columnSides[number]])
+            subtable = Tablebase(tablebasePath(directory, subName, boardNo))
+            self._captures[column] = (subtable, remaining, int(swapped))
+        self._values = None
+
+    def values(self):
+        if self._values is None:
+            self._values = np.memmap(tablebasePath(self.directory, self.name, self.boardNo) + '.work', np.uint16, 'r')
+        return self._values
+
+    def _pieceMoves(self, squares, column):
+        """yields (rows, targets, hits) for the moves of the piece in column of every row of squares, one yield per
+        step vector or ray square: the rows having the move, the target squares and the column of the piece standing
+        on the target, -1 for an empty square. rays stop at the first piece, moves onto own pieces are included"""
+        line, table = self._moveTables[column]
+        allRows = np.arange(len(squares))
+        padding = self.squareCount
+        if not line:
+            for targets in table[squares[:, column]].T:
+                valid = targets != padding
+                rows, targets = allRows[valid], targets[valid]
+                yield rows, targets, self._hits(squares[rows], targets)
+            return
+        rays = table[squares[:, column]]
+        for direction in range(rays.shape[1]):
+            rows = allRows
+            for distance in range(rays.shape[2]):
+                targets = rays[rows, direction, distance]
+                valid = targets != padding
+                rows, targets = rows[valid], targets[valid]
+                if not len(rows):
+                    break
+                hits = self._hits(squares[rows], targets)
+                yield rows, targets, hits
+                rows = rows[hits < 0]
+
+    def _hits(self, squares, targets):
+        equal = squares == targets[:, np.newaxis]
+        return np.where(equal.any(axis=1), equal.argmax(axis=1), -1)
+
+    def scan(self, mode, data, ply=0):
+        """one task of the generation, see generateTablebase
+        'start' (start, stop): the stored positions of the index range, returned as (count, king captures, (indices,
+                               plies) won by a capture, (indices, plies) whose captures all lose, to be checked)
+        'lost' indices:        the indices lost in ply, all moves lead to wins in at most ply - 1
+        'undo' indices:        the sorted indices of the positions with a move into one of indices"""
+        if mode == 'start':
+            indices = np.arange(*data, dtype=np.int64)
+        else:
+            indices = np.asarray(data, np.int64)
+        squares, sides = self.positions(indices)
+        if mode == 'start':
+            stored = self.indices(squares, sides) == indices
+            for first, second in itertools.combinations(range(len(self.name)), 2):
+                stored &= squares[:, first] != squares[:, second]
+            indices, squares, sides = indices[stored], squares[stored], sides[stored]
+        if mode == 'undo':
+            return self._undo(squares, sides)
+
+        count = len(indices)
+        moves = np.zeros(count, np.int64)
+        kingCaptures = np.zeros(count, bool)
+        allWon = np.ones(count, bool)  # every successor seen is won for the side moving next
+        longestWin = np.zeros(count, np.int64)
+        shortestLoss = np.zeros(count, np.int64)  # 0 while no successor is lost for the side moving next
+        captured = np.zeros(count, bool)
+        values = self.values() if mode == 'lost' else None
+        for column, owner in enumerate(self.columnSides):
+            movers = np.nonzero(sides == owner)[0]
+            if not len(movers):
+                continue
+            moverSquares = squares[movers]
+            for rows, targets, hits in self._pieceMoves(moverSquares, column):
+                legal = self._hitSides[hits] != owner
+                rows, targets, hits = movers[rows[legal]], targets[legal], hits[legal]
+                moves[rows] += 1
+                kingCaptures[rows[hits == self.kingColumns[1 - owner]]] = True
+                successors = []  # (rows, values of the positions after the move)
+                for capturedColumn, (subtable, remaining, swapped) in self._captures.items():
+                    taking = hits == capturedColumn
+                    if taking.any():
+                        after = squares[rows[taking]]
+                        after[:, column] = targets[taking]
+                        sideAfter = np.full(len(after), (1 - owner) ^ swapped)
+                        successors.append((rows[taking], subtable.values[subtable.indices(after[:, remaining],
+                                                                                         sideAfter)]))
+                        captured[rows[taking]] = True
+                if values is not None:
+                    quiet = hits < 0
+                    after = squares[rows[quiet]]
+                    after[:, column] = targets[quiet]
+                    successors.append((rows[quiet], values[self.indices(after, np.full(len(after), 1 - owner))]))
+                for successorRows, successorValues in successors:
+                    successorValues = successorValues.astype(np.int64)
+                    won = (successorValues & 1) == 1
+                    allWon[successorRows[~won]] = False
+                    longestWin[successorRows] = np.maximum(longestWin[successorRows], successorValues * won)
+                    lost = ~won & (successorValues > 0)
+                    lostRows, lostValues = successorRows[lost], successorValues[lost]
+                    current = shortestLoss[lostRows]
+                    shortestLoss[lostRows] = np.where(current > 0, np.minimum(current, lostValues), lostValues)
+        if mode == 'lost':
+            return indices[allWon & (moves > 0) & ~kingCaptures & (longestWin <= ply - 1)]
+        capturingWins = (shortestLoss > 0) & ~kingCaptures
+        capturingLosses = captured & allWon & ~kingCaptures
+        return (count, indices[kingCaptures],
+                (indices[capturingWins], shortestLoss[capturingWins] + 1),
+                (indices[capturingLosses], longestWin[capturingLosses] + 1))
+
+    def _undo(self, squares, sides):
+        found = []
+        for column, owner in enumerate(self.columnSides):
+            movers = np.nonzero(sides != owner)[0]  # the side not to move made the last move
+            if not len(movers):
+                continue
+            moverSquares = squares[movers]
+            for rows, targets, hits in self._pieceMoves(moverSquares, column):
+                before = moverSquares[rows[hits < 0]]
+                before[:, column] = targets[hits < 0]
+                found.append(self.indices(before, np.full(len(before), owner)))
+        return np.unique(np.concatenate(found)) if found else np.zeros(0, np.int64)
+
+
+def _scanTask(task):
+    """worker side: (name, boardNo, directory, mode, data, ply) -> _Scanner.scan result"""
+    name, boardNo, directory, mode, data, ply = task
+    scanner = _workerScanners.get((name, boardNo, directory))
+    if scanner is None:
+        scanner = _workerScanners[(name, boardNo, directory)] = _Scanner(name, boardNo, directory)
+    return scanner.scan(mode, data, ply)
+
+
+def generateTablebase(material, boardNo=8, directory='.', workers=None, log=None):
+    """generates the table of material and every table its captures lead into, skipping tables that exist, and
+    returns the path of the table. log, if given, is called with a line of statistics per generated table"""
+    name = canonicalMaterial(material)[0]
+    path = tablebasePath(directory, name, boardNo)
+    if os.path.exists(path):
+        return path
+    for subName in captureMaterials(name):
+        generateTablebase(subName, boardNo, directory, workers, log)
+
+    start = time.perf_counter()
+    index = TablebaseIndex(name, boardNo)
+    workPath = path + '.work'
+    values = np.memmap(workPath, np.uint16, 'w+', shape=(index.size,))
+    workers = workers or os.cpu_count() or 1
+    executor = ProcessPoolExecutor(workers) if workers > 1 else None
+
+    def scanAll(mode, chunks, ply=0):
+        tasks = [(name, boardNo, directory, mode, chunk, ply) for chunk in chunks]
+        values.flush()
+        return list(executor.map(_scanTask, tasks) if executor is not None else map(_scanTask, tasks))
+
+    def split(indices):
+        return [indices[first:first + CHUNK] for first in range(0, len(indices), CHUNK)]
+
+    try:
+        positions = 0
+        pending = dict()  # ply -> index arrays to try at that ply, found through captures into smaller tables
+        frontier = []
+        for count, kingCaptures, capturingWins, capturingLosses in scanAll(
+                'start', [(first, min(first + CHUNK, index.size)) for first in range(0, index.size, CHUNK)]):
+            positions += count
+            frontier.append(kingCaptures)
+            for indices, plies in (capturingWins, capturingLosses):
+                for ply in np.unique(plies):
+                    pending.setdefault(int(ply), []).append(indices[plies == ply])
+        frontier = np.concatenate(frontier)
+        values[frontier] = 1
+        ply = 1
+        while len(frontier) or any(later > ply for later in pending):
+            ply += 1
+            candidates = scanAll('undo', split(frontier)) + pending.pop(ply, [])
+            candidates = np.unique(np.concatenate(candidates)) if candidates else np.zeros(0, np.int64)
+            candidates = candidates[values[candidates] == 0]
+            if ply % 2 == 0:
+                found = scanAll('lost', split(candidates), ply)
+                frontier = np.concatenate(found) if found else np.zeros(0, np.int64)
+            else:
+                frontier = candidates
+            values[frontier] = ply
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        _workerScanners.pop((name, boardNo, directory), None)
+
+    longest = int(values.max())
+    dtype = np.uint8 if longest < 256 else np.uint16
+    temporaryPath = path + '.tmp'
+    with open(temporaryPath, 'wb') as stream:
+        stream.write(HEADER.pack(b'3DTB', boardNo, np.dtype(dtype).itemsize, longest, name.encode('ascii')))
+        for first in range(0, index.size, CHUNK * 16):
+            stream.write(values[first:first + CHUNK * 16].astype(dtype).tobytes())
+    del values
+    os.remove(workPath)
+    os.replace(temporaryPath, path)
+    if log is not None:
+        table = Tablebase(path)
+        half = index.size // 2
+        counts = []
+        for side in (0, 1):
+            sideValues = table.values[side * half:(side + 1) * half]
+            nonzero = sideValues[sideValues > 0]
+            won = np.count_nonzero(nonzero % 2)
+            counts.append((won, len(nonzero) - won))
+        log('%s on %d^3: %d indices, %d positions, %.1fs, longest %d plies; white to move %d won %d lost, '
+            'black to move %d won %d lost, the rest drawn' % (
+                name, boardNo, index.size, positions, time.perf_counter() - start, longest,
+                counts[0][0], counts[0][1], counts[1][0], counts[1][1]))
+    return path
+
+
+def checkTablebase(material, boardNo, directory, samples, seed=1):
+    """compares the stored result of samples random positions with the one computed from the results after each of
+    their ChessBoard moves, returns the number of mismatches"""
+    tables = TablebaseSet(directory)
+    table = tables.table(material, boardNo)
+    if table is None:
+        raise Exception("no %s table for boardNo %d in %s" % (material, boardNo, directory))
+    rng = random.Random(seed)
+    mismatches = 0
+    for _ in range(samples):
+        squares = rng.sample(range(table.squareCount), len(table.name))
+        data = bytearray(table.squareCount + 1)
+        for square, pieceClass, side in zip(squares, table.pieceClasses, table.columnSides):
+            data[square] = pieceCode(pieceClass((0, 0, 0), int(side), boardNo))
+        data[-1] = rng.randrange(2)
+        chessBoard = ChessBoard.fromPacked(bytes(data), boardNo)
+        stored = tables.probe(chessBoard)
+        expected = tables.bestMove(chessBoard)[1]
+        if stored != expected:
+            mismatches += 1
+            print('mismatch %s: stored %r, from the moves %r' % (bytes(data).hex(), stored, expected))
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="generate and check 3D chess endgame tablebases")
+    parser.add_argument('material', help="white then black pieces, each side starting with K, e.g. KRK or KQKR")
+    parser.add_argument('--boardNo', type=int, default=5)
+    parser.add_argument('--dir', default='.', help="directory of the table files")
+    parser.add_argument('--workers', type=int, help="generation processes, default one per core")
+    parser.add_argument('--check', type=int, default=0, metavar='N',
+                        help="verify N random positions against the results after their moves")
+    args = parser.parse_args(argv)
+    os.makedirs(args.dir, exist_ok=True)
+    path = generateTablebase(args.material, args.boardNo, args.dir, args.workers, print)
+    print('%s: %d bytes' % (path, os.path.getsize(path)))
+    if args.check:
+        mismatches = checkTablebase(args.material, args.boardNo, args.dir, args.check)
+        print('%d positions checked, %d mismatches' % (args.check, mismatches))
+        return 1 if mismatches else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
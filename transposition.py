@@ -0,0 +1,111 @@
+"""fixed size transposition table keyed by ChessBoard.positionHash
+
+entries live in flat typed arrays instead of per entry Python objects, so the memory budget is exact:
+every slot costs ENTRYBYTES bytes and the number of slots is budget // ENTRYBYTES
+"""
+from array import array
+
+EMPTY, EXACT, LOWERBOUND, UPPERBOUND = 0, 1, 2, 3  # flag of a slot, EMPTY marks an unused slot
+NOMOVE = -1
+ENTRYBYTES = 8 + 1 + 4 + 1 + 4 + 1  # key, depth, score, flag, move, generation
+
+
+class TranspositionTable:
+    """caches search results per position, the slot of a position is hash % slot count
+    policy 'depth' keeps the deeper of two colliding positions unless the stored one is from an older search,
+    policy 'always' lets every store replace the slot; a store for the position already in the slot always replaces it"""
+
+    policies = ('depth', 'always')
+
+    def __init__(self, megabytes=16, policy='depth'):
+        if policy not in self.policies:
+            raise Exception("replacement policy must be one of %s" % (self.policies,))
+        self.policy = policy
+        self.size = max(1, int(megabytes * 1024 * 1024) // ENTRYBYTES)
+        self._keys = array('Q', bytes(8 * self.size))
+        self._depths = array('b', bytes(self.size))
+        self._scores = array('i', bytes(4 * self.size))
+        self._flags = array('B', bytes(self.size))
+        self._moves = array('i', bytes(4 * self.size))
+        self._generations = array('B', bytes(self.size))
+        self._generation = 0
+        self.probes = self.hits = self.stores = self.overwrites = 0
+
+    def newSearch(self):
+        """marks the start of a new search, entries of earlier searches become preferred for replacement"""
+        self._generation = (self._generation + 1) & 0xFF
+
+    def probe(self, key):
+        """returns (depth, score, flag, move) stored for key, None on a miss; move is NOMOVE if none was stored"""
+        self.probes += 1
+        slot = key % self.size
+        if self._flags[slot] == EMPTY or self._keys[slot] != key:
+            return None
+        self.hits += 1
+        return self._depths[slot], self._scores[slot], self._flags[slot], self._moves[slot]
+
+    def store(self, key, depth, score, flag, move=NOMOVE):
+        """stores a search result for key following the replacement policy, returns True if it was written"""
+        slot = key % self.size
+        storedFlag = self._flags[slot]
+        if storedFlag != EMPTY:
+            if self._keys[slot] == key:
+                if move == NOMOVE:
+                    move = self._moves[slot]  # keep the known best move of the position
+            elif self.policy == 'depth' and depth < self._depths[slot] \
+                    and self._generations[slot] == self._generation:
+                return False
+            else:
+                self.overwrites += 1
+        self._keys[slot] = key
+        self._depths[slot] = max(-128, min(127, depth))
+        self._scores[slot] = score
+        self._flags[slot] = flag
+        self._moves[slot] = move
+        self._generations[slot] = self._generation
+        self.stores += 1
+        return True
+
+    def clear(self):
+        """empties every slot and resets the statistics"""
+        self._flags = array('B', bytes(self.size))
+        self.probes = self.hits = self.stores = self.overwrites = 0
+
+    def filled(self):
+        """returns the number of slots in use"""
+        return self.size - self._flags.count(EMPTY)
+
+    def memoryBytes(self):
+        """returns the bytes used by the slot arrays"""
+        return self.size * ENTRYBYTES
+
+    def stats(self):
+        """returns a dict of counters, hit rate and fill"""
+        return {'size': self.size, 'filled': self.filled(), 'probes': self.probes, 'hits': self.hits,
+                'hitRate': self.hits / self.probes if self.probes else 0.0, 'stores': self.stores,
+                'overwrites': self.overwrites, 'bytes': self.memoryBytes()}
+
+
+if __name__ == '__main__':
+    for policy in TranspositionTable.policies:
+        table = TranspositionTable(1, policy)
+        deep, shallow = 7, 7 + table.size  # two positions sharing a slot
+        assert table.store(deep, 5, 40, EXACT, 12) and table.probe(deep) == (5, 40, EXACT, 12)
+        # a shallower result of another position in the same search replaces the deep one only with 'always'
+        written = table.store(shallow, 2, -10, LOWERBOUND)
+        assert written == (policy == 'always')
+        if policy == 'depth':
+            assert table.probe(deep) == (5, 40, EXACT, 12) and table.probe(shallow) is None
+        else:
+            assert table.probe(deep) is None and table.probe(shallow) == (2, -10, LOWERBOUND, NOMOVE)
+        # a deeper result always replaces, and entries of an older search give way under both policies
+        assert table.store(deep, 6, 45, EXACT, 13) and table.probe(deep) == (6, 45, EXACT, 13)
+        table.newSearch()
+        assert table.store(shallow, 1, 0, UPPERBOUND) and table.probe(shallow) == (1, 0, UPPERBOUND, NOMOVE)
+        # a store for the position in the slot replaces it at any depth and keeps its move when none is given
+        assert table.store(shallow, 0, 3, EXACT) and table.store(shallow, 0, 4, EXACT, 20)
+        assert table.store(shallow, 0, 5, LOWERBOUND) and table.probe(shallow) == (0, 5, LOWERBOUND, 20)
+        assert table.filled() == 1 and table.memoryBytes() == table.size * ENTRYBYTES
+        table.clear()
+        assert table.filled() == 0 and table.probe(deep) is None
+    print('transposition ok')
@@ -0,0 +1,42 @@
+"""zobrist keys for 3D chess positions
+
+a position hash is the XOR of one random 64 bit key per (piece code, square) on the board, plus sideKey when the
+second side is to move. ChessBoard keeps its hash up to date by XORing keys in and out on every piece placement,
+see ChessBoard._placePiece/_liftPiece
+"""
+import random
+from itertools import compress
+
+SEED = 20210315  # fixed so hashes are stable across processes and runs, stored hashes stay valid
+CODECOUNT = 16  # piece codes are typeCode << 1 | side and fit in 4 bits
+
+_keysCache = dict()
+
+
+class ZobristKeys:
+    "random keys for every piece code on every square of a boardNo**3 board"
+
+    def __init__(self, boardNo=8, seed=SEED):
+        rng = random.Random('%d-%d' % (seed, boardNo))
+        squareCount = boardNo ** 3
+        self.boardNo = boardNo
+        # pieceKeys[code][index], code 0 (empty square) gets all zero keys so it never changes a hash
+        self.pieceKeys = [[0] * squareCount] + [[rng.getrandbits(64) for _ in range(squareCount)]
+                                                 for _ in range(CODECOUNT - 1)]
+        self.sideKey = rng.getrandbits(64)
+
+    def hashSquares(self, squares, side=0):
+        """returns the full hash of a square array, used to verify the incremental hash"""
+        pieceKeys = self.pieceKeys
+        key = self.sideKey if side else 0
+        for index in compress(range(len(squares)), squares):  # occupied squares only
+            key ^= pieceKeys[squares[index]][index]
+        return key
+
+
+def getZobristKeys(boardNo=8):
+    """returns the shared ZobristKeys for boardNo, building them on first use"""
+    keys = _keysCache.get(boardNo)
+    if keys is None:
+        keys = _keysCache[boardNo] = ZobristKeys(boardNo)
+    return keys